@@ -3,53 +3,29 @@ import StressScenario from "../models/stress_scenario.js";
 import jwt from "jsonwebtoken";
 import TherapySession from "../models/therapy_session.js";
 import path from "path";
-import { exec } from "child_process";
+import { PythonWorker } from "../utilities/pythonWorker.js";
 
-const execCommand = (command) => {
-    return new Promise((resolve, reject) => {
-        exec(command, { maxBuffer: 1024 * 5000 }, (error, stdout, stderr) => {
-            if (error) {
-                console.error("❌ Python error:", stderr || error.message);
-                reject(stderr || error);
-            } else {
-                console.log("✅ Python Output (raw):", stdout.trim());
-                resolve(stdout);
-            }
-        });
-    });
-};
+// Resident scenario service: answers most turns from the offline scenario bank
+// and prefetches Gemini scenarios for the rest while the player reads
+const scenarioWorker = new PythonWorker(
+    path.join(process.cwd(), "utilities", "gamni.py")
+);
 
 export const generateScenario = async(req, res) => {
     try {
         const { prev_scenario, chosen_option, stress_score } = req.body;
 
-        const inputJson = JSON.stringify({
+        const { id, source, elapsed_ms, ...scenario } = await scenarioWorker.request({
             prev_scenario,
             chosen_option,
             stress_score,
+            // Keeps the bank from repeating recent scenarios within one game
+            session_id: req.cookies.activeSessionId,
         });
 
-        const escapedJson = inputJson.replace(/"/g, '\\"');
-
-        const scriptPath = path.join(process.cwd(), "utilities", "gamni.py");
-        const command = `python3 "${scriptPath}" "${escapedJson}"`;
-
-        const output = await execCommand(command);
-
-        console.log("📦 Python Output (raw):", output);
-
-        let parsed;
-        try {
-            parsed = JSON.parse(output);
-            // console.log("📦 Parsed Scenario Question:", parsed ? .scenario);
-        } catch (err) {
-            console.error("❌ Failed to parse Python output:", output);
-            return res
-                .status(500)
-                .json({ error: "Invalid response from Python script" });
-        }
+        console.log(`📦 Scenario (${source}) in ${elapsed_ms} ms:`, scenario.scenario);
 
-        res.json(parsed);
+        res.json(scenario);
     } catch (err) {
         console.error("🔥 Scenario generation failed:", err);
         res.status(500).json({ error: "Failed to generate scenario" });
@@ -1,13 +1,14 @@
 import { ElevenLabsClient } from "elevenlabs";
 import { promises as fs } from "fs";
 import { GoogleGenerativeAI } from "@google/generative-ai";
-import { exec, spawn } from "child_process";
+import { exec } from "child_process";
 import path from "path";
 import secrets from "../config/secrets.js";
 import jwt from "jsonwebtoken";
 import AI_Message from "../models/ai_messages.js";
 import TherapySession from "../models/therapy_session.js";
 import ExtractedEmotion from "../models/extracted_emotions.js";
+import { PythonWorker } from "../utilities/pythonWorker.js";
 
 const genAI = new GoogleGenerativeAI(secrets.GOOGLE_API_KEY);
 const elevenLabsApiKey = secrets.ELEVEN_LABS_API_KEY;
@@ -158,27 +159,75 @@ const sendMissingKeysMessage = async (res) => {
   });
 };
 
-const extractFinalPrediction = (stdout) => {
-  const match = stdout.match(/🎯 Final Ensemble Prediction:\s*(\w+)/);
-  return match ? match[1] : null;
-};
+// Cascade mode: most messages are settled by the first one or two models
+// The worker fails a batch after --batch-timeout-ms (20 s); the longer limit
+// here only trips when the process itself is stuck, and restarts it.
+const textEmotionWorker = new PythonWorker(
+  path.join(process.cwd(), "utilities", "predict_text.py"),
+  ["--serve", "--cascade"],
+  { timeoutMs: 30000 }
+);
 
 const predictEmotionFromText = async (text) => {
-  const pythonScriptPath = path.join(
-    process.cwd(),
-    "utilities",
-    "predict_text.py"
-  );
-  const command = `python3 "${pythonScriptPath}" "${text.replace(
-    /"/g,
-    '\\"'
-  )}"`;
-  const output = await execCommand(command);
-  const prediction = extractFinalPrediction(output);
+  const result = await textEmotionWorker.request({ text });
+  const prediction = result.final_prediction;
   console.log("🎯 Final Emotion Prediction:", prediction);
   return prediction;
 };
 
+const transcriptionWorker = new PythonWorker(
+  path.join(process.cwd(), "utilities", "audioOrVideoToText.py")
+);
+
+// Segments stream in while Whisper is still decoding; onSegment lets callers
+// start work on the first part of a long clip before the rest is done.
+const transcribeMedia = async (filePath, onSegment) => {
+  const result = await transcriptionWorker.request(
+    { path: filePath },
+    (segment) => {
+      console.log(`Transcribed [${segment.start}s-${segment.end}s]:`, segment.text);
+      onSegment?.(segment);
+    }
+  );
+  return result.text.trim();
+};
+
+// Starts generateTherapyReply on the transcript so far while Whisper is still
+// decoding. Segments from one window arrive together, so they are coalesced
+// into one call; get() reuses the latest call when the final transcript
+// matches it and only asks Gemini again when more speech came in after it.
+const earlyTherapyReply = () => {
+  const segments = [];
+  let pending = null;
+  let started = null;
+
+  const start = (text) => {
+    const reply = generateTherapyReply(text);
+    reply.catch(() => {}); // superseded replies are never awaited
+    started = { text, reply };
+  };
+
+  return {
+    onSegment(segment) {
+      segments.push(segment.text);
+      if (pending) return;
+      pending = setImmediate(() => {
+        pending = null;
+        const text = segments.join("").trim();
+        if (text && text !== started?.text) start(text);
+      });
+    },
+    get(transcript) {
+      if (pending) {
+        clearImmediate(pending);
+        pending = null;
+      }
+      if (started?.text !== transcript) start(transcript);
+      return started.reply;
+    },
+  };
+};
+
 export const textReply = async (req, res) => {
   const userMessage = req.body.message;
 
@@ -274,132 +323,82 @@ export const audioReply = async (req, res) => {
     console.log(`Audio file saved at: ${file.path}`);
     console.log(`Audio duration: ${duration} seconds`);
 
-    const inputPath = file.path;
-    const outputPath = inputPath.replace(path.extname(inputPath), ".wav");
-
-    // Convert audio from webm to WAV
-    await new Promise((resolve, reject) => {
-      exec(
-        `ffmpeg -y -i "${inputPath}" "${outputPath}"`,
-        (error, stdout, stderr) => {
-          if (error) {
-            console.error("Error converting to WAV:", stderr || error.message);
-            return reject(error);
-          }
-          console.log("Conversion to WAV successful");
-          resolve();
-        }
-      );
-    });
+    // The transcription worker decodes the uploaded container itself
+    const outputPath = file.path;
 
+    const earlyReply = earlyTherapyReply();
+    let transcribedText;
     try {
-      await fs.unlink(inputPath);
-      console.log("Original uploaded file deleted:", inputPath);
-    } catch (unlinkError) {
-      console.warn("Failed to delete original file:", unlinkError.message);
+      transcribedText = await transcribeMedia(outputPath, earlyReply.onSegment);
+    } catch (err) {
+      console.error("Transcription failed:", err.message);
+      return res
+        .status(500)
+        .json({ error: "Transcription failed", details: err.message });
     }
 
-    const pythonScriptPath = path.join(
-      process.cwd(),
-      "utilities",
-      "audioOrVideoToText.py"
-    );
-    const pythonExecutable =
-      process.platform === "win32" ? "python" : "python3";
+    try {
+      console.log("Transcribed Text:", transcribedText);
+
+      const answer = await earlyReply.get(transcribedText);
+      const responseArray = JSON.parse(answer);
+      const replyTextOnly2 = responseArray
+        .map((item) => item.text)
+        .join("\n");
+      console.log(responseArray);
+
+      const messages = [];
+      for (let i = 0; i < responseArray.length; i++) {
+        const message = await generateAudioAndLipSync(responseArray[i], i);
+        messages.push(message);
+      }
 
-    const python = spawn(pythonExecutable, [pythonScriptPath, outputPath]);
+      const sessionId = req.cookies.activeSessionId;
+      if (!sessionId) {
+        return res.status(400).json({ error: "No active session selected" });
+      }
 
-    let transcription = "";
-    let errorOutput = "";
+      const token = req.cookies.token;
+      const decoded = jwt.verify(token, process.env.JWT_SECRET);
+      const userId = decoded.userId;
+      if (!userId) {
+        return res
+          .status(400)
+          .json({ error: "Invalid token or user ID missing" });
+      }
 
-    python.stdout.on("data", (data) => {
-      transcription += data.toString();
-    });
+      const replyTextOnly = messages.map((msg) => msg.text).join(" ");
+      const userMessage = transcribedText;
 
-    python.stderr.on("data", (data) => {
-      errorOutput += data.toString();
-    });
+      const newMsg = await AI_Message.create({
+        sender_id: userId,
+        message_text: userMessage,
+        response: replyTextOnly2,
+        chat_session_id: sessionId,
+      });
 
-    python.on("close", async (code) => {
-      if (code !== 0) {
-        console.error("Transcription failed:", errorOutput);
-        return res
-          .status(500)
-          .json({ error: "Transcription failed", details: errorOutput });
-      }
+      await TherapySession.findByIdAndUpdate(sessionId, {
+        $push: { chat_sessions: newMsg._id },
+      });
 
-      try {
-        const transcribedText = transcription.trim();
-        console.log("Transcribed Text:", transcribedText);
-
-        const answer = await generateTherapyReply(transcribedText);
-        const responseArray = JSON.parse(answer);
-        const replyTextOnly2 = responseArray
-          .map((item) => item.text)
-          .join("\n");
-        console.log(responseArray);
-
-        const messages = [];
-        for (let i = 0; i < responseArray.length; i++) {
-          const message = await generateAudioAndLipSync(responseArray[i], i);
-          messages.push(message);
-        }
-
-        const sessionId = req.cookies.activeSessionId;
-        if (!sessionId) {
-          return res.status(400).json({ error: "No active session selected" });
-        }
-
-        const token = req.cookies.token;
-        const decoded = jwt.verify(token, process.env.JWT_SECRET);
-        const userId = decoded.userId;
-        if (!userId) {
-          return res
-            .status(400)
-            .json({ error: "Invalid token or user ID missing" });
-        }
-
-        const replyTextOnly = messages.map((msg) => msg.text).join(" ");
-        const userMessage = transcribedText;
-
-        const newMsg = await AI_Message.create({
-          sender_id: userId,
-          message_text: userMessage,
-          response: replyTextOnly2,
-          chat_session_id: sessionId,
-        });
-
-        await TherapySession.findByIdAndUpdate(sessionId, {
-          $push: { chat_sessions: newMsg._id },
-        });
-
-        const newEmotion = await ExtractedEmotion.create({
-          session_id: sessionId,
-          extracted_emotion: "neutral",
-          uploaded_data_type: "audio",
-          file_paths: outputPath,
-        });
-
-        await TherapySession.findByIdAndUpdate(sessionId, {
-          $push: { emotion_records: newEmotion._id },
-        });
-
-        res.send({ messages });
-      } catch (err) {
-        console.error("Error processing transcription:", err);
-        return res
-          .status(500)
-          .json({ error: "Failed to process transcription output." });
-      }
-    });
+      const newEmotion = await ExtractedEmotion.create({
+        session_id: sessionId,
+        extracted_emotion: "neutral",
+        uploaded_data_type: "audio",
+        file_paths: outputPath,
+      });
 
-    python.on("error", (error) => {
-      console.error("Failed to start Python process:", error.message);
-      res.status(500).json({
-        error: "Failed to start Python script",
-        details: error.message,
+      await TherapySession.findByIdAndUpdate(sessionId, {
+        $push: { emotion_records: newEmotion._id },
       });
-    });
+
+      res.send({ messages });
+    } catch (err) {
+      console.error("Error processing transcription:", err);
+      return res
+        .status(500)
+        .json({ error: "Failed to process transcription output." });
+    }
   } catch (error) {
     console.error("Unexpected error:", error);
     res
@@ -408,22 +407,28 @@ export const audioReply = async (req, res) => {
   }
 };
 
-const extractVideoFinalPrediction = (stdout) => {
-  const match = stdout.match(/Final Prediction:\s*(\w+)/);
-  return match ? match[1] : null;
-};
+// Transcript, voice and face from one in-process decode of the upload, fused into one emotion
+const multimodalWorker = new PythonWorker(
+  path.join(process.cwd(), "utilities", "multimodal.py")
+);
 
-const predictEmotionFromVideo = async (videoPath) => {
-  const pythonScriptPath = path.join(
-    process.cwd(),
-    "utilities",
-    "predict_video.py"
+const analyseVideo = async (videoPath) => {
+  const result = await multimodalWorker.request({ path: videoPath }, (segment) => {
+    console.log(`Transcribed [${segment.start}s-${segment.end}s]:`, segment.text);
+  });
+  for (const [modality, breakdown] of Object.entries(result.modalities)) {
+    console.log(
+      `🎯 ${modality}:`,
+      breakdown.error ?? `${breakdown.final_prediction} (${breakdown.confidence})`
+    );
+  }
+  console.log(
+    "🎯 Fused Emotion Prediction:",
+    result.final_prediction,
+    result.confidence,
+    `in ${result.timings_ms.total} ms`
   );
-  const command = `python3 "${pythonScriptPath}" "${videoPath}"`;
-  const output = await execCommand(command);
-  const prediction = extractVideoFinalPrediction(output);
-  console.log("🎯 Final Video Emotion Prediction:", prediction);
-  return prediction;
+  return { transcript: result.transcript, emotion: result.final_prediction };
 };
 
 export const videoReply = async (req, res) => {
@@ -444,143 +449,84 @@ export const videoReply = async (req, res) => {
       `Uploaded file: ${file.originalname}, size: ${file.size} bytes`
     );
     console.log(`Video duration: ${duration} seconds`);
-    const inputPath = file.path;
-    const outputPath = inputPath.replace(path.extname(inputPath), ".mp4");
-
-    // Convert video to MP4
-    await new Promise((resolve, reject) => {
-      const command = `ffmpeg -y -i "${inputPath}" "${outputPath}"`;
-      exec(command, { timeout: 60000 }, (error, stdout, stderr) => {
-        if (error) {
-          console.error("FFmpeg conversion error:", stderr || error.message);
-          return reject(new Error("Failed to convert video."));
-        }
-        console.log("Video converted to MP4 successfully.");
-        resolve();
-      });
-    });
+    // The multimodal worker demuxes the uploaded webm/mp4 in one pass
+    const outputPath = file.path;
 
+    let transcribedText;
+    let emotion_extracted;
     try {
-      await fs.unlink(inputPath);
-      console.log("Original uploaded file deleted:", inputPath);
-    } catch (unlinkError) {
-      console.warn("Failed to delete original file:", unlinkError.message);
+      ({ transcript: transcribedText, emotion: emotion_extracted } =
+        await analyseVideo(outputPath));
+    } catch (err) {
+      console.error("Video analysis failed:", err.message);
+      return res
+        .status(500)
+        .json({ error: "Transcription failed.", details: err.message });
     }
 
-    const pythonScriptPath = path.join(
-      process.cwd(),
-      "utilities",
-      "audioOrVideoToText.py"
-    );
-    const pythonExecutable =
-      process.platform === "win32" ? "python" : "python3";
+    try {
+      console.log("Transcribed Text:", transcribedText);
+      console.log("🎯 Final Emotion Extracted:", emotion_extracted);
 
-    const pythonProcess = spawn(pythonExecutable, [
-      pythonScriptPath,
-      outputPath,
-    ]);
+      const answer = await generateTherapyReply(transcribedText);
 
-    let transcription = "";
-    let errorOutput = "";
+      const responseArray = JSON.parse(answer);
 
-    pythonProcess.stdout.on("data", (data) => {
-      transcription += data.toString();
-    });
-
-    pythonProcess.stderr.on("data", (data) => {
-      errorOutput += data.toString();
-    });
+      console.log(responseArray);
 
-    pythonProcess.on("close", async (code) => {
-      // try {
-      //   await fs.unlink(outputPath);
-      //   console.log("Converted MP4 file deleted:", outputPath);
-      // } catch (err) {
-      //   console.warn("Failed to delete converted MP4 file:", err.message);
-      // }
+      const messages = [];
 
-      if (code !== 0) {
-        console.error("Python transcription script error:", errorOutput);
-        return res
-          .status(500)
-          .json({ error: "Transcription failed.", details: errorOutput });
+      for (let i = 0; i < responseArray.length; i++) {
+        const message = await generateAudioAndLipSync(responseArray[i], i);
+        messages.push(message);
       }
 
-      try {
-        const transcribedText = transcription.trim();
-        console.log("Transcribed Text:", transcribedText);
-
-        const emotion_extracted = await predictEmotionFromVideo(outputPath);
-        console.log("🎯 Final Emotion Extracted:", emotion_extracted);
-
-        const answer = await generateTherapyReply(transcribedText);
-
-        const responseArray = JSON.parse(answer);
+      //save data to database
+      const sessionId = req.cookies.activeSessionId;
+      if (!sessionId)
+        return res.status(400).json({ error: "No active session selected" });
 
-        console.log(responseArray);
-
-        const messages = [];
-
-        for (let i = 0; i < responseArray.length; i++) {
-          const message = await generateAudioAndLipSync(responseArray[i], i);
-          messages.push(message);
-        }
-
-        //save data to database
-        const sessionId = req.cookies.activeSessionId;
-        if (!sessionId)
-          return res.status(400).json({ error: "No active session selected" });
-
-        const token = req.cookies.token;
-        const decoded = jwt.verify(token, process.env.JWT_SECRET);
-        const userId = decoded.userId;
-        if (!userId)
-          return res
-            .status(400)
-            .json({ error: "Invalid token or user ID missing" });
-
-        const replyTextOnly = messages.map((msg) => msg.text).join(" "); // Assuming each message has a .text property
-        const userMessage = transcribedText; // This is the actual user message (transcribed from video)
-
-        const newMsg = await AI_Message.create({
-          sender_id: userId,
-          message_text: userMessage,
-          response: replyTextOnly,
-          chat_session_id: sessionId,
-        });
+      const token = req.cookies.token;
+      const decoded = jwt.verify(token, process.env.JWT_SECRET);
+      const userId = decoded.userId;
+      if (!userId)
+        return res
+          .status(400)
+          .json({ error: "Invalid token or user ID missing" });
 
-        await TherapySession.findByIdAndUpdate(sessionId, {
-          $push: { chat_sessions: newMsg._id },
-        });
+      const replyTextOnly = messages.map((msg) => msg.text).join(" "); // Assuming each message has a .text property
+      const userMessage = transcribedText; // This is the actual user message (transcribed from video)
 
-        const newEmotion = await ExtractedEmotion.create({
-          session_id: sessionId,
-          extracted_emotion: emotion_extracted,
-          uploaded_data_type: "video",
-          file_paths: outputPath,
-        });
+      const newMsg = await AI_Message.create({
+        sender_id: userId,
+        message_text: userMessage,
+        response: replyTextOnly,
+        chat_session_id: sessionId,
+      });
 
-        // Update TherapySession to include this emotion
-        await TherapySession.findByIdAndUpdate(sessionId, {
-          $push: { emotion_records: newEmotion._id },
-        });
+      await TherapySession.findByIdAndUpdate(sessionId, {
+        $push: { chat_sessions: newMsg._id },
+      });
 
-        res.send({ messages });
-      } catch (err) {
-        console.error("Error processing transcription:", err);
-        return res
-          .status(500)
-          .json({ error: "Failed to process transcription output." });
-      }
-    });
+      const newEmotion = await ExtractedEmotion.create({
+        session_id: sessionId,
+        extracted_emotion: emotion_extracted,
+        uploaded_data_type: "video",
+        file_paths: outputPath,
+      });
 
-    pythonProcess.on("error", (err) => {
-      console.error("Failed to start Python process:", err.message);
-      return res.status(500).json({
-        error: "Failed to start transcription process.",
-        details: err.message,
+      // Update TherapySession to include this emotion
+      await TherapySession.findByIdAndUpdate(sessionId, {
+        $push: { emotion_records: newEmotion._id },
       });
-    });
+
+      res.send({ messages });
+    } catch (err) {
+      console.error("Error processing transcription:", err);
+      return res
+        .status(500)
+        .json({ error: "Failed to process transcription output." });
+    }
   } catch (error) {
     console.error("Unexpected server error:", error);
     return res
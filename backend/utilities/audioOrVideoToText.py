@@ -1,11 +1,208 @@
+import os
 import sys
-import whisper
+import json
+import base64
+import argparse
+import numpy as np
 
-file_path = sys.argv[1]  # Get file path from Node.js
+from tracing import span
+with span("import", module="whisper"):
+    import torch
+    import whisper
 
-model = whisper.load_model("base")  # You can also use "small", "medium", "large"
+import media
+from prediction_cache import get_cache, file_key, bytes_key
 
-# Force the model to assume English input
-result = model.transcribe(file_path, language="en")
+# Deployment defaults; the command-line flags below override them
+DEFAULT_MODEL = os.environ.get("WHISPER_MODEL", "base")  # You can also use "small", "medium", "large"
+DEFAULT_BEAM_SIZE = int(os.environ.get("WHISPER_BEAM_SIZE", "1"))
+DEFAULT_PRECISION = os.environ.get("WHISPER_PRECISION", "fp32")
 
-print(result["text"])
+# Bump when the shape of a cached result changes
+CACHE_NAMESPACE = "transcript/v2"
+
+def quantize_int8(model):
+    """Dynamically quantize whisper's Linear layers to int8 for CPU decoding."""
+    # whisper uses its own nn.Linear subclass, which quantize_dynamic won't touch
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                plain.load_state_dict(child.state_dict())
+                setattr(parent, name, plain)
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_whisper(model_name=DEFAULT_MODEL, precision=DEFAULT_PRECISION):
+    with span("load", data_type="transcription", model=f"whisper-{model_name}", precision=precision):
+        if precision == "int8":
+            model = whisper.load_model(model_name, device="cpu")
+            return quantize_int8(model)
+        return whisper.load_model(model_name)
+
+def decode_options(beam_size=DEFAULT_BEAM_SIZE, precision=DEFAULT_PRECISION):
+    # Force the model to assume English input
+    options = {"language": "en", "fp16": precision == "fp16"}
+    if beam_size and beam_size > 1:
+        options["beam_size"] = beam_size
+    return options
+
+def iter_segments(model, audio, options):
+    """Transcribe 30 s windows one after another, yielding segments as each window finishes.
+
+    audio is a file path or a 16 kHz mono float32 array. Windows advance
+    the way whisper's own seek loop does: every segment but the last is
+    kept, and the next window starts where that last one started, so a
+    word cut off at the window edge is decoded again in full rather than
+    split across two calls. A window with a single segment (or none, in
+    silence) is kept whole. The kept text is passed as the prompt for the
+    next window, as condition_on_previous_text does within one call.
+    """
+    if isinstance(audio, str):
+        if media.available():
+            audio = media.load_audio(audio)  # in-process, no ffmpeg child
+        else:
+            with span("decode", path=os.path.basename(audio), bytes=os.path.getsize(audio)) as decode_span:
+                audio = whisper.load_audio(audio)
+                decode_span.set(samples=len(audio))
+
+    window = whisper.audio.N_SAMPLES
+    sample_rate = whisper.audio.SAMPLE_RATE
+    prompt = None
+    start = 0
+    while start < len(audio):
+        chunk = audio[start:start + window]
+        with span("infer", model="whisper", samples=len(chunk)) as infer_span:
+            result = model.transcribe(chunk, initial_prompt=prompt, **options)
+            infer_span.set(segments=len(result["segments"]))
+        offset = start / sample_rate
+
+        segments = result["segments"]
+        next_start = start + window
+        if start + window < len(audio) and len(segments) > 1 and segments[-1]["start"] > 0:
+            next_start = start + int(segments[-1]["start"] * sample_rate)
+            segments = segments[:-1]
+
+        for segment in segments:
+            yield {
+                "start": round(offset + segment["start"], 2),
+                "end": round(offset + segment["end"], 2),
+                "text": segment["text"],
+            }
+
+        text = "".join(segment["text"] for segment in segments)
+        if text.strip():
+            prompt = text[-224:]
+        start = next_start
+
+def transcribe(model, audio, options):
+    return "".join(segment["text"] for segment in iter_segments(model, audio, options)).strip()
+
+def decode_pcm(pcm):
+    """Raw little-endian float32 samples, 16 kHz mono."""
+    return np.frombuffer(pcm, dtype="<f4").astype(np.float32)
+
+def transcript_result(segments):
+    segments = list(segments)
+    return {"text": "".join(segment["text"] for segment in segments).strip(), "segments": segments}
+
+def transcript_key(source, model_name, precision, options):
+    """Prediction cache key for a transcript of a file path or of raw PCM bytes."""
+    # whisper's download URLs embed the checkpoint's sha256, so they identify the weights
+    fingerprint = f"{whisper._MODELS.get(model_name, model_name)}:{precision}"
+    settings = json.dumps(options, sort_keys=True)
+    if isinstance(source, bytes):
+        return bytes_key(CACHE_NAMESPACE, source, fingerprint, settings)
+    return file_key(CACHE_NAMESPACE, source, fingerprint, settings)
+
+def serve(model, model_name, precision, options):
+    """Keep whisper resident and transcribe one JSON request per stdin line.
+
+    Requests are {"id": 1, "path": "..."} or {"id": 1, "pcm": "<base64 float32>"}.
+    Every decoded segment is streamed back as {"id", "event": "segment", ...}
+    and the request ends with {"id", "text": "<full transcript>"}. Cached
+    transcripts replay their segments the same way. {"id": 1, "op": "stats"}
+    returns the prediction cache counters.
+    """
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    def send(message):
+        protocol_out.write(json.dumps(message) + "\n")
+        protocol_out.flush()
+
+    cache = get_cache()
+    send({"ready": True, "model": model_name})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if request.get("op") == "stats":
+                send({"id": request_id, "cache": cache.stats() if cache else None})
+                continue
+
+            with span("request", trace=request_id, op="transcribe") as request_span:
+                if "pcm" in request:
+                    pcm = base64.b64decode(request["pcm"])
+                    source, audio = pcm, decode_pcm(pcm)
+                else:
+                    source = audio = request["path"]
+
+                key = transcript_key(source, model_name, precision, options) if cache else None
+                result = cache.get(key) if cache else None
+                request_span.set(cached=result is not None)
+                if result is not None:
+                    for segment in result["segments"]:
+                        send({"id": request_id, "event": "segment", **segment})
+                else:
+                    segments = []
+                    for segment in iter_segments(model, audio, options):
+                        segments.append(segment)
+                        send({"id": request_id, "event": "segment", **segment})
+                    result = transcript_result(segments)
+                    if cache:
+                        cache.set(key, result)
+
+            send({"id": request_id, "text": result["text"]})
+        except Exception as e:
+            send({"id": request_id, "error": str(e)})
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Transcribe audio or video with Whisper")
+    parser.add_argument("file_path", nargs="?", help="File to transcribe once and print")
+    parser.add_argument("--serve", action="store_true", help="Run as a resident JSON-lines worker")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Whisper model size")
+    parser.add_argument("--beam-size", type=int, default=DEFAULT_BEAM_SIZE, help="Beam width (1 = greedy)")
+    parser.add_argument("--precision", choices=["fp32", "fp16", "int8"], default=DEFAULT_PRECISION)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if not args.serve and not args.file_path:
+        print("❌ Please provide an audio or video file path.", file=sys.stderr)
+        sys.exit(1)
+
+    options = decode_options(args.beam_size, args.precision)
+
+    if args.serve:
+        serve(load_whisper(args.model, args.precision), args.model, args.precision, options)
+        return
+
+    # A cache hit answers without loading whisper
+    cache = get_cache()
+    key = transcript_key(args.file_path, args.model, args.precision, options) if cache else None
+    result = cache.get(key) if cache else None
+    if result is None:
+        model = load_whisper(args.model, args.precision)
+        result = transcript_result(iter_segments(model, args.file_path, options))
+        if cache:
+            cache.set(key, result)
+    print(result["text"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+import os
+import sys
+import json
+import time
+import glob
+import random
+import platform
+import tempfile
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+UTILITIES_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FIXTURES = sorted(glob.glob(os.path.join(UTILITIES_DIR, "..", "audios", "*.wav")))
+MODALITIES = ["text", "audio", "video", "transcribe", "game", "music"]
+
+# Bump when the layout of the results document changes
+SCHEMA_VERSION = 2
+
+SENTENCES = [
+    "I can't believe how well the interview went today!",
+    "Nothing I do seems to matter anymore.",
+    "Why would they cancel on me again without telling me?",
+    "I keep worrying that something bad is going to happen.",
+    "We're finally moving into our new place this weekend.",
+    "I miss the way things used to be with my family.",
+    "The meeting ran long but it was fine overall.",
+    "My heart is racing before every presentation.",
+    "He laughed at my idea in front of everyone.",
+    "I'm so grateful for my friends right now.",
+    "I didn't expect the results to come back so soon.",
+    "Honestly I just feel tired and flat today.",
+]
+
+def rss_peak_mb():
+    """Peak resident set size of this process (VmHWM), falling back to getrusage."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 2)
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+def latency_summary(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if samples.size == 0:
+        return None
+    return {
+        "n": int(samples.size),
+        "mean": round(float(samples.mean()), 3),
+        "p50": round(float(np.percentile(samples, 50)), 3),
+        "p95": round(float(np.percentile(samples, 95)), 3),
+        "p99": round(float(np.percentile(samples, 99)), 3),
+        "max": round(float(samples.max()), 3),
+    }
+
+def stage_medians(timings):
+    """Median per key over the timings_ms dicts predictors attach to their results."""
+    stages = {}
+    for entry in timings:
+        for stage, value in (entry or {}).items():
+            stages.setdefault(stage, []).append(value)
+    return {stage: round(float(np.median(values)), 3) for stage, values in stages.items()}
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.ms = (time.perf_counter() - self.start) * 1000
+
+def load_members(models):
+    """Fetch every member's model, which the registry otherwise loads lazily on the first predict."""
+    for member in models.values():
+        member["model"]
+    return models
+
+def registry_loads():
+    """Models the shared registry has loaded so far, reloads after an eviction included."""
+    from model_registry import get_registry
+    return sum(stats["loads"] for stats in get_registry().stats.values())
+
+def measure(request, count, loads=None):
+    """Run request(i) count times; returns (latencies in ms, results, latencies of reloading requests).
+
+    With loads (a function counting model loads so far), a request during
+    which a model was loaded is reported apart, so an eviction under a tight
+    budget doesn't pass for steady-state latency.
+    """
+    latencies, results, reloads = [], [], []
+    for i in range(count):
+        before = loads() if loads else 0
+        with Timer() as t:
+            results.append(request(i))
+        (reloads if loads and loads() != before else latencies).append(t.ms)
+    return latencies, results, reloads
+
+def concurrent_throughput(request, total, concurrency):
+    """Items per second when total requests are spread over concurrency threads."""
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            request(i)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    with Timer() as t:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return {"items": total, "concurrency": concurrency, "seconds": round(t.ms / 1000, 3),
+            "items_per_s": round(total / (t.ms / 1000), 3)}
+
+# ======================
+# Fixtures
+# ======================
+
+def make_video_fixture(path, seconds=4, fps=15, size=(320, 240)):
+    """A synthetic clip: a face-like ellipse drifting over a moving gradient."""
+    import cv2
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    width, height = size
+    gradient = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    for i in range(seconds * fps):
+        frame = cv2.merge([np.roll(gradient, i * 4, axis=1), gradient // 2, np.flipud(gradient)])
+        center = (width // 2 + int(40 * np.sin(i / 10)), height // 2)
+        cv2.ellipse(frame, center, (50, 65), 0, 0, 360, (180, 200, 230), -1)
+        cv2.circle(frame, (center[0] - 18, center[1] - 15), 6, (40, 40, 40), -1)
+        cv2.circle(frame, (center[0] + 18, center[1] - 15), 6, (40, 40, 40), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+def make_music_fixture(path, seed=0):
+    """Search results for every (genre, query) music.py asks for, in YTMusic's result shape."""
+    from music import EMOTION_MAPPING
+
+    rng = random.Random(seed)
+    results = {}
+    for emotion, data in EMOTION_MAPPING.items():
+        for genre in data["genres"]:
+            results[f"{genre} {data['query']}"] = [{
+                "title": f"{genre} {emotion} track {i}",
+                "artists": [{"name": f"Artist {rng.randint(1, 50)}"}],
+                "videoId": f"{emotion[:3]}{genre[:3]}{i}".replace(" ", "_"),
+                "duration": f"{rng.randint(2, 5)}:{rng.randint(0, 59):02d}",
+            } for i in range(10)]
+    with open(path, "w") as f:
+        json.dump(results, f)
+    return path
+
+# ======================
+# Per-modality benchmarks (each runs in its own process)
+# ======================
+
+def bench_text(args, workdir):
+    with Timer() as import_time:
+        import predict_text
+    with Timer() as load_time:
+        models, workers = predict_text.load_ensemble()
+        load_members(models)
+    if not models:
+        raise RuntimeError(f"no text models available: {predict_text.get_registry().unavailable('text')}")
+
+    request = lambda i: predict_text.predict_sentences(models, [SENTENCES[i % len(SENTENCES)]], workers=workers)[0]
+    with Timer() as first:
+        request(0)
+    latencies, results, reloads = measure(request, args.requests, registry_loads)
+
+    batch = [SENTENCES[i % len(SENTENCES)] for i in range(args.batch_size)]
+    with Timer() as batch_time:
+        predict_text.predict_sentences(models, batch, workers=workers)
+    return {
+        "import_ms": import_time.ms,
+        "load_ms": load_time.ms,
+        "first_request_ms": first.ms,
+        "latencies": latencies,
+        "reload_latencies": reloads,
+        "stages_ms": stage_medians(r.get("timings_ms") for r in results),
+        "throughput": {"items": len(batch), "concurrency": 1, "seconds": round(batch_time.ms / 1000, 3),
+                       "items_per_s": round(len(batch) / (batch_time.ms / 1000), 3)},
+    }
+
+def bench_audio(args, workdir):
+    if not AUDIO_FIXTURES:
+        raise RuntimeError("no .wav fixtures in backend/audios")
+    with Timer() as import_time:
+        import predict_audio
+    with Timer() as load_time:
+        models, workers = predict_audio.load_ensemble()
+        load_members(models)
+    if not models:
+        raise RuntimeError(f"no audio models available: {predict_audio.get_registry().unavailable('audio')}")
+
+    def request(i):
+        audio = predict_audio.AudioFeatures.from_file(AUDIO_FIXTURES[i % len(AUDIO_FIXTURES)])
+        return predict_audio.predict_clip(models, audio, workers=workers)
+
+    with Timer() as first:
+        request(0)
+    latencies, results, reloads = measure(request, args.requests, registry_loads)
+    return {
+        "import_ms": import_time.ms,
+        "load_ms": load_time.ms,
+        "first_request_ms": first.ms,
+        "latencies": latencies,
+        "reload_latencies": reloads,
+        "stages_ms": stage_medians(r.get("timings_ms") for r in results),
+        "errors": results[-1]["errors"],
+        "throughput": concurrent_throughput(request, args.batch_size, args.concurrency),
+    }
+
+def bench_video(args, workdir):
+    clip = make_video_fixture(os.path.join(workdir, "synthetic.avi"))
+    with Timer() as import_time:
+        import predict_video
+    with Timer() as load_time:
+        models, workers = predict_video.load_ensemble()
+        load_members(models)
+    if not models:
+        raise RuntimeError(f"no video models available: {predict_video.get_registry().unavailable('video')}")
+
+    options = predict_video.parse_args([clip, "--mode", "frames"])
+    request = lambda i: predict_video.predict_per_frame(models, clip, options, workers=workers)
+    with Timer() as first:
+        request(0)
+    latencies, results, reloads = measure(request, args.requests, registry_loads)
+    return {
+        "import_ms": import_time.ms,
+        "load_ms": load_time.ms,
+        "first_request_ms": first.ms,
+        "latencies": latencies,
+        "reload_latencies": reloads,
+        "stages_ms": stage_medians(r.get("timings_ms") for r in results if r),
+        "throughput": concurrent_throughput(request, max(1, args.batch_size // 4), args.concurrency),
+    }
+
+def bench_transcribe(args, workdir):
+    if not AUDIO_FIXTURES:
+        raise RuntimeError("no .wav fixtures in backend/audios")
+    with Timer() as import_time:
+        import audioOrVideoToText as transcriber
+    with Timer() as load_time:
+        model = transcriber.load_whisper(args.whisper_model)
+    options = transcriber.decode_options()
+
+    request = lambda i: transcriber.transcribe(model, AUDIO_FIXTURES[i % len(AUDIO_FIXTURES)], options)
+    with Timer() as first:
+        request(0)
+    latencies, _, _ = measure(request, args.requests)
+    return {
+        "import_ms": import_time.ms,
+        "load_ms": load_time.ms,
+        "first_request_ms": first.ms,
+        "latencies": latencies,
+        "throughput": concurrent_throughput(request, len(AUDIO_FIXTURES), 1),
+    }
+
+def start_gemini_stub(latency_ms):
+    """The local Gemini stand-in on a free port, in a background thread."""
+    from http.server import ThreadingHTTPServer
+    from gemini_stub import make_handler
+    from scenario_bank import load_intents
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(load_intents(), latency_ms, 40, 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def bench_game(args, workdir):
+    # gamni reads its endpoint at import time, so the stub must be up first
+    os.environ["GEMINI_API_ENDPOINT"] = start_gemini_stub(args.llm_latency_ms)
+    os.environ.setdefault("GOOGLE_API_KEY", "stub")  # the stub ignores it, but gamni needs one to generate
+    os.environ["SCENARIO_CACHE"] = "off"
+
+    with Timer() as import_time:
+        import gamni
+    from scenario_bank import ScenarioBank
+    with Timer() as load_time:
+        service = gamni.ScenarioService(gamni.GeminiScenarioGenerator(), ScenarioBank(seed=0), seed=0)
+
+    def play(session_id, turns, think_ms):
+        """One game: each turn answers the previous scenario, after a pause to read it."""
+        scenario = service.bank.sample("stress", "medium", session_id=session_id)
+        latencies = []
+        for turn in range(turns):
+            time.sleep(think_ms / 1000)
+            option = scenario["responses"][turn % len(scenario["responses"])]["option"]
+            with Timer() as t:
+                scenario, _, _ = service.next_scenario(scenario, option, 0.5, session_id=session_id)
+            latencies.append(t.ms)
+        return latencies
+
+    with Timer() as first:
+        play("first", 1, 0)
+    latencies = play("latency", args.requests, args.think_ms)
+    throughput = concurrent_throughput(lambda i: play(f"throughput-{i}", 5, 0), args.batch_size, args.concurrency)
+    throughput["items"] *= 5  # turns, not games
+    throughput["items_per_s"] = round(throughput["items"] / throughput["seconds"], 3)
+
+    # One uncached, un-prefetched turn: the full prompt, stream and parse round trip
+    scenario = service.bank.sample("stress", "medium")
+    with Timer() as generation:
+        gamni.generate_scenario_with_stress(scenario, scenario["responses"][0]["option"], 0.5,
+                                            service.generator, service.bank)
+    return {
+        "import_ms": import_time.ms,
+        "load_ms": load_time.ms,
+        "first_request_ms": first.ms,
+        "latencies": latencies,
+        "stages_ms": {"llm_round_trip": round(generation.ms, 3)},
+        "service": service.stats(),
+        "throughput": throughput,
+    }
+
+def bench_music(args, workdir):
+    with Timer() as import_time:
+        import music
+    fixture = make_music_fixture(os.path.join(workdir, "music_fixture.json"))
+
+    class StubClient(music.FixtureClient):
+        """Recorded results with the round trip of a live search."""
+
+        def search(self, query, filter=None, limit=music.SEARCH_LIMIT):
+            time.sleep(args.search_latency_ms / 1000)
+            return super().search(query, filter, limit)
+
+    with Timer() as load_time:
+        engine = music.MusicEngine(client=StubClient(fixture))
+    emotions = list(music.EMOTION_MAPPING)
+
+    with Timer() as first:
+        engine.recommend(emotions[0])
+    with Timer() as warm_all:
+        engine.warm()
+    latencies, _, _ = measure(lambda i: engine.recommend(emotions[i % len(emotions)]), args.requests)
+    return {
+        "import_ms": import_time.ms,
+        "load_ms": load_time.ms,
+        "first_request_ms": first.ms,
+        "latencies": latencies,
+        "stages_ms": {"warm_all_pools": round(warm_all.ms, 3)},
+        "engine": engine.stats(),
+        "throughput": concurrent_throughput(
+            lambda i: engine.recommend(emotions[i % len(emotions)]), args.batch_size * 10, args.concurrency
+        ),
+    }
+
+BENCHMARKS = {
+    "text": bench_text,
+    "audio": bench_audio,
+    "video": bench_video,
+    "transcribe": bench_transcribe,
+    "game": bench_game,
+    "music": bench_music,
+}
+
+def run_child(args):
+    """Benchmark one modality in this (fresh) process and print its result as JSON."""
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr  # the utilities print progress; keep stdout to the result
+
+    result = {"modality": args.child}
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            measured = BENCHMARKS[args.child](args, workdir)
+            latencies = measured.pop("latencies")
+            reloads = measured.pop("reload_latencies", [])
+            result.update({key: round(value, 3) if isinstance(value, float) else value
+                           for key, value in measured.items()})
+            # Cold: the process up to its first answer. Steady state: the warm
+            # requests after it, without any that had to (re)load a model.
+            result["cold_start_ms"] = round(measured["import_ms"] + measured["load_ms"] + measured["first_request_ms"], 3)
+            result["latency_ms"] = latency_summary(latencies)
+            result["reload_latency_ms"] = latency_summary(reloads)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+    result["peak_rss_mb"] = rss_peak_mb()
+    protocol_out.write(json.dumps(result) + "\n")
+
+# ======================
+# Runner
+# ======================
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=UTILITIES_DIR, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def child_argv(args, modality):
+    return [
+        sys.executable, os.path.abspath(__file__), "--child", modality,
+        "--requests", str(args.requests), "--batch-size", str(args.batch_size),
+        "--concurrency", str(args.concurrency), "--think-ms", str(args.think_ms),
+        "--llm-latency-ms", str(args.llm_latency_ms), "--search-latency-ms", str(args.search_latency_ms),
+        "--whisper-model", args.whisper_model,
+    ]
+
+def run_suite(args):
+    # Measure the work itself, not the prediction cache
+    env = dict(os.environ, EMOTION_CACHE="off", SCENARIO_CACHE="off", MUSIC_CACHE="off")
+    results = {}
+    for modality in args.modalities:
+        print(f"⏱️ Benchmarking {modality}...", file=sys.stderr)
+        with Timer() as wall:
+            try:
+                completed = subprocess.run(child_argv(args, modality), cwd=UTILITIES_DIR, env=env,
+                                           capture_output=True, text=True, timeout=args.timeout)
+                lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+                result = json.loads(lines[-1]) if lines else {
+                    "modality": modality,
+                    "error": f"benchmark process exited with {completed.returncode}: {completed.stderr[-500:]}",
+                }
+            except subprocess.TimeoutExpired:
+                result = {"modality": modality, "error": f"timed out after {args.timeout} s"}
+        result["process_wall_ms"] = round(wall.ms, 3)
+        results[modality] = result
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "requests": args.requests,
+            "batch_size": args.batch_size,
+            "concurrency": args.concurrency,
+            "think_ms": args.think_ms,
+            "llm_latency_ms": args.llm_latency_ms,
+            "search_latency_ms": args.search_latency_ms,
+            "whisper_model": args.whisper_model,
+        },
+        "results": results,
+    }
+
+# Metric path -> True when a larger value is better
+TRACKED_METRICS = {
+    ("cold_start_ms",): False,
+    ("first_request_ms",): False,
+    ("latency_ms", "p50"): False,
+    ("latency_ms", "p95"): False,
+    ("latency_ms", "p99"): False,
+    ("throughput", "items_per_s"): True,
+    ("peak_rss_mb",): False,
+}
+
+def lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+def compare(report, baseline, tolerance):
+    """Print every tracked metric against the baseline; returns the regressions beyond tolerance."""
+    regressions = []
+    for modality, result in report["results"].items():
+        previous = baseline.get("results", {}).get(modality)
+        if not previous:
+            continue
+        for path, higher_is_better in TRACKED_METRICS.items():
+            new, old = lookup(result, path), lookup(previous, path)
+            if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            marker = "❌" if worse > tolerance else "✅"
+            name = f"{modality}.{'.'.join(path)}"
+            print(f"{marker} {name}: {old:g} → {new:g} ({change:+.1%})", file=sys.stderr)
+            if worse > tolerance:
+                regressions.append(name)
+    return regressions
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Benchmark cold start, warm latency, throughput and peak RSS of the Python utilities"
+    )
+    parser.add_argument("--modalities", nargs="+", default=MODALITIES, choices=MODALITIES, metavar="MODALITY",
+                        help=f"What to benchmark (default: all of {', '.join(MODALITIES)})")
+    parser.add_argument("--requests", type=int, default=50, help="Warm requests per modality for the percentiles")
+    parser.add_argument("--batch-size", type=int, default=32, help="Items in the throughput run")
+    parser.add_argument("--concurrency", type=int, default=4, help="Threads in the concurrent throughput runs")
+    parser.add_argument("--think-ms", type=float, default=200,
+                        help="Pause between game turns, i.e. time the player spends reading")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Round trip of the stubbed Gemini API")
+    parser.add_argument("--search-latency-ms", type=float, default=150,
+                        help="Round trip of the stubbed YouTube Music search")
+    parser.add_argument("--whisper-model", default=os.environ.get("WHISPER_MODEL", "tiny"))
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds allowed per modality")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative slowdown that counts as a regression in --compare")
+    parser.add_argument("--child", choices=MODALITIES, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if args.child:
+        run_child(args)
+        return
+
+    report = run_suite(args)
+    document = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(document + "\n")
+        print(f"📝 Wrote {args.output}", file=sys.stderr)
+    else:
+        print(document)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
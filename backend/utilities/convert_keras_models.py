@@ -0,0 +1,71 @@
+import os
+import sys
+import glob
+import argparse
+
+# Suppress TensorFlow logs
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+import tensorflow as tf
+tf.get_logger().setLevel("ERROR")
+
+from frozen_tokenizer import load_tokenizer
+
+MODELS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models"))
+
+def convert(model, quantize, static_steps=None):
+    """Convert with builtin ops only, so the result runs on the slim tflite-runtime.
+
+    With static_steps the model is first wrapped with a batch of 1 and any
+    unknown time dimension set to static_steps: LSTMs only lower to builtin
+    TFLite ops when every shape is static.
+    """
+    if static_steps:
+        shape = (1,) + tuple(dim if dim else static_steps for dim in model.input_shape[1:])
+        inputs = tf.keras.Input(batch_shape=shape)
+        model = tf.keras.Model(inputs, model(inputs))
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS]
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]  # dynamic-range int8 weights
+    return converter.convert()
+
+def convert_folder(data_type, quantize, time_steps):
+    models_dir = os.path.join(MODELS_ROOT, data_type, "exported_files")
+
+    for model_path in sorted(glob.glob(os.path.join(models_dir, "*.h5"))):
+        model_name = os.path.basename(model_path)[:-len(".h5")]
+        tflite_path = os.path.join(models_dir, f"{model_name}.tflite")
+
+        try:
+            model = tf.keras.models.load_model(model_path, compile=False)
+            try:
+                flatbuffer = convert(model, quantize)
+            except Exception:
+                flatbuffer = convert(model, quantize, static_steps=time_steps)
+            with open(tflite_path, "wb") as f:
+                f.write(flatbuffer)
+            print(f"✅ {data_type}/{model_name}: {os.path.getsize(model_path) // 1024} KB "
+                  f"→ {os.path.getsize(tflite_path) // 1024} KB")
+        except Exception as e:
+            print(f"❌ Failed to convert {data_type}/{model_name}: {e}")
+
+    # The text predictor also needs its tokenizers without Keras
+    for tokenizer_path in sorted(glob.glob(os.path.join(models_dir, "*_tokenizer.pkl"))):
+        load_tokenizer(tokenizer_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the Keras .h5 emotion models to TFLite")
+    parser.add_argument("data_types", nargs="*", default=["text", "audio"],
+                        help="Model folders to convert (default: text audio)")
+    parser.add_argument("--quantize", action="store_true", help="Store weights as int8 (dynamic-range quantization)")
+    parser.add_argument("--time-steps", type=int, default=130,
+                        help="Sequence length baked into models that need static shapes (matches preprocessing)")
+    args = parser.parse_args(sys.argv[1:])
+
+    for data_type in args.data_types:
+        convert_folder(data_type, args.quantize, args.time_steps)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import os
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import span, current
+
+# One label space for every modality; the keys match EMOTION_MAPPING in music.py
+CANONICAL_EMOTIONS = ["angry", "disgust", "fear", "happy", "love", "neutral", "sad", "surprise"]
+
+# Spellings used by the different training sets (dair-ai text, CREMA-D, FER)
+EMOTION_ALIASES = {
+    "anger": "angry",
+    "ang": "angry",
+    "disgusted": "disgust",
+    "dis": "disgust",
+    "fearful": "fear",
+    "fea": "fear",
+    "joy": "happy",
+    "happiness": "happy",
+    "hap": "happy",
+    "calm": "neutral",
+    "neu": "neutral",
+    "sadness": "sad",
+    "surprised": "surprise",
+}
+
+UNDETERMINED = "Unable to determine"
+
+def canonical_emotion(label):
+    emotion = str(label).strip().lower()
+    emotion = EMOTION_ALIASES.get(emotion, emotion)
+    if emotion not in CANONICAL_EMOTIONS:
+        raise ValueError(f"Unknown emotion label: {label!r}")
+    return emotion
+
+def encoder_classes(label_encoder):
+    """Class names in model-output order for a LabelEncoder, a one-column OneHotEncoder or a list."""
+    if hasattr(label_encoder, "classes_"):
+        return list(label_encoder.classes_)
+    if hasattr(label_encoder, "categories_"):
+        return list(label_encoder.categories_[0])
+    return list(label_encoder)
+
+def class_projection(classes):
+    """Matrix that maps a model's output probabilities onto CANONICAL_EMOTIONS.
+
+    Built once per model at load time, so the hot path is a single matmul
+    instead of an inverse_transform call per prediction.
+    """
+    projection = np.zeros((len(classes), len(CANONICAL_EMOTIONS)), dtype=np.float32)
+    for i, label in enumerate(classes):
+        projection[i, CANONICAL_EMOTIONS.index(canonical_emotion(label))] = 1.0
+    return projection
+
+def to_canonical(probabilities, projection):
+    """Project one vector or a (batch, classes) matrix and renormalize each row."""
+    canonical = np.asarray(probabilities, dtype=np.float32) @ projection
+    totals = canonical.sum(axis=-1, keepdims=True)
+    return np.divide(canonical, totals, out=np.zeros_like(canonical), where=totals > 0)
+
+def parse_weights(spec):
+    """"cnn=0.35,rnn=0.2" -> {"cnn": 0.35, "rnn": 0.2}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        weights[name.strip()] = float(value)
+    return weights
+
+def ensemble_weights(data_type, defaults, spec=None):
+    """Default member weights, overridden by <DATA_TYPE>_ENSEMBLE_WEIGHTS and then by spec."""
+    weights = dict(defaults)
+    weights.update(parse_weights(os.environ.get(f"{data_type.upper()}_ENSEMBLE_WEIGHTS", "")))
+    if spec:
+        weights.update(parse_weights(spec))
+    return weights
+
+def as_distribution(vector):
+    return {emotion: round(float(p), 4) for emotion, p in zip(CANONICAL_EMOTIONS, vector)}
+
+def fuse(member_probabilities, weights):
+    """Weighted soft vote over canonical probability vectors.
+
+    member_probabilities maps model name -> vector over CANONICAL_EMOTIONS.
+    Models missing from weights count with weight 1. A member whose vector
+    is all zeros or not finite (to_canonical's answer to a NaN prediction)
+    abstains: it is left out of the vote and of predictions, rather than
+    pulling the fused distribution towards the first emotion. The
+    confidence is the fused probability of the winning emotion.
+    """
+    with span("fuse", members=len(member_probabilities)):
+        predictions = {}
+        distributions = {}
+        fused = np.zeros(len(CANONICAL_EMOTIONS), dtype=np.float64)
+        total_weight = 0.0
+
+        for model_name, probabilities in member_probabilities.items():
+            probabilities = np.asarray(probabilities, dtype=np.float64)
+            if not np.all(np.isfinite(probabilities)) or probabilities.sum() <= 0:
+                continue
+            weight = weights.get(model_name, 1)
+            predictions[model_name] = CANONICAL_EMOTIONS[int(np.argmax(probabilities))]
+            distributions[model_name] = as_distribution(probabilities)
+            fused += weight * probabilities
+            total_weight += weight
+
+        if total_weight > 0:
+            fused /= total_weight
+            class_index = int(np.argmax(fused))
+            final_prediction, confidence = CANONICAL_EMOTIONS[class_index], round(float(fused[class_index]), 4)
+        else:
+            final_prediction, confidence = UNDETERMINED, 0.0
+
+    return {
+        "final_prediction": final_prediction,
+        "confidence": confidence,
+        "probabilities": as_distribution(fused),
+        "predictions": predictions,
+        "model_probabilities": distributions,
+        "weights": {model_name: weights.get(model_name, 1) for model_name in predictions},
+    }
+
+def add_threading_arguments(parser):
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ENSEMBLE_WORKERS", "0")),
+                        help="Ensemble members run at once (1 = one after another, 0 = all of them)")
+    parser.add_argument("--intra-op-threads", type=int, default=int(os.environ.get("INTRA_OP_THREADS", "0")),
+                        help="Threads each model may use inside one op (0 = cores split across workers)")
+    parser.add_argument("--inter-op-threads", type=int, default=int(os.environ.get("INTER_OP_THREADS", "0")),
+                        help="Independent ops a framework may run at once (0 = framework default)")
+
+def split_cores(parts, cores=None):
+    """Share the machine's cores between parts that run at the same time, at least one each."""
+    cores = cores or os.cpu_count() or 1
+    base, extra = divmod(cores, parts)
+    return [max(1, base + (i < extra)) for i in range(parts)]
+
+def thread_plan(num_members, workers=0, intra_op_threads=0, cores=None):
+    """(members run at once, intra-op threads per member).
+
+    By default every member runs concurrently and the cores are split
+    between them, so members in parallel don't oversubscribe the CPU the
+    way N models each starting a full-width thread pool would. cores is
+    every core on the machine unless the caller runs several ensembles at
+    once and hands each its share (see split_cores).
+    """
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, min(workers or num_members, num_members))
+    return workers, intra_op_threads or max(1, cores // workers)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def _executor(workers):
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ensemble")
+        return _executors[workers]
+
+def run_members(predict, model_names, workers=1):
+    """Call predict(model_name) for every member, up to workers at a time.
+
+    TensorFlow, TFLite and torch release the GIL inside their kernels, so
+    threads are enough to overlap members and the wall time approaches the
+    slowest one. Returns ({name: result}, {name: error message}, {name: ms}).
+    """
+    results, errors, timings = {}, {}, {}
+    caller = current()
+
+    def timed(model_name):
+        start_time = time.perf_counter()
+        try:
+            with span("infer", parent=caller, model=model_name):
+                return predict(model_name), None, (time.perf_counter() - start_time) * 1000
+        except Exception as e:
+            return None, e, (time.perf_counter() - start_time) * 1000
+
+    if workers <= 1 or len(model_names) <= 1:
+        outcomes = [timed(model_name) for model_name in model_names]
+    else:
+        outcomes = list(_executor(workers).map(timed, model_names))
+
+    for model_name, (result, error, elapsed_ms) in zip(model_names, outcomes):
+        timings[model_name] = round(elapsed_ms, 2)
+        if error is None:
+            results[model_name] = result
+        else:
+            print(f"❌ Prediction error for {model_name}: {error}")
+            errors[model_name] = str(error)
+
+    return results, errors, timings
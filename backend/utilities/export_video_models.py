@@ -0,0 +1,153 @@
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from predict_video import (
+    EMOTION_CLASSES, IMAGE_SIZE, device, get_model_architecture, load_eager_model,
+    sample_frames, frames_to_tensor,
+)
+
+MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", "video", "exported_files"))
+
+def evaluation_inputs(video_paths, max_frames):
+    """Normalized frames from the given clips, or random tensors when no clip is given."""
+    batches = []
+    for path in video_paths:
+        frames, _ = sample_frames(path, sample_fps=2.0)
+        if len(frames):
+            batches.append(frames_to_tensor(frames).cpu())
+    if batches:
+        return torch.cat(batches)[:max_frames], "video"
+
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(max_frames, 3, IMAGE_SIZE, IMAGE_SIZE, generator=generator), "random"
+
+def quantize(model, method, calibration):
+    if method == "dynamic":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    # Static post-training quantization also covers the conv layers, which is
+    # where almost all of ResNet50's time goes; dynamic only touches the head.
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    prepared = prepare_fx(copy.deepcopy(model), get_default_qconfig_mapping("fbgemm"),
+                          example_inputs=(calibration[:1],))
+    with torch.inference_mode():
+        for start in range(0, len(calibration), 8):
+            prepared(calibration[start:start + 8])
+    return convert_fx(prepared)
+
+def freeze(model):
+    example = torch.zeros(1, 3, IMAGE_SIZE, IMAGE_SIZE)
+    with torch.inference_mode():
+        traced = torch.jit.trace(model, example)
+    return torch.jit.freeze(traced.eval())
+
+def probabilities(model, inputs, batch_size=8):
+    outputs = []
+    start_time = time.perf_counter()
+    with torch.inference_mode():
+        for start in range(0, len(inputs), batch_size):
+            outputs.append(F.softmax(model(inputs[start:start + batch_size]), dim=1))
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    return torch.cat(outputs).numpy(), elapsed_ms / len(inputs)
+
+def compare(reference, candidate):
+    return {
+        "top1_agreement": round(float(np.mean(reference.argmax(1) == candidate.argmax(1))), 4),
+        "max_abs_prob_delta": round(float(np.abs(reference - candidate).max()), 6),
+        "mean_abs_prob_delta": round(float(np.abs(reference - candidate).mean()), 6),
+    }
+
+def export_model(model_name, args, inputs, input_source):
+    model = load_eager_model(os.path.join(MODELS_DIR, f"{model_name}.pth"), model_name).cpu()
+    reference, fp32_ms = probabilities(model, inputs)
+    report = {"eval_inputs": input_source, "num_inputs": len(inputs), "fp32_ms_per_frame": round(fp32_ms, 2)}
+
+    if args.quantize != "none":
+        exported = freeze(quantize(model, args.quantize, inputs))
+        path = os.path.join(MODELS_DIR, f"{model_name}.int8.torchscript.pt")
+    else:
+        exported = freeze(model)
+        path = os.path.join(MODELS_DIR, f"{model_name}.torchscript.pt")
+    torch.jit.save(exported, path)
+
+    candidate, exported_ms = probabilities(exported, inputs)
+    report["torchscript"] = {
+        "artifact": os.path.basename(path),
+        "quantization": args.quantize,
+        "ms_per_frame": round(exported_ms, 2),
+        **compare(reference, candidate),
+    }
+
+    if args.onnx:
+        onnx_path = os.path.join(MODELS_DIR, f"{model_name}.onnx")
+        torch.onnx.export(
+            model, inputs[:1], onnx_path, input_names=["frames"], output_names=["logits"],
+            dynamic_axes={"frames": {0: "batch"}, "logits": {0: "batch"}}, opset_version=17,
+        )
+        report["onnx"] = {"artifact": os.path.basename(onnx_path)}
+
+        try:
+            import onnxruntime
+            session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+            start_time = time.perf_counter()
+            logits = session.run(None, {"frames": inputs.numpy()})[0]
+            onnx_ms = (time.perf_counter() - start_time) * 1000 / len(inputs)
+            onnx_probs = F.softmax(torch.from_numpy(logits), dim=1).numpy()
+            report["onnx"].update({"ms_per_frame": round(onnx_ms, 2), **compare(reference, onnx_probs)})
+        except ImportError:
+            report["onnx"]["note"] = "onnxruntime not installed; accuracy not checked"
+
+    return report
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Export the video emotion models for fast CPU inference")
+    parser.add_argument("--models", nargs="*", default=None,
+                        help="Models to export (default: every .pth in the video exported_files folder)")
+    parser.add_argument("--quantize", choices=["none", "dynamic", "static"], default="none",
+                        help="int8 quantization: dynamic (Linear layers only) or static (calibrated, conv layers too)")
+    parser.add_argument("--onnx", action="store_true", help="Also write an ONNX copy of each fp32 model")
+    parser.add_argument("--video", nargs="*", default=[],
+                        help="Clips used for calibration and the accuracy report (random inputs if omitted)")
+    parser.add_argument("--max-frames", type=int, default=64, help="Frames used for calibration and comparison")
+    parser.add_argument("--report", default=os.path.join(MODELS_DIR, "export_report.json"),
+                        help="Where to write the accuracy-delta report")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if device.type != "cpu":
+        print("⚠️ Exporting for CPU inference; models are moved to the CPU.")
+
+    model_names = args.models or sorted(f[:-len(".pth")] for f in os.listdir(MODELS_DIR) if f.endswith(".pth"))
+    inputs, input_source = evaluation_inputs(args.video, args.max_frames)
+    if input_source == "random":
+        print("⚠️ No --video given: calibrating and comparing on random inputs.")
+
+    report = {"classes": EMOTION_CLASSES, "models": {}}
+    for model_name in model_names:
+        try:
+            get_model_architecture(model_name, len(EMOTION_CLASSES))  # fail fast on unknown names
+            report["models"][model_name] = export_model(model_name, args, inputs, input_source)
+            result = report["models"][model_name]["torchscript"]
+            print(f"✅ {model_name}: {result['artifact']} "
+                  f"(top-1 agreement {result['top1_agreement']:.2%}, "
+                  f"{report['models'][model_name]['fp32_ms_per_frame']} → {result['ms_per_frame']} ms/frame)")
+        except Exception as e:
+            print(f"❌ Failed to export {model_name}: {e}")
+            report["models"][model_name] = {"error": str(e)}
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+
+FROZEN_SUFFIX = ".frozen.json"
+FROZEN_FORMAT = 1
+
+class _PickledTokenizer:
+    """Plain attribute holder standing in for keras' Tokenizer while unpickling."""
+
+class _TokenizerUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        # Read the pickled Tokenizer's attributes without importing Keras/TensorFlow
+        if name == "Tokenizer" and module.endswith("preprocessing.text"):
+            return _PickledTokenizer
+        return super().find_class(module, name)
+
+class FrozenTokenizer:
+    """Read-only replacement for a fitted Keras Tokenizer.
+
+    Only keeps what texts_to_sequences needs: the text-splitting settings and
+    the words whose index is below num_words (the rest are never emitted), so
+    it is a fraction of the pickle's size and loads from plain JSON.
+    """
+
+    def __init__(self, words, num_words=None, filters="", lower=True, split=" ",
+                 char_level=False, oov_token=None):
+        self.words = list(words)
+        self.num_words = num_words
+        self.filters = filters
+        self.lower = lower
+        self.split = split
+        self.char_level = char_level
+        self.oov_token = oov_token
+        self.word_index = {word: i for i, word in enumerate(self.words, start=1)}
+        self.oov_index = self.word_index.get(oov_token) if oov_token is not None else None
+        self.translate_map = str.maketrans({c: split for c in filters})
+        self.fingerprint = hashlib.sha256(
+            json.dumps(self.to_dict(), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    @classmethod
+    def from_keras_pickle(cls, path):
+        with open(path, "rb") as f:
+            state = _TokenizerUnpickler(f).load().__dict__
+
+        num_words = state.get("num_words")
+        index_word = {index: word for word, index in state["word_index"].items()}
+        last_index = len(index_word) if not num_words else min(num_words - 1, len(index_word))
+        words = [index_word[i] for i in range(1, last_index + 1)]
+
+        return cls(
+            words,
+            num_words=num_words,
+            filters=state.get("filters", ""),
+            lower=state.get("lower", True),
+            split=state.get("split", " "),
+            char_level=state.get("char_level", False),
+            oov_token=state.get("oov_token"),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("format") != FROZEN_FORMAT:
+            raise ValueError(f"Unsupported frozen tokenizer format: {data.get('format')}")
+        return cls(data["words"], **data["config"])
+
+    def to_dict(self):
+        return {
+            "format": FROZEN_FORMAT,
+            "config": {
+                "num_words": self.num_words,
+                "filters": self.filters,
+                "lower": self.lower,
+                "split": self.split,
+                "char_level": self.char_level,
+                "oov_token": self.oov_token,
+            },
+            "words": self.words,
+        }
+
+    def text_to_word_sequence(self, text):
+        if self.lower:
+            text = text.lower()
+        if self.char_level:
+            return list(text)
+        return [word for word in text.translate(self.translate_map).split(self.split) if word]
+
+    def texts_to_sequences(self, texts):
+        sequences = []
+        for text in texts:
+            sequence = []
+            for word in self.text_to_word_sequence(text):
+                index = self.word_index.get(word)
+                if index is not None:
+                    sequence.append(index)
+                elif self.oov_index is not None:
+                    sequence.append(self.oov_index)
+            sequences.append(sequence)
+        return sequences
+
+def pad_sequences(sequences, maxlen, value=0):
+    """Same result as keras' pad_sequences with its default pre-padding/truncation."""
+    padded = np.full((len(sequences), maxlen), value, dtype="int32")
+    for i, sequence in enumerate(sequences):
+        if not sequence:
+            continue
+        trunc = sequence[-maxlen:]
+        padded[i, -len(trunc):] = trunc
+    return padded
+
+def load_tokenizer(pickle_path):
+    """Load a tokenizer, building or refreshing its frozen copy next to the pickle."""
+    frozen_path = pickle_path.replace(".pkl", FROZEN_SUFFIX)
+
+    if os.path.exists(frozen_path) and os.path.getmtime(frozen_path) >= os.path.getmtime(pickle_path):
+        try:
+            with open(frozen_path, "r", encoding="utf-8") as f:
+                return FrozenTokenizer.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    tokenizer = FrozenTokenizer.from_keras_pickle(pickle_path)
+    try:
+        with open(frozen_path, "w", encoding="utf-8") as f:
+            json.dump(tokenizer.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+    except OSError:
+        pass  # Read-only model directory; keep using the in-memory copy
+    return tokenizer
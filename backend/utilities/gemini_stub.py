@@ -0,0 +1,118 @@
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from scenario_bank import load_intents
+
+def stub_scenario(prompt, scenarios, rng):
+    """A scenario in the shape gamni.py asks Gemini for, drawn from the game dataset."""
+    difficulty = re.search(r"Target difficulty: (\w+)", prompt)
+    emotion = re.search(r"Emotional state: (\w+)", prompt)
+    intent = rng.choice(scenarios)
+    responses = [dict(response) for response in intent["responses"]]
+    return {
+        "scenario": intent["scenario"],
+        "emotion": emotion.group(1) if emotion else intent["emotion"],
+        "difficulty": difficulty.group(1) if difficulty else "medium",
+        "responses": responses,
+        "best_choice_index": max(range(len(responses)), key=lambda i: responses[i]["reward"]),
+    }
+
+# Models tend to explain themselves after the JSON; streaming clients can hang up before this
+TRAILING_PROSE = (
+    "\n\nThis scenario gives the player a chance to practise a calm, assertive response "
+    "instead of reacting on impulse, and the rewards favour options that build coping skills."
+)
+
+def candidate(text):
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+    }
+
+def make_handler(scenarios, latency_ms, chunk_chars, seed):
+    rng = random.Random(seed)
+
+    class Handler(BaseHTTPRequestHandler):
+        """POST /v1beta/models/<model>:generateContent and :streamGenerateContent, as the REST transport sends them.
+
+        latency_ms is the time the whole reply takes; a streamed reply spreads
+        it over chunks of chunk_chars characters, like tokens arriving.
+        """
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            streaming = ":streamGenerateContent" in self.path
+            if not streaming and ":generateContent" not in self.path:
+                self.send_error(404, "Only generateContent and streamGenerateContent are stubbed")
+                return
+
+            prompt = " ".join(
+                part.get("text", "")
+                for content in body.get("contents", [])
+                for part in content.get("parts", [])
+            )
+            text = "```json\n" + json.dumps(stub_scenario(prompt, scenarios, rng), indent=2) + "\n```" + TRAILING_PROSE
+
+            if streaming:
+                self.stream(text)
+                return
+
+            time.sleep(latency_ms / 1000)  # stand-in for the model's round trip
+            payload = json.dumps(candidate(text)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def stream(self, text):
+            """Send the reply as a JSON array of partial responses, one chunk at a time."""
+            chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()  # no Content-Length: the body ends when the connection closes
+            n = 0  # chunks sent so far, also when the opening bracket is what fails
+            try:
+                self.wfile.write(b"[")
+                for n, chunk in enumerate(chunks):
+                    time.sleep(latency_ms / 1000 / len(chunks))
+                    self.wfile.write((b"," if n else b"") + json.dumps(candidate(chunk)).encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"]")
+            except (BrokenPipeError, ConnectionResetError):
+                self.log_message("client cancelled after %d of %d chunks", n, len(chunks))
+
+        def log_message(self, format, *args):
+            sys.stderr.write(f"gemini-stub: {format % args}\n")
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the Gemini REST API; point GEMINI_API_ENDPOINT at it"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=800, help="Time each full response takes")
+    parser.add_argument("--chunk-chars", type=int, default=40, help="Characters per streamed chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(sys.argv[1:])
+
+    handler = make_handler(load_intents(), args.latency_ms, args.chunk_chars, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Gemini stub on http://{args.host}:{args.port} ({args.latency_ms:.0f} ms per response)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
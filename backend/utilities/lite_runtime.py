@@ -0,0 +1,107 @@
+import os
+import threading
+import numpy as np
+
+from model_registry import base_path
+from tracing import span
+
+# Suppress TensorFlow logs in case we do end up importing it
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+def _interpreter_class():
+    """The lightest TFLite interpreter that is installed, or None."""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        return None
+
+class LiteModel:
+    """A converted .tflite model behind the small slice of the Keras API we call.
+
+    predict() accepts any batch size: the input tensor is resized when the
+    converted model allows it, otherwise rows are run one at a time.
+    """
+
+    def __init__(self, model_path, interpreter_class, num_threads=None):
+        self.model_path = model_path
+        self.interpreter_class = interpreter_class
+        self.num_threads = num_threads
+        self._build()
+        self.resizable = -1 in self.input.get("shape_signature", [])
+        self.lock = threading.Lock()  # an interpreter must not be invoked concurrently
+
+    def _build(self):
+        self.interpreter = self.interpreter_class(model_path=self.model_path, num_threads=self.num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.converted_shape = tuple(self.input["shape"])
+        self.shape = self.converted_shape
+
+    def _resize(self, shape):
+        if shape != self.shape:
+            self.shape = shape
+            self.interpreter.resize_tensor_input(self.input["index"], shape)
+            self.interpreter.allocate_tensors()
+
+    def _invoke(self, batch):
+        self._resize(batch.shape)
+        self.interpreter.set_tensor(self.input["index"], batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output["index"]).copy()
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x, dtype=self.input["dtype"])
+        with self.lock:
+            if x.shape == self.converted_shape:
+                return self._invoke(x)
+
+            if self.resizable:
+                try:
+                    return self._invoke(x)
+                except (RuntimeError, ValueError):
+                    # Some graphs (or delegates) can't take a new batch size after
+                    # all; a failed resize leaves the interpreter unusable
+                    self.resizable = False
+                    self._build()
+
+            return np.concatenate([self._invoke(x[i:i + 1]) for i in range(x.shape[0])])
+
+def _configure_tensorflow(tf, num_threads, inter_op_threads):
+    try:
+        if num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError:
+        pass  # already initialized by an earlier model; the first settings stand
+
+def load_model(models_dir, model_name, num_threads=None, inter_op_threads=None):
+    """Prefer <name>.tflite on a TFLite interpreter; fall back to Keras and <name>.h5.
+
+    TensorFlow is only imported on the fallback path, so a worker whose
+    models are all converted never pays its import time or memory.
+    num_threads caps the intra-op threads of either runtime.
+    """
+    tflite_path = os.path.join(models_dir, f"{model_name}.tflite")
+    interpreter_class = _interpreter_class() if os.path.exists(tflite_path) else None
+    if interpreter_class is not None:
+        return LiteModel(tflite_path, interpreter_class, num_threads)
+
+    with span("import", module="tensorflow"):
+        import tensorflow as tf
+    tf.get_logger().setLevel("ERROR")
+    _configure_tensorflow(tf, num_threads, inter_op_threads)
+    return tf.keras.models.load_model(os.path.join(models_dir, f"{model_name}.h5"))
+
+def load_manifest_model(entry, num_threads=None, inter_op_threads=None):
+    """ModelRegistry loader: (model, path of the artifact that was loaded) for a manifest entry."""
+    folder, model_name = os.path.split(base_path(entry["path"]))
+    model = load_model(folder, model_name, num_threads, inter_op_threads)
+    return model, getattr(model, "model_path", os.path.join(folder, f"{model_name}.h5"))
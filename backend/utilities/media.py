@@ -0,0 +1,162 @@
+import os
+import cv2
+import numpy as np
+
+from tracing import span
+
+# PyAV reads webm/mp4 uploads in-process; without it callers fall back to OpenCV and ffmpeg
+try:
+    import av
+except ImportError:
+    av = None
+
+SAMPLE_RATE = 16000  # Whisper's rate; the audio ensemble reads the same samples
+FRAME_SIZE = 224
+
+class DecodedMedia:
+    """What one pass over an upload produced.
+
+    pcm is mono float32 at sample_rate (None without an audio track) and
+    resampled holds the same track at each of the extra rates demux was
+    asked for, converted from the source rather than from pcm;
+    frames is a uint8 (N, FRAME_SIZE, FRAME_SIZE, 3) RGB array with the
+    time in seconds of each frame in timestamps (empty without video).
+    Both are handed on as they are: Whisper slices pcm in place and
+    torch.from_numpy wraps frames without copying.
+    """
+
+    def __init__(self, pcm, sample_rate, frames, timestamps, duration, resampled=None):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.resampled = resampled or {}
+        self.frames = frames
+        self.timestamps = timestamps
+        self.duration = duration
+
+def available():
+    return av is not None
+
+def _duration(container, stream):
+    if stream is not None and stream.duration and stream.time_base:
+        return float(stream.duration * stream.time_base)
+    if container.duration:
+        return container.duration / av.time_base
+    return None  # MediaRecorder webm often has no duration until it is remuxed
+
+def demux(path, sample_fps=2.0, max_memory_mb=64, face_tracker=None, audio=True, video=True,
+          sample_rate=SAMPLE_RATE, extra_rates=()):
+    """Decode the audio track and sample video frames in a single pass over the container.
+
+    Audio is resampled to mono float32 at sample_rate as packets arrive,
+    and in the same pass at every rate in extra_rates (for models trained
+    at another rate, which should not see an already downsampled track).
+    Video frames are kept at a uniform stride of 1 / sample_fps seconds and
+    only kept frames are converted and resized, straight to RGB at
+    FRAME_SIZE, so memory is bounded by max_memory_mb whatever the clip's
+    length or resolution. As in predict_video.sample_frames, the stride
+    is widened up front when the duration is known, and otherwise by
+    dropping every other kept frame once the budget is exceeded. With a
+    face_tracker each kept frame is cropped to the face first and frames
+    without one are skipped.
+    """
+    if av is None:
+        raise RuntimeError("PyAV is not installed")
+
+    with span("decode", path=os.path.basename(path), bytes=os.path.getsize(path)) as decode_span:
+        container = av.open(path)
+        try:
+            audio_stream = next(iter(container.streams.audio), None) if audio else None
+            video_stream = next(iter(container.streams.video), None) if video else None
+            streams = [stream for stream in (audio_stream, video_stream) if stream is not None]
+            if video_stream is not None:
+                video_stream.thread_type = "AUTO"
+
+            max_frames = max(1, int(max_memory_mb * 1024 * 1024 // (FRAME_SIZE * FRAME_SIZE * 3)))
+            step = 1.0 / sample_fps
+            duration = _duration(container, video_stream or audio_stream)
+            if duration:
+                step = max(step, duration / max_frames)
+
+            rates = [sample_rate] + [rate for rate in extra_rates if rate != sample_rate]
+            resamplers = {rate: av.AudioResampler(format="flt", layout="mono", rate=rate)
+                          for rate in rates} if audio_stream else {}
+            chunks = {rate: [] for rate in rates}
+            frames = []
+            timestamps = []
+            next_time = 0.0
+
+            for packet in container.demux(*streams) if streams else ():
+                for frame in packet.decode():
+                    if packet.stream is audio_stream:
+                        for rate, resampler in resamplers.items():
+                            chunks[rate].extend(resampled.to_ndarray()[0] for resampled in resampler.resample(frame))
+                        continue
+
+                    timestamp = frame.time if frame.time is not None else len(timestamps) * step
+                    if timestamp < next_time:
+                        continue  # decoded (later frames may depend on it) but never converted
+                    next_time += step
+                    while next_time <= timestamp:
+                        next_time += step
+
+                    if face_tracker is not None:
+                        face = face_tracker.crop(frame.to_ndarray(format="bgr24"))
+                        if face is None:
+                            continue
+                        face = cv2.resize(face, (FRAME_SIZE, FRAME_SIZE), interpolation=cv2.INTER_AREA)
+                        frames.append(cv2.cvtColor(face, cv2.COLOR_BGR2RGB))
+                    else:
+                        frames.append(frame.to_ndarray(width=FRAME_SIZE, height=FRAME_SIZE, format="rgb24",
+                                                       interpolation="AREA"))
+                    timestamps.append(timestamp)
+
+                    if len(frames) > max_frames:
+                        frames = frames[::2]
+                        timestamps = timestamps[::2]
+                        step *= 2
+                        next_time = timestamps[-1] + step
+
+            for rate, resampler in resamplers.items():
+                chunks[rate].extend(resampled.to_ndarray()[0] for resampled in resampler.resample(None))
+        finally:
+            container.close()
+
+        tracks = {rate: np.concatenate(pieces).astype(np.float32, copy=False)
+                  for rate, pieces in chunks.items() if pieces}
+        pcm = tracks.pop(sample_rate, None)
+        frames = np.stack(frames) if frames else np.empty((0, FRAME_SIZE, FRAME_SIZE, 3), dtype=np.uint8)
+        if duration is None:
+            duration = max(len(pcm) / sample_rate if pcm is not None else 0.0,
+                           timestamps[-1] if timestamps else 0.0)
+        decode_span.set(samples=len(pcm) if pcm is not None else 0, frames=len(frames), seconds=round(duration, 2))
+    return DecodedMedia(pcm, sample_rate, frames, timestamps, duration, tracks)
+
+def iter_audio(path, sample_rate=SAMPLE_RATE):
+    """The audio track as mono float32 chunks at sample_rate, yielded as packets are decoded.
+
+    Nothing but the current packet is held, so callers that consume the
+    track in order (predict_audio.iter_windows) use the same memory for a
+    ten-second clip and a two-hour one.
+    """
+    if av is None:
+        raise RuntimeError("PyAV is not installed")
+
+    container = av.open(path)
+    try:
+        stream = next(iter(container.streams.audio), None)
+        if stream is None:
+            return
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+        for packet in container.demux(stream):
+            for frame in packet.decode():
+                for resampled in resampler.resample(frame):
+                    yield resampled.to_ndarray()[0]
+        for resampled in resampler.resample(None):
+            yield resampled.to_ndarray()[0]
+    finally:
+        container.close()
+
+def load_audio(path, sample_rate=SAMPLE_RATE):
+    """Just the audio track, as mono float32 at sample_rate (an empty array if there is none)."""
+    pcm = demux(path, audio=True, video=False, sample_rate=sample_rate).pcm
+    return pcm if pcm is not None else np.zeros(0, dtype=np.float32)
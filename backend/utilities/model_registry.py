@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+
+from tracing import current_rss_bytes, span
+
+MODELS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models"))
+MANIFEST_PATH = os.path.join(MODELS_ROOT, "manifest.json")
+
+# Converted artifacts sit next to the manifest's source file under the same base name
+MODEL_SUFFIXES = (".tflite", ".h5", ".int8.torchscript.pt", ".torchscript.pt", ".pth")
+
+def base_path(path):
+    for suffix in MODEL_SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return os.path.splitext(path)[0]
+
+class ModelRegistry:
+    """Models listed in models/manifest.json, loaded on first use and evicted LRU-first.
+
+    Each manifest entry names a source artifact (path + checksum), an
+    ensemble weight, its labels and a preprocessing spec. Predictors
+    register a loader per data type; get() calls it the first time a model
+    is needed, and once the resident models exceed the memory budget the
+    least recently used ones are dropped again. Sizes are the on-disk size
+    of the artifact each loader reports, which tracks weight memory far
+    better than RSS deltas that also count framework imports.
+    """
+
+    def __init__(self, manifest_path=MANIFEST_PATH, budget_mb=None):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        self.root = os.path.dirname(os.path.abspath(manifest_path))
+        self.modalities = manifest.get("modalities", {})
+        self.budget_bytes = int(float(
+            budget_mb or os.environ.get("MODEL_MEMORY_BUDGET_MB") or manifest.get("memory_budget_mb", 1024)
+        ) * 1024 * 1024)
+        self.entries = {}
+        for data_type, models in manifest["models"].items():
+            self.entries[data_type] = OrderedDict(
+                (name, self._resolve(data_type, name, entry)) for name, entry in models.items()
+            )
+
+        self.loaders = {}
+        self.resident = OrderedDict()  # (data_type, name) -> (model, size in bytes), oldest first
+        self.stats = {}
+        self.verified = {}  # path -> (mtime_ns, checksum ok)
+        self.lock = threading.RLock()
+
+    def _resolve(self, data_type, name, entry):
+        entry = dict(entry, name=name, data_type=data_type)
+        entry["path"] = os.path.join(self.root, entry["path"])
+        if isinstance(entry.get("labels"), str):
+            entry["labels"] = os.path.join(self.root, entry["labels"])
+        preprocessing = dict(entry.get("preprocessing") or {})
+        if "tokenizer" in preprocessing:
+            preprocessing["tokenizer"] = os.path.join(self.root, preprocessing["tokenizer"])
+        entry["preprocessing"] = preprocessing
+        return entry
+
+    def missing_files(self, entry):
+        base = base_path(entry["path"])
+        missing = []
+        if not any(os.path.exists(base + suffix) for suffix in MODEL_SUFFIXES):
+            missing.append(os.path.basename(entry["path"]))
+        for path in (entry.get("labels"), entry["preprocessing"].get("tokenizer")):
+            if isinstance(path, str) and not os.path.exists(path):
+                missing.append(os.path.basename(path))
+        return missing
+
+    def available(self, data_type):
+        """Entries whose files are all present, in manifest order."""
+        return OrderedDict(
+            (name, entry) for name, entry in self.entries.get(data_type, {}).items()
+            if not self.missing_files(entry)
+        )
+
+    def unavailable(self, data_type):
+        """{name: reason} for manifest entries that can't be loaded from this checkout."""
+        reasons = {}
+        for name, entry in self.entries.get(data_type, {}).items():
+            missing = self.missing_files(entry)
+            if missing:
+                reasons[name] = f"missing {', '.join(missing)}"
+        return reasons
+
+    def weights(self, data_type):
+        return {name: entry.get("weight", 1) for name, entry in self.entries.get(data_type, {}).items()}
+
+    def modality_settings(self, setting, default):
+        """{data_type: setting} from the manifest's "modalities" section, e.g. the fusion weight of each ensemble."""
+        return {data_type: settings.get(setting, default) for data_type, settings in self.modalities.items()}
+
+    def register_loader(self, data_type, loader):
+        """loader(entry) -> (model, path of the artifact it loaded)."""
+        self.loaders[data_type] = loader
+
+    def verify(self, entry, artifact_path):
+        """Check the manifest checksum when the loaded artifact is the source file it describes."""
+        checksum = entry.get("checksum")
+        if not checksum or os.path.abspath(artifact_path) != os.path.abspath(entry["path"]):
+            return
+        mtime_ns = os.stat(artifact_path).st_mtime_ns
+        if self.verified.get(artifact_path, (None,))[0] != mtime_ns:
+            algorithm, _, expected = checksum.partition(":")
+            digest = hashlib.new(algorithm)
+            with open(artifact_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            self.verified[artifact_path] = (mtime_ns, digest.hexdigest() == expected)
+        if not self.verified[artifact_path][1]:
+            raise ValueError(f"Checksum mismatch for {os.path.basename(artifact_path)}")
+
+    def get(self, data_type, name):
+        key = (data_type, name)
+        with self.lock:
+            if key in self.resident:
+                self.resident.move_to_end(key)
+                self.stats[key]["hits"] += 1
+                return self.resident[key][0]
+
+            entry = self.entries[data_type][name]
+            rss_before = current_rss_bytes()
+            start_time = time.perf_counter()
+            with span("load", data_type=data_type, model=name) as load_span:
+                model, artifact_path = self.loaders[data_type](entry)
+                self.verify(entry, artifact_path)
+                size = os.path.getsize(artifact_path)
+                load_span.set(artifact=os.path.basename(artifact_path), size_mb=round(size / 2 ** 20, 2))
+            load_ms = (time.perf_counter() - start_time) * 1000
+            rss_after = current_rss_bytes()
+
+            self.resident[key] = (model, size)
+            stats = self.stats.setdefault(key, {"loads": 0, "hits": 0, "evictions": 0})
+            stats.update({
+                "loads": stats["loads"] + 1,
+                "artifact": os.path.basename(artifact_path),
+                "size_mb": round(size / 2 ** 20, 2),
+                "load_ms": round(load_ms, 2),
+                "rss_delta_mb": round((rss_after - rss_before) / 2 ** 20, 2) if rss_before is not None else None,
+            })
+            print(f"📦 Loaded {data_type}/{name} from {stats['artifact']} "
+                  f"in {stats['load_ms']:.0f} ms ({stats['size_mb']} MB)")
+
+            self._evict(keep=key)
+            return model
+
+    def _evict(self, keep):
+        while sum(size for _, size in self.resident.values()) > self.budget_bytes and len(self.resident) > 1:
+            key = next(k for k in self.resident if k != keep)
+            del self.resident[key]
+            self.stats[key]["evictions"] += 1
+            print(f"♻️ Evicted {key[0]}/{key[1]} to stay under {self.budget_bytes // 2 ** 20} MB")
+
+    def member(self, data_type, name, **components):
+        """An ensemble member dict whose "model" is fetched through this registry on access."""
+        return LazyMember(self, data_type, name, components)
+
+    def report(self):
+        """Per-model state, load time and memory, plus the registry's totals."""
+        with self.lock:
+            models = {}
+            for data_type, entries in self.entries.items():
+                unavailable = self.unavailable(data_type)
+                for name in entries:
+                    key = (data_type, name)
+                    if name in unavailable:
+                        state = {"state": "unavailable", "reason": unavailable[name]}
+                    else:
+                        state = {"state": "loaded" if key in self.resident else "not loaded"}
+                    models.setdefault(data_type, {})[name] = {**state, **self.stats.get(key, {})}
+
+            rss = current_rss_bytes()
+            return {
+                "budget_mb": round(self.budget_bytes / 2 ** 20, 2),
+                "resident_mb": round(sum(size for _, size in self.resident.values()) / 2 ** 20, 2),
+                "process_rss_mb": round(rss / 2 ** 20, 2) if rss is not None else None,
+                "models": models,
+            }
+
+class LazyMember(dict):
+    """An ensemble member's light components, with "model" loaded by the registry on access."""
+
+    def __init__(self, registry, data_type, name, components):
+        super().__init__(components)
+        self.registry = registry
+        self.data_type = data_type
+        self.name = name
+
+    def __getitem__(self, key):
+        if key == "model":
+            return self.registry.get(self.data_type, self.name)
+        return super().__getitem__(key)
+
+_shared_registry = None
+_shared_registry_lock = threading.Lock()
+
+def get_registry():
+    """Process-wide registry, so one worker can host every modality under one budget."""
+    global _shared_registry
+    with _shared_registry_lock:
+        if _shared_registry is None:
+            _shared_registry = ModelRegistry()
+        return _shared_registry
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the model manifest against the files on disk")
+    parser.add_argument("data_types", nargs="*", help="Data types to check (default: all)")
+    args = parser.parse_args(sys.argv[1:])
+
+    registry = get_registry()
+    ok = True
+    for data_type in args.data_types or list(registry.entries):
+        unavailable = registry.unavailable(data_type)
+        for name, entry in registry.entries[data_type].items():
+            if name in unavailable:
+                ok = False
+                print(f"❌ {data_type}/{name}: {unavailable[name]}")
+                continue
+            try:
+                if os.path.exists(entry["path"]):
+                    registry.verify(entry, entry["path"])
+                print(f"✅ {data_type}/{name}")
+            except ValueError as e:
+                ok = False
+                print(f"❌ {data_type}/{name}: {e}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from tracing import span, current
+from model_registry import get_registry
+from prediction_cache import get_cache, models_fingerprint, file_key
+from ensemble import (
+    CANONICAL_EMOTIONS, UNDETERMINED, as_distribution, fuse, parse_weights, add_threading_arguments, split_cores,
+)
+import media
+import predict_text
+import predict_audio
+import predict_video
+from audioOrVideoToText import DEFAULT_MODEL, DEFAULT_PRECISION, load_whisper, decode_options, iter_segments
+
+# Bump when the shape of a cached result changes
+CACHE_NAMESPACE = "multimodal/v2"
+
+MODALITIES = ("text", "audio", "video")
+
+# Per-modality fusion weights and calibration temperatures come from models/manifest.json
+MODALITY_WEIGHTS = get_registry().modality_settings("weight", 1)
+MODALITY_TEMPERATURES = get_registry().modality_settings("temperature", 1.0)
+
+def calibrate(probabilities, temperature=1.0):
+    """Temperature-scaled distribution: softmax(log(p) / T).
+
+    T > 1 softens an over-confident ensemble and T < 1 sharpens an
+    under-confident one, so each modality's vote counts for what its
+    confidence is actually worth before they are mixed.
+    """
+    logits = np.log(np.clip(np.asarray(probabilities, dtype=np.float64), 1e-12, None)) / temperature
+    logits -= logits.max()
+    scaled = np.exp(logits)
+    return scaled / scaled.sum()
+
+def probability_vector(result):
+    return np.array([result["probabilities"].get(emotion, 0.0) for emotion in CANONICAL_EMOTIONS])
+
+def decode_audio(path):
+    """The upload's audio track as AudioFeatures, or None if it has none.
+
+    Only used without PyAV (see media.demux). Files libsndfile can read (wav, flac, ogg) are read directly; anything
+    else is piped through ffmpeg once as 32-bit float WAV, never written to
+    disk.
+    """
+    with span("decode", stream="audio", path=os.path.basename(path)) as decode_span:
+        try:
+            y, sr = sf.read(path, dtype="float32")
+        except RuntimeError:  # not a container libsndfile knows
+            try:
+                completed = subprocess.run(
+                    ["ffmpeg", "-nostdin", "-v", "error", "-i", path, "-vn", "-ac", "1", "-c:a", "pcm_f32le",
+                     "-f", "wav", "-"],
+                    capture_output=True,
+                )
+            except OSError as e:
+                print(f"⚠️ Could not run ffmpeg: {e}")
+                return None
+            if completed.returncode != 0 or not completed.stdout:
+                decode_span.set(samples=0)
+                return None
+            y, sr = sf.read(io.BytesIO(completed.stdout), dtype="float32")
+        decode_span.set(samples=len(y), sample_rate=sr)
+    return predict_audio.AudioFeatures(y, sr) if len(y) else None
+
+def summarize(result, **extra):
+    """The per-modality breakdown kept in the fused result."""
+    return {
+        "final_prediction": result["final_prediction"],
+        "confidence": result["confidence"],
+        "probabilities": result["probabilities"],
+        "predictions": result.get("predictions", {}),
+        "errors": result.get("errors", {}),
+        "timings_ms": result.get("timings_ms", {}),
+        **extra,
+    }
+
+class MultimodalPipeline:
+    """One upload in, one fused emotion out.
+
+    The container is read once with PyAV (media.demux): 16 kHz mono audio
+    for Whisper, the same track at the audio models' own rate (see
+    predict_audio.AudioFeatures), and video frames sampled at the
+    configured rate. Transcript segments go to the text ensemble.
+    The video and audio ensembles then run alongside Whisper, so the wall
+    time is close to the slowest branch (usually Whisper followed by the
+    text models) rather than the sum. Without PyAV, frames are sampled with
+    OpenCV in parallel with a single ffmpeg decode of the audio. Each modality's distribution is temperature-calibrated and the
+    modalities are mixed with ensemble.fuse; a modality with no models or no
+    input drops out of the vote and the others are renormalized.
+    """
+
+    def __init__(self, text_models, audio_models, video_models, whisper_model, options, video_args,
+                 weights=MODALITY_WEIGHTS, temperatures=MODALITY_TEMPERATURES, workers=None, whisper_threads=None):
+        self.models = {"text": text_models, "audio": audio_models, "video": video_models}
+        self.whisper_model = whisper_model
+        self.options = options
+        self.video_args = video_args
+        self.weights = weights
+        self.temperatures = temperatures
+        self.workers = workers or {modality: 1 for modality in MODALITIES}
+        # torch threads for Whisper; the video ensemble's configure_threads only sets them for new threads
+        self.whisper_threads = whisper_threads or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="modality")
+
+    def _run(self, modality, parent, branch, *args):
+        """Run one branch under its own span; failures become that modality's error."""
+        start_time = time.perf_counter()
+        try:
+            with span(modality, parent=parent):
+                if not self.models[modality]:
+                    raise RuntimeError(f"no {modality} models available")
+                result = branch(*args)
+        except Exception as e:
+            print(f"❌ {modality} branch failed: {e}")
+            result = {"error": str(e)}
+        result["wall_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+        return result
+
+    def _video(self, path, frames=None, timestamps=None):
+        if frames is None:
+            frames, timestamps = predict_video.sample_video(path, self.video_args)
+        elif len(frames) == 0 and self.video_args.face_crop:
+            print("⚠️ No face found in video, using full frames")
+            decoded = media.demux(path, self.video_args.fps, self.video_args.max_memory_mb, audio=False)
+            frames, timestamps = decoded.frames, decoded.timestamps
+        if len(frames) == 0:
+            raise RuntimeError("no video frames")
+        result = predict_video.predict_frames(
+            self.models["video"], frames, timestamps, self.video_args, predict_video.MODEL_WEIGHTS,
+            self.workers["video"],
+        )
+        return summarize(result, frames=len(frames), timeline=result["timeline"])
+
+    def _audio(self, audio):
+        if audio is None:
+            raise RuntimeError("no audio track")
+        result = predict_audio.predict_clip(
+            self.models["audio"], audio, predict_audio.MODEL_WEIGHTS, self.workers["audio"]
+        )
+        return summarize(result, seconds=round(audio.duration, 2))
+
+    def _text(self, segments):
+        sentences = [segment["text"].strip() for segment in segments if segment["text"].strip()]
+        if not sentences:
+            raise RuntimeError("empty transcript")
+        results = predict_text.predict_sentences(
+            self.models["text"], sentences, predict_text.MODEL_WEIGHTS, self.workers["text"]
+        )
+        # Longer segments say more about the speaker's state than a short filler
+        lengths = np.array([len(sentence) for sentence in sentences], dtype=np.float64)
+        averaged = sum(length * probability_vector(r) for length, r in zip(lengths, results)) / lengths.sum()
+        class_index = int(np.argmax(averaged))
+        return summarize({
+            "final_prediction": CANONICAL_EMOTIONS[class_index] if averaged.sum() > 0 else UNDETERMINED,
+            "confidence": round(float(averaged[class_index]), 4),
+            "probabilities": as_distribution(averaged),
+            "errors": results[0]["errors"],
+            "timings_ms": results[0]["timings_ms"],
+        }, sentences=len(sentences))
+
+    def transcribe(self, audio, on_segment=None):
+        segments = []
+        if audio is None:
+            return segments
+        with predict_video.torch_threads(self.whisper_threads):
+            for segment in iter_segments(self.whisper_model, audio.pcm16k(), self.options):
+                segments.append(segment)
+                if on_segment:
+                    on_segment(segment)
+        return segments
+
+    def predict(self, path, on_segment=None):
+        """Fused emotion, transcript and per-modality breakdown for one upload."""
+        start_time = time.perf_counter()
+        parent = current()
+        if media.available():
+            decoded = media.demux(
+                path, self.video_args.fps, self.video_args.max_memory_mb,
+                predict_video.FaceTracker() if self.video_args.face_crop else None,
+                extra_rates=predict_audio.model_sample_rates(),
+            )
+            has_audio = decoded.pcm is not None and len(decoded.pcm) > 0
+            audio = predict_audio.AudioFeatures(
+                decoded.pcm, decoded.sample_rate, resampled=decoded.resampled,
+            ) if has_audio else None
+            video = self.executor.submit(
+                self._run, "video", parent, self._video, path, decoded.frames, decoded.timestamps
+            )
+        else:
+            video = self.executor.submit(self._run, "video", parent, self._video, path)
+            audio = decode_audio(path)
+        decode_ms = round((time.perf_counter() - start_time) * 1000, 2)
+        audio_result = self.executor.submit(self._run, "audio", parent, self._audio, audio)
+
+        transcribe_start = time.perf_counter()
+        try:
+            segments = self.transcribe(audio, on_segment)
+        except Exception as e:
+            print(f"❌ Transcription failed: {e}")
+            segments = []
+        transcribe_ms = round((time.perf_counter() - transcribe_start) * 1000, 2)
+        text = self._run("text", parent, self._text, segments)
+
+        modalities = {"text": text, "audio": audio_result.result(), "video": video.result()}
+        calibrated = {
+            modality: calibrate(probability_vector(result), self.temperatures.get(modality, 1.0))
+            for modality, result in modalities.items()
+            if "error" not in result and result["final_prediction"] != UNDETERMINED
+        }
+        result = fuse(calibrated, self.weights)
+        result.pop("predictions")
+        result["modality_probabilities"] = result.pop("model_probabilities")
+        result.update({
+            "transcript": "".join(segment["text"] for segment in segments).strip(),
+            "segments": segments,
+            "modalities": modalities,
+            "timings_ms": {
+                "decode": decode_ms,
+                "transcribe": transcribe_ms,
+                **{modality: modalities[modality]["wall_ms"] for modality in MODALITIES},
+                "total": round((time.perf_counter() - start_time) * 1000, 2),
+            },
+        })
+        return result
+
+def pipeline_fingerprint(whisper_name, precision):
+    parts = [models_fingerprint(module.models_dir(modality)) for modality, module in
+             (("text", predict_text), ("audio", predict_audio), ("video", predict_video))]
+    return ":".join(parts + [whisper_name, precision])
+
+def video_arguments(args):
+    return predict_video.parse_args(
+        ["-", "--mode", "frames", "--fps", str(args.fps), "--max-memory-mb", str(args.max_memory_mb)]
+        + (["--face-crop"] if args.face_crop else [])
+    )
+
+def modality_weights(args):
+    weights = dict(MODALITY_WEIGHTS)
+    weights.update(parse_weights(args.weights or os.environ.get("MULTIMODAL_WEIGHTS", "")))
+    return weights
+
+def cache_settings(weights, temperatures, video_args):
+    """Everything besides the upload and the model files that changes a fused result."""
+    return json.dumps({"weights": weights, "temperatures": temperatures, "video": vars(video_args)},
+                      sort_keys=True, default=str)
+
+def load_pipeline(args):
+    video_args = video_arguments(args)
+    # Whisper, the audio and the video ensemble run at the same time, so each plans its threads within its
+    # own share of the cores; the text ensemble runs after Whisper on the same thread and reuses its share
+    whisper_cores, audio_cores, video_cores = split_cores(3)
+    text_cores = whisper_cores
+    text_models, text_workers = predict_text.load_ensemble(
+        args.workers, args.intra_op_threads, args.inter_op_threads, text_cores
+    )
+    audio_models, audio_workers = predict_audio.load_ensemble(
+        args.workers, args.intra_op_threads, args.inter_op_threads, audio_cores
+    )
+    video_models, video_workers = predict_video.load_ensemble(
+        args.workers, args.intra_op_threads, args.inter_op_threads, video_cores
+    )
+    weights = modality_weights(args)
+    return MultimodalPipeline(
+        text_models, audio_models, video_models,
+        load_whisper(args.whisper_model, args.precision), decode_options(precision=args.precision), video_args,
+        weights=weights,
+        workers={"text": text_workers, "audio": audio_workers, "video": video_workers},
+        whisper_threads=args.intra_op_threads or whisper_cores,
+    )
+
+def unavailable():
+    return {modality: get_registry().unavailable(modality) for modality in MODALITIES}
+
+def serve(pipeline, args):
+    """Keep every ensemble and Whisper resident and answer one JSON request per stdin line.
+
+    Requests are {"id": 1, "path": "..."}. Transcript segments are streamed
+    as {"id", "event": "segment", ...} while the ensembles run, and the
+    request ends with the fused result. {"id": 1, "op": "stats"} returns
+    the prediction cache counters and {"id": 1, "op": "models"} the model
+    registry report.
+    """
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    def send(message):
+        protocol_out.write(json.dumps(message) + "\n")
+        protocol_out.flush()
+
+    cache = get_cache()
+    fingerprint = pipeline_fingerprint(args.whisper_model, args.precision)
+    settings = cache_settings(pipeline.weights, pipeline.temperatures, pipeline.video_args)
+    send({"ready": True, "unavailable": unavailable()})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if request.get("op") == "stats":
+                send({"id": request_id, "cache": cache.stats() if cache else None})
+                continue
+            if request.get("op") == "models":
+                send({"id": request_id, **get_registry().report()})
+                continue
+
+            with span("request", trace=request_id, op="multimodal"):
+                key = file_key(CACHE_NAMESPACE, request["path"], fingerprint, settings) if cache else None
+                result = cache.get(key) if cache else None
+                if result is not None:
+                    for segment in result["segments"]:
+                        send({"id": request_id, "event": "segment", **segment})
+                else:
+                    result = pipeline.predict(
+                        request["path"], lambda segment: send({"id": request_id, "event": "segment", **segment})
+                    )
+                    if cache and not any("error" in m for m in result["modalities"].values()):
+                        cache.set(key, result)
+            send({"id": request_id, **result})
+        except Exception as e:
+            send({"id": request_id, "error": str(e)})
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Predict one emotion from the transcript, voice and face in a single upload"
+    )
+    parser.add_argument("file_path", nargs="?", help="Upload to analyse once and print")
+    parser.add_argument("--serve", action="store_true", help="Run as a resident JSON-lines worker")
+    parser.add_argument("--json", action="store_true", help="Print the full fused result as JSON")
+    parser.add_argument("--weights", help='Modality weights, e.g. "text=0.5,video=0.3" (others keep their defaults)')
+    parser.add_argument("--whisper-model", default=DEFAULT_MODEL, help="Whisper model size")
+    parser.add_argument("--precision", choices=["fp32", "fp16", "int8"], default=DEFAULT_PRECISION)
+    parser.add_argument("--fps", type=float, default=2.0, help="Video frames to sample per second")
+    parser.add_argument("--max-memory-mb", type=float, default=64, help="Upper bound on memory used by sampled frames")
+    parser.add_argument("--face-crop", action="store_true", help="Classify only the detected face")
+    add_threading_arguments(parser)
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args(sys.argv[1:])
+    if not args.serve and not args.file_path:
+        print("❌ Please provide an audio or video file path.", file=sys.stderr)
+        sys.exit(1)
+
+    output = sys.stdout
+    if args.serve or args.json:
+        sys.stdout = sys.stderr  # keep stdout to the protocol / the single JSON document
+
+    if args.serve:
+        pipeline = load_pipeline(args)
+        sys.stdout = output  # serve() does its own swap
+        serve(pipeline, args)
+        return
+
+    try:
+        if not os.path.exists(args.file_path):
+            raise FileNotFoundError("Provided file path does not exist.")
+
+        # A cache hit answers without decoding the upload or loading Whisper and the ensembles
+        cache = get_cache()
+        key = file_key(
+            CACHE_NAMESPACE, args.file_path, pipeline_fingerprint(args.whisper_model, args.precision),
+            cache_settings(modality_weights(args), MODALITY_TEMPERATURES, video_arguments(args)),
+        ) if cache else None
+        result = cache.get(key) if cache else None
+
+        if result is None:
+            result = load_pipeline(args).predict(args.file_path)
+            if cache and not any("error" in m for m in result["modalities"].values()):
+                cache.set(key, result)
+    except Exception as e:
+        if args.json:
+            print(json.dumps({"error": str(e)}), file=output)
+        else:
+            print(f"❌ Error: {str(e)}")
+        return
+
+    if args.json:
+        print(json.dumps(result), file=output)
+        return
+
+    print(f"📝 Transcript: {result['transcript']}")
+    for modality, breakdown in result["modalities"].items():
+        if "error" in breakdown:
+            print(f" - {modality}: ⚠️ {breakdown['error']}")
+        else:
+            wall_ms = f", {breakdown['wall_ms']:.0f} ms" if "wall_ms" in breakdown else ""  # not kept in the cache
+            print(f" - {modality}: {breakdown['final_prediction']} ({breakdown['confidence']:.2f}{wall_ms})")
+    print(f"\n🎯 Fused Prediction: {result['final_prediction']} ({result['confidence']:.2f}) "
+          f"in {result['timings_ms']['total']:.0f} ms" + (" (cached)" if result.get("cached") else ""))
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,78 @@
-import time
+import os
 import sys
+import json
+import time
+import argparse
+import threading
 import webbrowser
-from ytmusicapi import YTMusic
+from concurrent.futures import ThreadPoolExecutor
+
+from prediction_cache import PredictionCache, text_key
+
+CACHE_PATH = os.environ.get(
+    "MUSIC_CACHE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "music.sqlite")),
+)
+CACHE_TTL = float(os.environ.get("MUSIC_CACHE_TTL", 24 * 3600))
+CACHE_NAMESPACE = "music/search/v1"
+SEARCH_LIMIT = 10
+SEARCH_WORKERS = int(os.environ.get("MUSIC_SEARCH_WORKERS", "4"))
 
 # ======================
 # 1. YOUTUBE MUSIC CLIENT SETUP (Anonymous)
 # ======================
 
-print("🔍 Setting up YouTube Music in anonymous mode...")
+class FixtureClient:
+    """Stand-in for YTMusic that answers search() from recorded results.
+
+    The fixture is a JSON object mapping each query to the list search()
+    returned for it, as written by RecordingClient. Unknown queries return
+    no results, so tests and benchmarks never touch the network.
+    """
 
-try:
-    ytmusic = YTMusic()
+    def __init__(self, path):
+        with open(path) as f:
+            self.results = json.load(f)
+
+    def search(self, query, filter=None, limit=SEARCH_LIMIT):
+        return self.results.get(query, [])[:limit]
+
+class RecordingClient:
+    """Passes searches through to a live client and saves every result to a fixture file."""
+
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.results = json.load(f)
+        except (OSError, ValueError):
+            self.results = {}
+
+    def search(self, query, filter=None, limit=SEARCH_LIMIT):
+        results = self.client.search(query, filter=filter, limit=limit)
+        with self.lock:
+            self.results[query] = results
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.results, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        return results
+
+def create_client(fixture=None, record=None):
+    """A FixtureClient for MUSIC_FIXTURE/fixture, otherwise anonymous YTMusic (optionally recorded)."""
+    fixture = fixture or os.environ.get("MUSIC_FIXTURE")
+    if fixture:
+        return FixtureClient(fixture)
+
+    from ytmusicapi import YTMusic
+
+    print("🔍 Setting up YouTube Music in anonymous mode...")
+    client = YTMusic()
     print("✅ YouTube Music setup successful (anonymous access)")
-except Exception as e:
-    print(f"❌ YouTube Music setup failed: {str(e)}")
-    sys.exit(1)
+    record = record or os.environ.get("MUSIC_RECORD")
+    return RecordingClient(client, record) if record else client
 
 # ======================
 # 2. EMOTION → GENRE + QUERY MAPPING
@@ -65,59 +123,156 @@ def parse_duration(duration_str):
         return parts[0] * 3600 + parts[1] * 60 + parts[2]
     return 0
 
-def get_recommendations(emotion, limit=3):
-    """Return a list of tracks matching the emotion with high popularity and valid duration"""
-    emotion = emotion.lower()
-    if emotion not in EMOTION_MAPPING:
-        print(f"❌ Unknown emotion '{emotion}'. Choose from: {list(EMOTION_MAPPING.keys())}")
-        return []
+def track_entry(track, genre):
+    """The recommendation fields for a search result, or None if it doesn't qualify."""
+    duration_str = track.get('duration')
+    if not duration_str or not track.get('videoId'):
+        return None
 
-    data = EMOTION_MAPPING[emotion]
-    tracks = []
+    try:
+        duration_sec = parse_duration(duration_str)
+    except ValueError:
+        return None
+    if not (180 <= duration_sec <= 300):  # 3 to 5 minutes
+        return None
 
-    for genre in data['genres']:
-        if len(tracks) >= limit:
-            break
+    artists = ", ".join(artist['name'] for artist in track.get('artists') or [])
+    title = track['title'].lower()
 
-        query = f"{genre} {data['query']}"
-        print(f"\n🔎 Searching for popular {emotion} songs in {genre}...")
+    is_english = any(c.isascii() for c in title)
+    is_arabic = any('\u0600' <= c <= '\u06FF' for c in title) or any('\u0600' <= c <= '\u06FF' for c in artists)
+    if not (is_english or is_arabic):
+        return None
 
-        try:
-            results = ytmusic.search(query, filter="songs", limit=10)
+    return {
+        "name": track['title'],
+        "artist": artists,
+        "url": f"https://music.youtube.com/watch?v={track['videoId']}",
+        "videoId": track['videoId'],
+        "genre": genre,
+        "duration": duration_str
+    }
 
-            for track in results:
-                if len(tracks) >= limit:
-                    break
+class MusicEngine:
+    """Emotion → track recommendations served from precomputed candidate pools.
 
-                duration_str = track.get('duration')
-                if not duration_str:
-                    continue
+    The client is created on first use. Raw search results are cached on
+    disk per (genre, query) for cache_ttl seconds, and an emotion's genre
+    searches run concurrently on a bounded pool. The filtered, de-duplicated
+    tracks of all its genres form the emotion's candidate pool, kept in
+    memory for the same ttl, so a recommendation is a slice of a list once
+    the pool is warm.
+    """
 
-                duration_sec = parse_duration(duration_str)
-                if not (180 <= duration_sec <= 300):  # 3 to 5 minutes
-                    continue
+    def __init__(self, client=None, cache=None, workers=SEARCH_WORKERS, cache_ttl=CACHE_TTL, fixture=None,
+                 record=None):
+        self._client = client
+        self.fixture = fixture
+        self.record = record
+        self.cache_ttl = cache_ttl
+        if cache is None and os.environ.get("MUSIC_CACHE", "on").lower() not in ("off", "0", "false"):
+            # Fixture runs keep their results out of the shared cache file
+            fixture_mode = fixture or os.environ.get("MUSIC_FIXTURE") or isinstance(client, FixtureClient)
+            cache = PredictionCache(path=None if fixture_mode else CACHE_PATH, ttl=cache_ttl)
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="music-search")
+        self.candidates = {}  # emotion -> (expires_at, tracks)
+        self.counters = {"searches": 0, "cached_searches": 0, "failed_searches": 0, "pool_hits": 0, "pool_builds": 0}
+        self.lock = threading.Lock()
+        self.emotion_locks = {emotion: threading.Lock() for emotion in EMOTION_MAPPING}
 
-                artists = ", ".join(artist['name'] for artist in track['artists'])
-                title = track['title'].lower()
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                self._client = create_client(self.fixture, self.record)
+            return self._client
 
-                is_english = any(c.isascii() for c in title)
-                is_arabic = any('\u0600' <= c <= '\u06FF' for c in title) or any('\u0600' <= c <= '\u06FF' for c in artists)
+    def search(self, genre, query):
+        """Raw search results for query, from the disk cache when fresh."""
+        key = text_key(CACHE_NAMESPACE, query, str(SEARCH_LIMIT))
+        results = self.cache.get(key) if self.cache is not None else None
+        if results is not None:
+            with self.lock:
+                self.counters["cached_searches"] += 1
+            return results
 
-                if is_english or is_arabic:
-                    tracks.append({
-                        "name": track['title'],
-                        "artist": artists,
-                        "url": f"https://music.youtube.com/watch?v={track['videoId']}",
-                        "videoId": track['videoId'],
-                        "genre": genre,
-                        "duration": duration_str
-                    })
+        print(f"\n🔎 Searching {genre} for '{query}'...")
+        results = self.client.search(query, filter="songs", limit=SEARCH_LIMIT)
+        with self.lock:
+            self.counters["searches"] += 1
+        if self.cache is not None:
+            self.cache.set(key, results)
+        return results
 
+    def _genre_tracks(self, emotion, genre):
+        try:
+            results = self.search(genre, f"{genre} {EMOTION_MAPPING[emotion]['query']}")
         except Exception as e:
             print(f"⚠️ Couldn't fetch {genre} tracks: {str(e)}")
-            continue
+            with self.lock:
+                self.counters["failed_searches"] += 1
+            return []
+        return [entry for entry in (track_entry(track, genre) for track in results) if entry]
+
+    def candidate_pool(self, emotion):
+        """Every qualifying track for emotion in genre order, building the pool if it has expired."""
+        with self.emotion_locks[emotion]:
+            expires_at, tracks = self.candidates.get(emotion, (0, None))
+            if tracks is not None and expires_at > time.time():
+                with self.lock:
+                    self.counters["pool_hits"] += 1
+                return tracks
+
+            seen = set()
+            tracks = []
+            for genre_tracks in self.pool.map(lambda genre: self._genre_tracks(emotion, genre),
+                                              EMOTION_MAPPING[emotion]['genres']):
+                for track in genre_tracks:
+                    if track["videoId"] not in seen:
+                        seen.add(track["videoId"])
+                        tracks.append(track)
+
+            # An empty pool (e.g. offline) is retried on the next request instead of cached
+            if tracks:
+                self.candidates[emotion] = (time.time() + self.cache_ttl, tracks)
+            with self.lock:
+                self.counters["pool_builds"] += 1
+            return tracks
+
+    def recommend(self, emotion, limit=3):
+        emotion = emotion.lower()
+        if emotion not in EMOTION_MAPPING:
+            print(f"❌ Unknown emotion '{emotion}'. Choose from: {list(EMOTION_MAPPING.keys())}")
+            return []
+        return [dict(track) for track in self.candidate_pool(emotion)[:limit]]
 
-    return tracks[:limit]
+    def warm(self, emotions=None):
+        """Build the candidate pools up front, e.g. at server start."""
+        for emotion in emotions or EMOTION_MAPPING:
+            self.candidate_pool(emotion)
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                "pools": {emotion: len(tracks) for emotion, (_, tracks) in self.candidates.items()},
+                "cache": self.cache.stats() if self.cache is not None else None,
+            }
+
+_shared_engine = None
+_shared_engine_lock = threading.Lock()
+
+def get_engine():
+    global _shared_engine
+    with _shared_engine_lock:
+        if _shared_engine is None:
+            _shared_engine = MusicEngine()
+        return _shared_engine
+
+def get_recommendations(emotion, limit=3):
+    """Return a list of tracks matching the emotion with high popularity and valid duration"""
+    return get_engine().recommend(emotion, limit)
 
 # ======================
 # 4. USER INTERFACE & PLAYBACK
@@ -154,17 +309,46 @@ def play_first_track(tracks):
 # 5. MAIN FUNCTION
 # ======================
 
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Recommend English/Arabic songs for an emotion")
+    parser.add_argument("emotion", nargs="?", help="Skip the menu and use this emotion")
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--fixture", help="Answer searches from a recorded JSON fixture instead of YouTube Music")
+    parser.add_argument("--record", help="Save every live search result to this fixture file")
+    parser.add_argument("--warm", action="store_true", help="Build every emotion's candidate pool first")
+    parser.add_argument("--json", action="store_true", help="Print the tracks as JSON and don't open a browser")
+    return parser.parse_args(argv)
+
 def main():
+    args = parse_args(sys.argv[1:])
+    if args.json:
+        # Keep stdout for the JSON document alone
+        protocol_out, sys.stdout = sys.stdout, sys.stderr
+
+    global _shared_engine
+    _shared_engine = MusicEngine(fixture=args.fixture, record=args.record)
+
+    if args.warm:
+        start_time = time.perf_counter()
+        _shared_engine.warm()
+        print(f"♨️ Candidate pools ready in {(time.perf_counter() - start_time) * 1000:.0f} ms: "
+              f"{_shared_engine.stats()['pools']}")
+
+    if args.json:
+        tracks = get_recommendations(args.emotion or "neutral", limit=args.limit)
+        protocol_out.write(json.dumps(tracks, ensure_ascii=False) + "\n")
+        return
+
     # Let user choose emotion
-    emotion = show_emotion_menu()
+    emotion = (args.emotion or show_emotion_menu()).lower()
     
     print(f"\n🎯 Emotion selected: {emotion.upper()}")
-    desc = EMOTION_MAPPING[emotion]['description']
+    desc = EMOTION_MAPPING.get(emotion, {}).get('description', "Unknown emotion")
     print(f"🎵 Description: {desc}")
     
     # Get recommendations
     print("\n⏳ Finding the best English/Arabic songs for you...")
-    tracks = get_recommendations(emotion, limit=3)
+    tracks = get_recommendations(emotion, limit=args.limit)
 
     print(f"\n===== RECOMMENDED TRACKS ({emotion.upper()}) =====")
     if not tracks:
@@ -1,123 +1,477 @@
 import os
 import sys
+import json
+import time
 import pickle
+import argparse
 import numpy as np
-import librosa
-import soundfile as sf
 
-# Suppress TensorFlow logs
-os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-import tensorflow as tf
-tf.get_logger().setLevel("ERROR")
+from tracing import span
+with span("import", module="librosa"):
+    import librosa
+    import soundfile as sf
 
-from tensorflow.keras.models import load_model
+# TensorFlow is only imported if a model has no .tflite conversion
+from lite_runtime import load_manifest_model
+from prediction_cache import get_cache, models_fingerprint, file_key
+from model_registry import get_registry
+from ensemble import (
+    CANONICAL_EMOTIONS, UNDETERMINED, encoder_classes, class_projection, to_canonical, ensemble_weights, fuse, as_distribution,
+    add_threading_arguments, thread_plan, run_members,
+)
 
-def load_all_models(data_type):
-    MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", data_type, "exported_files"))
-    models = {}
+# Bump when the shape of a cached result changes
+CACHE_NAMESPACE = "audio/v4"
 
-    for file in os.listdir(MODELS_DIR):
-        if file.endswith(".h5"):
-            model_name = file.replace(".h5", "")
-            model_path = os.path.join(MODELS_DIR, file)
-            label_path = os.path.join(MODELS_DIR, f"{model_name}_label_encoder.pkl")
+# Rate for models whose manifest preprocessing has no "sample_rate": librosa.load's
+# default, which cnn, lstm and lstm_CREMA_D were trained at. cnn_CREMA_D was trained
+# on CREMA-D at its native rate (librosa.load(sr=None), 16 kHz) and says so in the manifest.
+MODEL_SAMPLE_RATE = 22050
 
-            try:
-                model = load_model(model_path)
-                with open(label_path, "rb") as f:
-                    label_encoder = pickle.load(f)
+# Ensemble weights come from models/manifest.json
+MODEL_WEIGHTS = get_registry().weights("audio")
 
-                models[model_name] = {
-                    "model": model,
-                    "label_encoder": label_encoder
-                }
+def models_dir(data_type):
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", data_type, "exported_files"))
 
-            except Exception as e:
-                print(f"❌ Failed to load {model_name}: {e}")
+def load_all_models(data_type, num_threads=None, inter_op_threads=None):
+    """Labels and preprocessing of every model in the manifest; each model itself loads on first use."""
+    registry = get_registry()
+    registry.register_loader(data_type, lambda entry: load_manifest_model(entry, num_threads, inter_op_threads))
+    for model_name, reason in registry.unavailable(data_type).items():
+        print(f"⚠️ Skipping {data_type}/{model_name}: {reason}")
+
+    models = {}
+
+    for model_name, entry in registry.available(data_type).items():
+        try:
+            with open(entry["labels"], "rb") as f:
+                label_encoder = pickle.load(f)
+
+            models[model_name] = registry.member(
+                data_type, model_name,
+                label_encoder=label_encoder,
+                projection=class_projection(encoder_classes(label_encoder)),
+                preprocessing=entry["preprocessing"],
+            )
+
+        except Exception as e:
+            print(f"❌ Failed to load {model_name}: {e}")
 
     return models
 
-def preprocess_audio(y, sr, model_name):
+def model_sample_rates():
+    """Every rate an available audio model reads its features at."""
+    return sorted({entry["preprocessing"].get("sample_rate", MODEL_SAMPLE_RATE)
+                   for entry in get_registry().available("audio").values()})
+
+class AudioFeatures:
+    """One decoded clip plus memoized features derived from a single STFT per sample rate.
+
+    librosa's mfcc() and melspectrogram() both start from the same power
+    spectrogram (n_fft=2048, hop_length=512), and every mfcc() call builds a
+    128-band log-mel first. Computing those once and deriving each model's
+    variant from them gives the same numbers as the separate per-model calls.
+
+    Features are computed at the rate each model was trained at: the mel
+    filter banks and the fixed frame counts in the manifest both depend on
+    it, so a clip has to reach a model the same way whether it came from a
+    48 kHz wav, a 16 kHz decode or a streamed window. The clip is resampled
+    from the original samples at most once per rate, and a caller that
+    already has copies at other rates (media.DecodedMedia.resampled) can
+    pass them in.
+    """
+
+    def __init__(self, y, sr, resampled=None):
+        if y.ndim > 1:
+            y = y.mean(axis=1)
+        self.source = y
+        self.source_sr = sr
+        self.duration = len(y) / sr
+        self._cache = {("samples", rate): pcm for rate, pcm in (resampled or {}).items()}
+
+    @classmethod
+    def from_file(cls, file_path):
+        with span("decode", path=os.path.basename(file_path), bytes=os.path.getsize(file_path)) as decode_span:
+            y, sr = sf.read(file_path)
+            decode_span.set(samples=len(y), sample_rate=sr)
+        return cls(y, sr)
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def samples(self, sr=MODEL_SAMPLE_RATE):
+        """The clip as mono samples at sr."""
+        if sr == self.source_sr:
+            return self.source
+
+        def resample():
+            with span("resample", orig_sr=self.source_sr, target_sr=sr, samples=len(self.source)):
+                return librosa.resample(self.source.astype(np.float32), orig_sr=self.source_sr, target_sr=sr)
+        return self._memo(("samples", sr), resample)
+
+    def power_spectrogram(self, sr=MODEL_SAMPLE_RATE):
+        return self._memo(("power", sr), lambda: np.abs(librosa.stft(self.samples(sr))) ** 2)
+
+    def mel(self, n_mels, sr=MODEL_SAMPLE_RATE):
+        return self._memo(("mel", n_mels, sr), lambda: librosa.feature.melspectrogram(
+            S=self.power_spectrogram(sr), sr=sr, n_mels=n_mels))
+
+    def log_mel(self, n_mels, ref=1.0, sr=MODEL_SAMPLE_RATE):
+        return self._memo(("log_mel", n_mels, ref, sr), lambda: librosa.power_to_db(self.mel(n_mels, sr), ref=ref))
+
+    def mfcc(self, n_mfcc, sr=MODEL_SAMPLE_RATE):
+        return self._memo(("mfcc", n_mfcc, sr), lambda: librosa.feature.mfcc(S=self.log_mel(128, sr=sr),
+                                                                            n_mfcc=n_mfcc))
+
+    def pcm16k(self):
+        """The same samples as 16 kHz mono float32, ready for Whisper."""
+        return self.samples(16000).astype(np.float32, copy=False)
+
+def preprocess_audio(features, spec):
+    """Model input for one clip, as described by a manifest preprocessing spec.
+
+    "features" is "mfcc" or "log_mel" with "bands" rows, padded or cut to
+    "frames" columns, computed at "sample_rate" (MODEL_SAMPLE_RATE when
+    the spec has none). log_mel can be referenced to the clip's peak
+    ("ref": "max") and min-max scaled ("scale": "minmax"). "layout" is
+    "flat" (band-major), "flat_time_major" or "sequence" (1, frames, bands).
+    """
+    sr = spec.get("sample_rate", MODEL_SAMPLE_RATE)
+    if spec["features"] == "mfcc":
+        matrix = features.mfcc(spec["bands"], sr=sr)  # shape: (bands, time)
+    elif spec["features"] == "log_mel":
+        matrix = features.log_mel(spec["bands"], ref=np.max if spec.get("ref") == "max" else 1.0, sr=sr)
+    else:
+        raise ValueError(f"Unknown audio features: {spec['features']}")
+
+    matrix = librosa.util.fix_length(matrix, size=spec["frames"], axis=1)  # shape: (bands, frames)
+    if spec.get("scale") == "minmax":
+        value_range = np.max(matrix) - np.min(matrix)
+        # A silent window has a flat spectrogram; scale it to zeros instead of 0 / 0
+        matrix = (matrix - np.min(matrix)) / value_range if value_range > 0 else np.zeros_like(matrix)
+
+    layout = spec.get("layout", "sequence")
+    if layout == "flat":
+        return np.expand_dims(matrix.flatten(), axis=0)
+    if layout == "flat_time_major":
+        return np.expand_dims(matrix.T.flatten(), axis=0)  # (frames, bands) → (1, frames * bands)
+    return np.expand_dims(matrix.T, axis=0)  # → (1, frames, bands)
+
+def load_ensemble(workers=0, intra_op_threads=0, inter_op_threads=0, cores=None):
+    """Load the audio models with the cores split as ensemble.thread_plan says; returns (models, workers)."""
+    workers, intra_op_threads = thread_plan(len(get_registry().available("audio")), workers, intra_op_threads, cores)
+    return load_all_models("audio", intra_op_threads, inter_op_threads or None), workers
+
+def predict_clip(models_dict, audio, weights=MODEL_WEIGHTS, workers=1):
+    """Run every model on one clip and fuse their probabilities (see ensemble.fuse).
+
+    Features are computed first, one model after another, since they share
+    memoized spectrograms; the models then run up to workers at a time. A
+    model whose preprocessing or prediction fails is left out of the vote
+    and reported under "errors".
+    """
+    features = {}
+    errors = {}
+    featurize_ms = {}
+
+    for model_name, components in models_dict.items():
+        start_time = time.perf_counter()
+        try:
+            with span("featurize", model=model_name, seconds=round(audio.duration, 2)):
+                features[model_name] = preprocess_audio(audio, components["preprocessing"])
+        except Exception as e:
+            print(f"❌ Preprocessing failed for {model_name}: {e}")
+            errors[model_name] = f"Preprocessing failed: {e}"
+        featurize_ms[f"featurize:{model_name}"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+    def predict(model_name):
+        components = models_dict[model_name]
+        prediction = components["model"].predict(features[model_name], verbose=0)
+        return to_canonical(prediction, components["projection"])[0]
+
+    start_time = time.perf_counter()
+    member_probabilities, prediction_errors, timings = run_members(predict, list(features), workers)
+    timings["ensemble"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+    result = fuse(member_probabilities, weights)
+    result["errors"] = {**errors, **prediction_errors}
+    result["timings_ms"] = {**featurize_ms, **timings}
+    return result
+
+def iter_windows(file_path, window_seconds=3.0, hop_seconds=1.5):
+    """(start in seconds, mono float32 samples, sample rate) for overlapping windows of the recording.
+
+    Files libsndfile can read are pulled one window at a time with
+    soundfile.blocks. Other containers are decoded with PyAV straight to
+    MODEL_SAMPLE_RATE mono, the rate most models read, and windowed as the chunks arrive (see stream_windows). Either way only
+    about one window is in memory whatever the recording's length. A
+    trailing window shorter than the hop is dropped unless it is the only one.
+    """
     try:
-        if model_name == "cnn_CREMA_D":
-            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=24)  # shape: (24, time)
-            mfcc = librosa.util.fix_length(mfcc, size=32, axis=1)  # shape: (24, 32)
-            flattened = mfcc.T.flatten()  # (32, 24) → (768,)
-            return np.expand_dims(flattened, axis=0)  # → (1, 768)
-
-        elif model_name == "cnn":
-            mel = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=24)
-            log_mel = librosa.power_to_db(mel, ref=np.max)
-            log_mel = librosa.util.fix_length(log_mel, size=32, axis=1)
-            log_mel = (log_mel - np.min(log_mel)) / (np.max(log_mel) - np.min(log_mel))
-            return np.expand_dims(log_mel.flatten(), axis=0)
-
-        elif model_name == "lstm_CREMA_D":
-            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            mfcc = librosa.util.fix_length(mfcc, size=130, axis=1)
-            return np.expand_dims(mfcc.T, axis=0)
-
-        elif model_name == "lstm":
-            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=1)
-            mfcc = librosa.util.fix_length(mfcc, size=130, axis=1)
-            return np.expand_dims(mfcc.T, axis=0)
+        sample_rate = sf.info(file_path).samplerate
+    except RuntimeError:
+        import media
+        yield from stream_windows(media.iter_audio(file_path, MODEL_SAMPLE_RATE), MODEL_SAMPLE_RATE,
+                                  window_seconds, hop_seconds)
+        return
 
-    except Exception as e:
-        print(f"❌ Preprocessing failed for {model_name}: {e}")
-        return None
+    window, hop = int(window_seconds * sample_rate), int(hop_seconds * sample_rate)
+    blocks = sf.blocks(file_path, blocksize=window, overlap=window - hop, dtype="float32", always_2d=True)
+    for i, block in enumerate(blocks):
+        if i > 0 and len(block) <= window - hop:
+            break  # nothing beyond what the previous window already covered
+        yield i * hop / sample_rate, block.mean(axis=1), sample_rate
+
+def stream_windows(chunks, sample_rate, window_seconds=3.0, hop_seconds=1.5):
+    """Cut an iterable of mono float32 chunks into the same windows iter_windows yields for a file.
+
+    Samples are copied into one carry-over buffer of window + hop samples;
+    each time it holds a full window that window is yielded (as a copy, since
+    the buffer is reused) and the buffer slides on by one hop. Chunks of any
+    size are taken in pieces, so the buffer never grows.
+    """
+    window, hop = int(window_seconds * sample_rate), int(hop_seconds * sample_rate)
+    buffer = np.empty(window + hop, dtype=np.float32)
+    filled = start = 0
+    yielded = False
+    for chunk in chunks:
+        offset = 0
+        while offset < len(chunk):
+            take = min(len(buffer) - filled, len(chunk) - offset)
+            buffer[filled:filled + take] = chunk[offset:offset + take]
+            filled += take
+            offset += take
+            while filled >= window:
+                yield start / sample_rate, buffer[:window].copy(), sample_rate
+                yielded = True
+                buffer[:filled - hop] = buffer[hop:filled]
+                filled -= hop
+                start += hop
+    if filled > window - hop or not yielded:
+        yield start / sample_rate, buffer[:filled].copy(), sample_rate
+
+def predict_windows(models_dict, windows, weights=MODEL_WEIGHTS, workers=1):
+    """One fused result per (start, samples, sample rate) window, with one predict call per model.
+
+    Every window's features are stacked into a single batch per model; a
+    model whose preprocessing or prediction fails on any window sits out
+    the whole batch and is reported under "errors".
+    """
+    features = {name: [] for name in models_dict}
+    errors = {}
+    for _, samples, sample_rate in windows:
+        audio = AudioFeatures(samples, sample_rate)
+        for model_name in list(features):
+            try:
+                features[model_name].append(preprocess_audio(audio, models_dict[model_name]["preprocessing"]))
+            except Exception as e:
+                print(f"❌ Preprocessing failed for {model_name}: {e}")
+                errors[model_name] = f"Preprocessing failed: {e}"
+                del features[model_name]
+
+    def predict(model_name):
+        batch = np.concatenate(features[model_name])
+        prediction = models_dict[model_name]["model"].predict(batch, batch_size=len(batch), verbose=0)
+        return to_canonical(prediction, models_dict[model_name]["projection"])
+
+    with span("window_batch", windows=len(windows)):
+        probabilities, prediction_errors, timings = run_members(predict, list(features), workers)
+    errors.update(prediction_errors)
+
+    results = []
+    for i, (start, samples, sample_rate) in enumerate(windows):
+        result = fuse({name: rows[i] for name, rows in probabilities.items()}, weights)
+        result.update({"start": round(start, 2), "end": round(start + len(samples) / sample_rate, 2)})
+        results.append(result)
+    return results, errors, timings
+
+def stream_clip(models_dict, file_path, weights=MODEL_WEIGHTS, workers=1, window_seconds=3.0, hop_seconds=1.5,
+                batch_size=16, on_window=None):
+    """Emotion over time for a recording of any length, plus a session-level aggregate.
+
+    Windows are read incrementally (see iter_windows) and sent through the
+    ensemble batch_size at a time, so memory is bounded by one batch of
+    windows and their features rather than by the recording. Each window's
+    result is passed to on_window as soon as its batch finishes. The
+    aggregate is the mean of the windows' fused distributions, along with
+    the share of windows each emotion won.
+    """
+    timeline = []
+    errors = {}
+    total = np.zeros(len(CANONICAL_EMOTIONS), dtype=np.float64)
+    wins = {}
+    batch = []
+    start_time = time.perf_counter()
+
+    def flush():
+        results, batch_errors, _ = predict_windows(models_dict, batch, weights, workers)
+        errors.update(batch_errors)
+        for result in results:
+            vector = np.array([result["probabilities"][emotion] for emotion in CANONICAL_EMOTIONS])
+            if vector.sum() > 0:
+                total[:] += vector
+                wins[result["final_prediction"]] = wins.get(result["final_prediction"], 0) + 1
+            point = {
+                "start": result["start"],
+                "end": result["end"],
+                "emotion": result["final_prediction"],
+                "confidence": result["confidence"],
+                "probabilities": result["probabilities"],
+            }
+            timeline.append(point)
+            if on_window:
+                on_window(point)
+        batch.clear()
+
+    for window in iter_windows(file_path, window_seconds, hop_seconds):
+        batch.append(window)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    counted = sum(wins.values())
+    mean = total / counted if counted else total
+    class_index = int(np.argmax(mean))
+    return {
+        "final_prediction": CANONICAL_EMOTIONS[class_index] if counted else UNDETERMINED,
+        "confidence": round(float(mean[class_index]), 4),
+        "probabilities": as_distribution(mean),
+        "emotion_share": {emotion: round(count / counted, 4) for emotion, count in
+                          sorted(wins.items(), key=lambda item: -item[1])},
+        "seconds": timeline[-1]["end"] if timeline else 0.0,
+        "windows": len(timeline),
+        "timeline": timeline,
+        "errors": errors,
+        "timings_ms": {"total": round((time.perf_counter() - start_time) * 1000, 2)},
+    }
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Predict the emotion of an audio clip with the audio ensemble")
+    parser.add_argument("file_path")
+    parser.add_argument("--transcribe", action="store_true", help="Also transcribe the clip with Whisper")
+    parser.add_argument("--stream", action="store_true",
+                        help="Track emotion over sliding windows of a long recording instead of one fixed-size clip")
+    parser.add_argument("--window-seconds", type=float, default=3.0, help="Window length in --stream mode")
+    parser.add_argument("--hop-seconds", type=float, default=1.5, help="Step between windows in --stream mode")
+    parser.add_argument("--batch-size", type=int, default=16, help="Windows per ensemble call in --stream mode")
+    parser.add_argument("--json", action="store_true", help="Print the full ensemble result as JSON")
+    parser.add_argument("--weights", help='Ensemble weights, e.g. "cnn=0.4,lstm=0.1" (others keep their defaults)')
+    add_threading_arguments(parser)
+    return parser.parse_args(argv)
+
+def stream_main(args, weights, output):
+    cache = get_cache()
+    settings = json.dumps({"window": args.window_seconds, "hop": args.hop_seconds, "weights": weights}, sort_keys=True)
+    key = file_key(f"{CACHE_NAMESPACE}:stream", args.file_path, models_fingerprint(models_dir("audio")),
+                   settings) if cache else None
+    result = cache.get(key) if cache else None
+
+    if result is None:
+        models_dict, workers = load_ensemble(args.workers, args.intra_op_threads, args.inter_op_threads)
+        if not models_dict:
+            raise RuntimeError("No models were loaded. Check the model directory.")
+
+        def show(point):
+            print(f" {point['start']:7.1f}s-{point['end']:.1f}s: {point['emotion']} ({point['confidence']:.2f})")
+
+        result = stream_clip(models_dict, args.file_path, weights, workers, args.window_seconds, args.hop_seconds,
+                             args.batch_size, on_window=show)
+        result["unavailable"] = get_registry().unavailable("audio")
+        if cache and not result["errors"]:
+            cache.set(key, result)
+
+    if args.json:
+        print(json.dumps(result), file=output)
+        return
+
+    for name, error in result["errors"].items():
+        print(f" - {name}: ❌ {error}")
+    share = ", ".join(f"{emotion} {fraction:.0%}" for emotion, fraction in result["emotion_share"].items())
+    print(f"\n🎯 Session: {result['final_prediction']} ({result['confidence']:.2f}) over "
+          f"{result['seconds']:.0f} s in {result['windows']} windows ({share})")
 
 def main():
     if len(sys.argv) < 2:
         print("❌ Please provide an audio file path.")
         return
 
-    file_path = sys.argv[1]
+    args = parse_args(sys.argv[1:])
+    file_path = args.file_path
+    weights = ensemble_weights("audio", MODEL_WEIGHTS, args.weights)
+
+    output = sys.stdout
+    if args.json:
+        sys.stdout = sys.stderr  # keep stdout to the single JSON document
 
     try:
-        y, sr = sf.read(file_path)
-        if y.ndim > 1:
-            y = y.mean(axis=1)
+        if args.stream:
+            stream_main(args, weights, output)
+            return
 
-        models_dict = load_all_models("audio")
-        model_weights = {
-            "cnn_CREMA_D": 0.25,
-            "cnn": 0.25,
-            "lstm_CREMA_D": 0.25,
-            "lstm": 0.25
-        }
+        # A cache hit answers without decoding the clip or loading any model
+        cache = get_cache()
+        namespace = f"{CACHE_NAMESPACE}:{json.dumps(weights, sort_keys=True)}"
+        key = file_key(namespace, file_path, models_fingerprint(models_dir("audio"))) if cache else None
+        result = cache.get(key) if cache else None
+        audio = None
 
-        predictions = {}
-        weighted_votes = {}
+        if result is None:
+            start_time = time.perf_counter()
+            audio = AudioFeatures.from_file(file_path)
+            decode_ms = round((time.perf_counter() - start_time) * 1000, 2)
 
-        for model_name, components in models_dict.items():
-            model = components["model"]
-            encoder = components["label_encoder"]
-            features = preprocess_audio(y, sr, model_name)
+            models_dict, workers = load_ensemble(args.workers, args.intra_op_threads, args.inter_op_threads)
+            if not models_dict:
+                raise RuntimeError("No models were loaded. Check the model directory.")
 
-            if features is None:
-                predictions[model_name] = "Preprocessing failed"
-                continue
+            result = predict_clip(models_dict, audio, weights, workers)
+            result["unavailable"] = get_registry().unavailable("audio")
+            result["timings_ms"]["decode"] = decode_ms
+            if cache and not result["errors"]:
+                cache.set(key, result)
 
-            prediction = model.predict(features, verbose=0)
-            class_index = int(np.argmax(prediction, axis=1)[0])
-            label = encoder.inverse_transform([class_index])[0]
+        if args.transcribe:
+            from audioOrVideoToText import (
+                DEFAULT_MODEL, DEFAULT_PRECISION, load_whisper, decode_options, iter_segments,
+                transcript_key, transcript_result,
+            )
+            options = decode_options()
+            key = transcript_key(file_path, DEFAULT_MODEL, DEFAULT_PRECISION, options) if cache else None
+            transcript = cache.get(key) if cache else None
 
-            predictions[model_name] = label
-            weight = model_weights.get(model_name, 1)
-            weighted_votes[label] = weighted_votes.get(label, 0) + weight
+            if transcript is None:
+                audio = audio or AudioFeatures.from_file(file_path)
+                # Hand Whisper the already-decoded samples instead of decoding the file again
+                transcript = transcript_result(iter_segments(load_whisper(), audio.pcm16k(), options))
+                if cache:
+                    cache.set(key, transcript)
+            result = {**result, "transcript": transcript["text"]}
 
-        final_prediction = (
-            max(weighted_votes, key=weighted_votes.get)
-            if weighted_votes else "Unable to determine"
-        )
+        if args.json:
+            print(json.dumps(result), file=output)
+            return
 
         print("✅ Individual Model Predictions:")
-        for name, label in predictions.items():
-            print(f" - {name}: {label}")
-        print(f"\n🎯 Final Ensemble Prediction: {final_prediction}")
+        for name, label in result["predictions"].items():
+            print(f" - {name}: {label} ({result['model_probabilities'][name][label]:.2f})")
+        for name, error in result["errors"].items():
+            print(f" - {name}: ❌ {error}")
+        for name, reason in result.get("unavailable", {}).items():
+            print(f" - {name}: ⚠️ unavailable ({reason})")
+        print(f"\n🎯 Final Ensemble Prediction: {result['final_prediction']} ({result['confidence']:.2f})")
+
+        if args.transcribe:
+            print(f"\n📝 Transcript: {result['transcript']}")
 
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
+        if args.json:
+            print(json.dumps({"error": str(e)}), file=output)
+        else:
+            print(f"❌ Error: {str(e)}")
 
 if __name__ == "__main__":
     main()
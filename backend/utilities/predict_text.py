@@ -1,93 +1,442 @@
 import os
 import sys
+import json
+import time
+import queue
 import pickle
+import argparse
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-# Suppress TensorFlow logs and progress output
-os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
-import tensorflow as tf
-tf.get_logger().setLevel("ERROR")
+# TensorFlow is only imported if a model has no .tflite conversion
+from lite_runtime import load_manifest_model
+from frozen_tokenizer import load_tokenizer, pad_sequences
+from prediction_cache import get_cache, models_fingerprint, text_key
+from model_registry import get_registry
+from tracing import span
+from ensemble import (
+    CANONICAL_EMOTIONS, encoder_classes, class_projection, to_canonical, ensemble_weights, fuse,
+    add_threading_arguments, thread_plan, run_members,
+)
 
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.sequence import pad_sequences
+# Bump when the shape of a cached result changes
+CACHE_NAMESPACE = "text/v2"
+
+def models_dir(data_type):
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", data_type, "exported_files"))
+
+def load_all_models(data_type, num_threads=None, inter_op_threads=None):
+    """Tokenizer and labels of every model in the manifest; each model itself loads on first use."""
+    registry = get_registry()
+    registry.register_loader(data_type, lambda entry: load_manifest_model(entry, num_threads, inter_op_threads))
+    for model_name, reason in registry.unavailable(data_type).items():
+        print(f"⚠️ Skipping {data_type}/{model_name}: {reason}")
 
-def load_all_models(data_type):
-    MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", data_type, "exported_files"))
     models = {}
+    tokenizers = {}  # fingerprint -> tokenizer shared by every model that uses it
+
+    for model_name, entry in registry.available(data_type).items():
+        try:
+            tokenizer = load_tokenizer(entry["preprocessing"]["tokenizer"])
+            tokenizer = tokenizers.setdefault(tokenizer.fingerprint, tokenizer)
+            with open(entry["labels"], "rb") as label_encoder_file:
+                label_encoder = pickle.load(label_encoder_file)
+
+            models[model_name] = registry.member(
+                data_type, model_name,
+                tokenizer=tokenizer,
+                maxlen=entry["preprocessing"].get("maxlen", 100),
+                label_encoder=label_encoder,
+                projection=class_projection(encoder_classes(label_encoder)),
+            )
+        except Exception as e:
+            print(f"❌ Failed to load model {model_name}: {e}")
+
+    return models
+
+# Ensemble weights come from models/manifest.json
+MODEL_WEIGHTS = get_registry().weights("text")
+
+def padding_key(data):
+    return data["tokenizer"].fingerprint, data.get("maxlen", 100)
+
+def pad_for_tokenizers(models_dict, sentences):
+    """Tokenize and pad once per distinct tokenizer and length: {(fingerprint, maxlen): (N, maxlen) array}.
+
+    Only light member components are touched, so no model is loaded here.
+    """
+    padded_by_tokenizer = {}
+    with span("featurize", sentences=len(sentences), chars=sum(len(sentence) for sentence in sentences)):
+        for data in models_dict.values():
+            key = padding_key(data)
+            if key not in padded_by_tokenizer:
+                sequences = data["tokenizer"].texts_to_sequences(sentences)
+                padded_by_tokenizer[key] = pad_sequences(sequences, maxlen=key[1])
+    return padded_by_tokenizer
+
+def predict_sentences(models_dict, sentences, weights=MODEL_WEIGHTS, workers=1, cascade_threshold=None):
+    """Run the ensemble over a batch of sentences with one predict call per model.
+
+    Up to workers models run at once (see ensemble.run_members). With a
+    cascade_threshold the cascade in predict_sentences_cascade runs instead.
+    Returns one ensemble.fuse() result per sentence; a model that fails is
+    left out of the vote and reported under "errors".
+    """
+    if cascade_threshold is not None:
+        return predict_sentences_cascade(models_dict, sentences, weights, cascade_threshold)
+
+    start_time = time.perf_counter()
+    padded_by_tokenizer = pad_for_tokenizers(models_dict, sentences)
+    tokenize_ms = (time.perf_counter() - start_time) * 1000
+
+    def predict(model_name):
+        data = models_dict[model_name]
+        padded_sequences = padded_by_tokenizer[padding_key(data)]
+        prediction = data["model"].predict(padded_sequences, batch_size=len(sentences), verbose=0)
+        return to_canonical(prediction, data["projection"])
+
+    start_time = time.perf_counter()
+    probabilities, errors, timings = run_members(predict, list(models_dict), workers)
+    timings["ensemble"] = round((time.perf_counter() - start_time) * 1000, 2)
+    timings["tokenize"] = round(tokenize_ms, 2)
+
+    results = []
+    for i in range(len(sentences)):
+        result = fuse({name: rows[i] for name, rows in probabilities.items()}, weights)
+        result["errors"] = errors
+        result["timings_ms"] = timings
+        results.append(result)
+
+    return results
+
+def predict_sentences_cascade(models_dict, sentences, weights=MODEL_WEIGHTS, confidence_threshold=0.9):
+    """Run the members one at a time, heaviest first, and stop early per sentence.
+
+    After each model, a sentence is settled once its leading emotion is
+    ahead of the runner-up by more than the weight of the models still to
+    run. Those models can then no longer change the final label. A
+    sentence is also settled once its weighted confidence so far reaches
+    confidence_threshold, which trades exactness for speed. Later models
+    only see the sentences still open. Models that never ran for a sentence
+    are listed under "skipped" in its result.
+    """
+    start_time = time.perf_counter()
+    padded_by_tokenizer = pad_for_tokenizers(models_dict, sentences)
+    timings = {"tokenize": round((time.perf_counter() - start_time) * 1000, 2)}
+
+    order = sorted(models_dict, key=lambda name: -weights.get(name, 1))
+    member_probabilities = [{} for _ in sentences]
+    errors = {}
+    totals = np.zeros((len(sentences), len(CANONICAL_EMOTIONS)))
+    seen_weight = np.zeros(len(sentences))
+    pending = np.arange(len(sentences))
+
+    start_time = time.perf_counter()
+    for position, model_name in enumerate(order):
+        if len(pending) == 0:
+            break
+
+        data = models_dict[model_name]
+        weight = weights.get(model_name, 1)
+        remaining_weight = sum(weights.get(name, 1) for name in order[position + 1:])
+
+        try:
+            member_start = time.perf_counter()
+            with span("infer", model=model_name, sentences=len(pending)):
+                padded_sequences = padded_by_tokenizer[padding_key(data)][pending]
+                prediction = data["model"].predict(padded_sequences, batch_size=len(pending), verbose=0)
+                probabilities = to_canonical(prediction, data["projection"])
+            timings[model_name] = round((time.perf_counter() - member_start) * 1000, 2)
+        except Exception as e:
+            print(f"❌ Prediction error for {model_name}: {e}")
+            errors[model_name] = str(e)
+            continue
+
+        for i, row in zip(pending, probabilities):
+            member_probabilities[i][model_name] = row
+        totals[pending] += weight * probabilities
+        seen_weight[pending] += weight
+
+        runner_up, leader = np.sort(totals[pending], axis=1)[:, -2:].T
+        settled = leader - runner_up > remaining_weight
+        settled |= leader >= confidence_threshold * seen_weight[pending]
+        pending = pending[~settled]
+    timings["ensemble"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+    results = []
+    for probabilities in member_probabilities:
+        result = fuse(probabilities, weights)
+        result["errors"] = errors
+        result["skipped"] = [name for name in order if name not in probabilities and name not in errors]
+        result["timings_ms"] = timings
+        results.append(result)
+
+    return results
+
+def predict_sentence(models_dict, sentence, weights=MODEL_WEIGHTS, workers=1, cascade_threshold=None):
+    return predict_sentences(models_dict, [sentence], weights, workers, cascade_threshold)[0]
+
+def cache_namespace(weights, cascade_threshold=None):
+    return f"{CACHE_NAMESPACE}:{json.dumps(weights, sort_keys=True)}:{cascade_threshold}"
+
+def predict_sentences_cached(models_dict, sentences, cache, fingerprint, weights=MODEL_WEIGHTS, workers=1,
+                             cascade_threshold=None):
+    """predict_sentences, answering sentences seen before from the cache.
+
+    Only the misses go through the models, still as a single batch.
+    """
+    namespace = cache_namespace(weights, cascade_threshold)
+    keys = [text_key(namespace, sentence, fingerprint) for sentence in sentences]
+    results = [cache.get(key) for key in keys]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        fresh = predict_sentences(models_dict, [sentences[i] for i in missing], weights, workers, cascade_threshold)
+        for i, result in zip(missing, fresh):
+            if not result["errors"]:
+                cache.set(keys[i], result)
+            results[i] = result
+
+    return results
 
-    for file in os.listdir(MODELS_DIR):
-        if file.endswith(".h5"):
-            model_name = file.replace(".h5", "")
-            model_path = os.path.join(MODELS_DIR, file)
-            tokenizer_path = os.path.join(MODELS_DIR, f"{model_name}_tokenizer.pkl")
-            label_encoder_path = os.path.join(MODELS_DIR, f"{model_name}_label_encoder.pkl")
+class MicroBatcher:
+    """Coalesce concurrent requests into batches for a single predict call.
 
+    A batch is flushed once it holds max_batch_size items or max_wait_ms
+    has passed since its first item arrived, whichever comes first. Every
+    item's callback is called exactly once: with its result, or with the
+    exception when the batch fails, returns the wrong number of results or
+    runs past timeout_ms. A batch that times out is left running on its own
+    thread and later batches go to a fresh one, so one stuck predict call
+    does not stall everything queued behind it.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_wait_ms=10, timeout_ms=None):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.timeout = timeout_ms / 1000.0 if timeout_ms else None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch") if self.timeout else None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, item, callback):
+        """Queue an item; callback receives its result or the raised exception."""
+        self.queue.put((item, callback))
+
+    def close(self):
+        """Flush whatever is queued and stop the worker thread."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _predict(self, items):
+        if self.executor is None:
+            return self.predict_batch(items)
+        future = self.executor.submit(self.predict_batch, items)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch")
+            raise TimeoutError(f"batch of {len(items)} took longer than {self.timeout * 1000:.0f} ms")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.queue.get()
+            if first is None:
+                break
+
+            batch, stopping = self._collect(first)
+            items = [item for item, _ in batch]
             try:
-                model = load_model(model_path)
-                with open(tokenizer_path, "rb") as tokenizer_file:
-                    tokenizer = pickle.load(tokenizer_file)
-                with open(label_encoder_path, "rb") as label_encoder_file:
-                    label_encoder = pickle.load(label_encoder_file)
-
-                models[model_name] = {
-                    "model": model,
-                    "tokenizer": tokenizer,
-                    "label_encoder": label_encoder,
-                }
+                results = self._predict(items)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"batch of {len(batch)} returned {len(results)} results")
             except Exception as e:
-                print(f"❌ Failed to load model {model_name}: {e}")
+                results = [e] * len(batch)
 
-    return models
+            for (_, callback), result in zip(batch, results):
+                try:
+                    callback(result)
+                except Exception as e:
+                    print(f"❌ Batch callback failed: {e}")
+
+def add_cascade_arguments(parser):
+    parser.add_argument("--cascade", action="store_true", default=os.environ.get("TEXT_CASCADE") == "1",
+                        help="Run models heaviest first and stop once the vote is settled (see predict_sentences_cascade)")
+    parser.add_argument("--cascade-threshold", type=float,
+                        default=float(os.environ.get("TEXT_CASCADE_THRESHOLD", "0.9")),
+                        help="Weighted confidence that also ends the cascade early (above 1 disables this)")
+
+def parse_serve_args(argv):
+    parser = argparse.ArgumentParser(prog="predict_text.py --serve")
+    parser.add_argument("--max-batch-size", type=int, default=32,
+                        help="Most sentences to run through the ensemble in one batch")
+    parser.add_argument("--max-wait-ms", type=float, default=10,
+                        help="How long a batch waits for more sentences before it runs")
+    parser.add_argument("--batch-timeout-ms", type=float,
+                        default=float(os.environ.get("TEXT_BATCH_TIMEOUT_MS", "20000")),
+                        help="Fail a batch's requests if it runs longer than this (0 = no limit)")
+    parser.add_argument("--weights", help='Ensemble weights, e.g. "cnn=0.4,rnn=0.1" (others keep their defaults)')
+    add_cascade_arguments(parser)
+    add_threading_arguments(parser)
+    return parser.parse_args(argv)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Predict the emotion of a sentence with the text ensemble")
+    parser.add_argument("sentence", nargs="+")
+    parser.add_argument("--json", action="store_true", help="Print the full ensemble result as JSON")
+    parser.add_argument("--weights", help='Ensemble weights, e.g. "cnn=0.4,rnn=0.1" (others keep their defaults)')
+    add_cascade_arguments(parser)
+    add_threading_arguments(parser)
+    return parser.parse_args(argv)
+
+def load_ensemble(workers=0, intra_op_threads=0, inter_op_threads=0, cores=None):
+    """Load the text models with the cores split as ensemble.thread_plan says; returns (models, workers)."""
+    workers, intra_op_threads = thread_plan(len(get_registry().available("text")), workers, intra_op_threads, cores)
+    return load_all_models("text", intra_op_threads, inter_op_threads or None), workers
+
+def serve(max_batch_size=32, max_wait_ms=10, weights=MODEL_WEIGHTS, workers=0, intra_op_threads=0, inter_op_threads=0,
+          cascade_threshold=None, batch_timeout_ms=None):
+    """Keep the ensemble loaded and answer one JSON request per stdin line.
+
+    Requests look like {"id": 1, "text": "..."}; each gets a single JSON line
+    back with the same id, not necessarily in request order. Requests that
+    arrive close together are batched. {"id": 1, "op": "stats"} returns the
+    prediction cache counters and {"id": 1, "op": "models"} the model
+    registry report. Anything else printed while serving goes to stderr so
+    stdout stays a clean protocol channel.
+    """
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            protocol_out.write(json.dumps(message) + "\n")
+            protocol_out.flush()
+
+    models_dict, workers = load_ensemble(workers, intra_op_threads, inter_op_threads)
+    cache = get_cache()
+    fingerprint = models_fingerprint(models_dir("text"))
+    send({"ready": True, "models": sorted(models_dict), "unavailable": get_registry().unavailable("text")})
+
+    def run_batch(sentences):
+        if not models_dict:
+            raise RuntimeError("No models were loaded. Check the model directory.")
+        with span("batch", sentences=len(sentences)):
+            if cache is None:
+                return predict_sentences(models_dict, sentences, weights, workers, cascade_threshold)
+            return predict_sentences_cached(models_dict, sentences, cache, fingerprint, weights, workers,
+                                            cascade_threshold)
+
+    batcher = MicroBatcher(run_batch, max_batch_size, max_wait_ms, batch_timeout_ms)
+
+    def reply_to(request_id):
+        def callback(result):
+            if isinstance(result, Exception):
+                send({"id": request_id, "error": str(result)})
+            else:
+                send({"id": request_id, **result})
+        return callback
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if request.get("op") == "stats":
+                send({"id": request_id, "cache": cache.stats() if cache else None})
+                continue
+            if request.get("op") == "models":
+                send({"id": request_id, **get_registry().report()})
+                continue
+            batcher.submit(str(request["text"]), reply_to(request_id))
+        except Exception as e:
+            send({"id": request_id, "error": str(e)})
+
+    batcher.close()
 
 def main():
     if len(sys.argv) < 2:
         print("❌ Please provide a sentence as a command-line argument.")
         return
 
-    sentence = " ".join(sys.argv[1:])  # Handle multi-word input
-
-    try:
-        models_dict = load_all_models("text")
-
-        if not models_dict:
-            print("❌ No models were loaded. Check the model directory.")
-            return
+    if sys.argv[1] == "--serve":
+        args = parse_serve_args(sys.argv[2:])
+        weights = ensemble_weights("text", MODEL_WEIGHTS, args.weights)
+        serve(args.max_batch_size, args.max_wait_ms, weights,
+              args.workers, args.intra_op_threads, args.inter_op_threads,
+              args.cascade_threshold if args.cascade else None, args.batch_timeout_ms)
+        return
 
-        model_weights = {
-            "cnn": 0.35,
-            "cnn_with_resnet": 0.35,
-            "crnn": 0.1,
-            "rnn": 0.2
-        }
+    args = parse_args(sys.argv[1:])
+    sentence = " ".join(args.sentence)  # Handle multi-word input
+    weights = ensemble_weights("text", MODEL_WEIGHTS, args.weights)
+    cascade_threshold = args.cascade_threshold if args.cascade else None
 
-        predictions = {}
-        weighted_votes = {}
+    output = sys.stdout
+    if args.json:
+        sys.stdout = sys.stderr  # keep stdout to the single JSON document
 
-        for model_name, data in models_dict.items():
-            tokenizer = data["tokenizer"]
-            label_encoder = data["label_encoder"]
-            model = data["model"]
+    try:
+        # A cache hit answers without loading any model
+        cache = get_cache()
+        key = text_key(cache_namespace(weights, cascade_threshold), sentence, models_fingerprint(models_dir("text")))
+        result = cache.get(key) if cache else None
 
-            sequence = tokenizer.texts_to_sequences([sentence])
-            padded_sequence = pad_sequences(sequence, maxlen=100)
+        if result is None:
+            models_dict, workers = load_ensemble(args.workers, args.intra_op_threads, args.inter_op_threads)
 
-            prediction = model.predict(padded_sequence, verbose=0)
-            predicted_class = np.argmax(prediction, axis=1)
-            predicted_label = label_encoder.inverse_transform(predicted_class)[0]
+            if not models_dict:
+                raise RuntimeError("No models were loaded. Check the model directory.")
 
-            predictions[model_name] = predicted_label
-            weight = model_weights.get(model_name, 1)
-            weighted_votes[predicted_label] = weighted_votes.get(predicted_label, 0) + weight
+            result = predict_sentence(models_dict, sentence, weights, workers, cascade_threshold)
+            result["unavailable"] = get_registry().unavailable("text")
+            if cache and not result["errors"]:
+                cache.set(key, result)
 
-        final_prediction = max(weighted_votes, key=weighted_votes.get)
+        if args.json:
+            print(json.dumps(result), file=output)
+            return
 
         print("✅ Individual Model Predictions:")
-        for name, pred in predictions.items():
-            print(f" - {name}: {pred}")
-        print(f"\n🎯 Final Ensemble Prediction: {final_prediction}")
+        for name, pred in result["predictions"].items():
+            print(f" - {name}: {pred} ({result['model_probabilities'][name][pred]:.2f})")
+        for name, error in result["errors"].items():
+            print(f" - {name}: ❌ {error}")
+        for name in result.get("skipped", []):
+            print(f" - {name}: skipped (vote already settled)")
+        print(f"\n🎯 Final Ensemble Prediction: {result['final_prediction']} ({result['confidence']:.2f})")
 
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
+        if args.json:
+            print(json.dumps({"error": str(e)}), file=output)
+        else:
+            print(f"❌ Error: {str(e)}")
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,37 @@
 import os
 import sys
-import cv2
-import torch
-import torch.nn.functional as F
+import json
+import time
+import argparse
 import numpy as np
-from torchvision import models, transforms
+from contextlib import contextmanager
+
+from tracing import span
+with span("import", module="torch"):
+    import cv2
+    import torch
+    import torch.nn.functional as F
+    from torchvision import models
+
+import media
+from prediction_cache import get_cache, models_fingerprint, file_key
+from model_registry import get_registry, base_path
+from ensemble import (
+    encoder_classes, class_projection, to_canonical, ensemble_weights, fuse,
+    add_threading_arguments, thread_plan, run_members,
+)
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 EMOTION_CLASSES = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
 
+IMAGE_SIZE = 224
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Ensemble weights come from models/manifest.json
+MODEL_WEIGHTS = get_registry().weights("video")
+
 def get_model_architecture(name, num_classes):
     if name == "resnet_model":
         model = models.resnet50(pretrained=False)
@@ -24,121 +46,463 @@ def get_model_architecture(name, num_classes):
         raise ValueError(f"Unsupported model: {name}")
     return model
 
-def load_all_models(data_type):
-    MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", data_type, "exported_files"))
-    models_dict = {}
+# Bump when the shape of a cached result changes
+CACHE_NAMESPACE = "video/v2"
 
-    for file in os.listdir(MODELS_DIR):
-        if file.endswith(".pth"):
-            model_name = file.replace(".pth", "")
-            model_path = os.path.join(MODELS_DIR, file)
+# Artifacts written by export_video_models.py, in order of preference
+EXPORTED_SUFFIXES = [".int8.torchscript.pt", ".torchscript.pt"]
 
-            try:
-                num_classes = len(EMOTION_CLASSES)
-                model = get_model_architecture(model_name, num_classes)
-                state_dict = torch.load(model_path, map_location=device)
-                model.load_state_dict(state_dict)
-                model.to(device).eval()
+def load_eager_model(model_path, model_name):
+    num_classes = len(EMOTION_CLASSES)
+    model = get_model_architecture(model_name, num_classes)
+    state_dict = torch.load(model_path, map_location=device)
+    model.load_state_dict(state_dict)
+    return model.to(device).eval()
 
-                models_dict[model_name] = {"model": model}
-            except Exception as e:
-                print(f"❌ Failed to load {model_name}: {e}")
+def exported_model_path(models_dir, model_name):
+    """The best exported TorchScript artifact for a model, or None if there isn't one."""
+    for suffix in EXPORTED_SUFFIXES:
+        if suffix.startswith(".int8") and device.type != "cpu":
+            continue  # quantized kernels are CPU-only
+        path = os.path.join(models_dir, model_name + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+def models_dir(data_type):
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "models", data_type, "exported_files"))
+
+def load_registered_model(entry, prefer_exported=True):
+    """ModelRegistry loader: (model, path of the artifact that was loaded) for a manifest entry."""
+    folder, model_name = os.path.split(base_path(entry["path"]))
+    path = exported_model_path(folder, model_name) if prefer_exported else None
+    if path:
+        return torch.jit.load(path, map_location=device).eval(), path
+    return load_eager_model(entry["path"], model_name), entry["path"]
+
+def load_all_models(data_type, prefer_exported=True):
+    """Every video model in the manifest; each loads on first use through the registry."""
+    registry = get_registry()
+    registry.register_loader(data_type, lambda entry: load_registered_model(entry, prefer_exported))
+    for model_name, reason in registry.unavailable(data_type).items():
+        print(f"⚠️ Skipping {data_type}/{model_name}: {reason}")
+
+    models_dict = {}
+    for model_name, entry in registry.available(data_type).items():
+        try:
+            models_dict[model_name] = registry.member(
+                data_type, model_name, projection=class_projection(encoder_classes(entry["labels"])))
+        except Exception as e:
+            print(f"❌ Failed to load {model_name}: {e}")
 
     return models_dict
 
-def preprocess_video(video_path):
+def configure_threads(intra_op_threads, inter_op_threads=0):
+    # torch's intra-op setting is process-wide and inherited by the ensemble's pool threads
+    torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            pass  # fixed once torch has run any inter-op work; the first setting stands
+
+@contextmanager
+def torch_threads(count):
+    """Run a block with count intra-op threads on the calling thread, then restore the previous count.
+
+    Once a thread has run a torch op it keeps its own count, so this lets
+    another torch user in the process (Whisper in the multimodal pipeline)
+    keep its share whatever configure_threads last set for new threads.
+    """
+    previous = torch.get_num_threads()
+    torch.set_num_threads(count)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+def load_ensemble(workers=0, intra_op_threads=0, inter_op_threads=0, cores=None):
+    """Load the video models with the cores split as ensemble.thread_plan says; returns (models, workers)."""
+    workers, intra_op_threads = thread_plan(len(get_registry().available("video")), workers, intra_op_threads, cores)
+    configure_threads(intra_op_threads, inter_op_threads)
+    return load_all_models("video"), workers
+
+class FaceTracker:
+    """Crop frames to the face found by OpenCV's bundled Haar cascade.
+
+    Detection runs on a grayscale copy downscaled to detect_width pixels.
+    Once a face is found its box is reused for the next redetect_every
+    frames, and fresh detections are blended into the previous box so the
+    crop doesn't jitter. Frames where no face can be found return None.
+    """
+
+    def __init__(self, detect_width=480, redetect_every=3, margin=0.2, smoothing=0.5):
+        cascade_path = os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise RuntimeError(f"Could not load face detector from {cascade_path}")
+        self.detect_width = detect_width
+        self.redetect_every = redetect_every
+        self.margin = margin
+        self.smoothing = smoothing
+        self.box = None  # (x, y, w, h) in full-resolution pixels
+        self.frames_since_detect = 0
+
+    def detect(self, frame):
+        scale = min(1.0, self.detect_width / frame.shape[1])
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(20, 20))
+        if len(faces) == 0:
+            return None
+        largest = max(faces, key=lambda face: face[2] * face[3])
+        return np.asarray(largest, dtype=np.float32) / scale
+
+    def locate(self, frame):
+        if self.box is not None and self.frames_since_detect < self.redetect_every:
+            self.frames_since_detect += 1
+            return self.box
+
+        found = self.detect(frame)
+        self.frames_since_detect = 0
+        if found is None:
+            self.box = None
+        elif self.box is None:
+            self.box = found
+        else:
+            self.box = self.smoothing * self.box + (1 - self.smoothing) * found
+        return self.box
+
+    def crop(self, frame):
+        box = self.locate(frame)
+        if box is None:
+            return None
+
+        # Square crop around the face centre, padded by margin on each side
+        x, y, w, h = box
+        side = max(w, h) * (1 + 2 * self.margin)
+        cx, cy = x + w / 2, y + h / 2
+        frame_h, frame_w = frame.shape[:2]
+        x0, y0 = int(max(0, cx - side / 2)), int(max(0, cy - side / 2))
+        x1, y1 = int(min(frame_w, cx + side / 2)), int(min(frame_h, cy + side / 2))
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return frame[y0:y1, x0:x1]
+
+def sample_frames(video_path, sample_fps=2.0, max_memory_mb=64, face_tracker=None):
+    """Sample frames at a uniform stride across the whole clip.
+
+    Returns (frames, timestamps): a uint8 array (N, 224, 224, 3) in RGB and
+    the time in seconds of each kept frame. Skipped frames are only grabbed,
+    never converted or copied, and kept frames are resized straight away so
+    memory is bounded by max_memory_mb regardless of the clip's length or
+    resolution. If a clip would need more frames than the budget allows, the
+    stride is widened (up front when the frame count is known, otherwise by
+    dropping every other kept frame) so coverage stays uniform.
+
+    With a face_tracker, each kept frame is cropped to the face before the
+    resize and frames without a face are skipped.
+    """
+    cap = cv2.VideoCapture(video_path)
+    native_fps = cap.get(cv2.CAP_PROP_FPS)
+    if not native_fps or native_fps <= 0 or native_fps > 1000:
+        native_fps = 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    frame_bytes = IMAGE_SIZE * IMAGE_SIZE * 3
+    max_frames = max(1, int(max_memory_mb * 1024 * 1024 // frame_bytes))
+
+    step = max(1.0, native_fps / sample_fps)
+    if frame_count > 0:
+        step = max(step, frame_count / max_frames)
+
+    frames = []
+    timestamps = []
+    next_index = 0.0
+    index = 0
+
     try:
-        cap = cv2.VideoCapture(video_path)
-        frames = []
-        max_frames = 30
-
-        transform = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406],
-                                 [0.229, 0.224, 0.225])
-        ])
-
-        frame_count = 0
-        while cap.isOpened() and frame_count < max_frames:
-            ret, frame = cap.read()
-            if not ret:
+        while cap.isOpened():
+            if not cap.grab():
                 break
 
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            tensor_frame = transform(frame_rgb)
-            frames.append(tensor_frame)
-            frame_count += 1
+            if index >= next_index:
+                next_index += step
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+
+                if face_tracker is not None:
+                    frame = face_tracker.crop(frame)
+                    if frame is None:
+                        index += 1
+                        continue
+
+                frame = cv2.resize(frame, (IMAGE_SIZE, IMAGE_SIZE), interpolation=cv2.INTER_AREA)
+                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                timestamps.append(index / native_fps)
 
+                if len(frames) > max_frames:
+                    frames = frames[::2]
+                    timestamps = timestamps[::2]
+                    step *= 2
+                    next_index = timestamps[-1] * native_fps + step
+
+            index += 1
+    finally:
         cap.release()
 
-        if not frames:
+    if not frames:
+        return np.empty((0, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.uint8), []
+    return np.stack(frames), timestamps
+
+def sample_video(video_path, args):
+    """sample_frames with the options from the command line.
+
+    The container is read in-process with PyAV when it is installed, and
+    with OpenCV otherwise. When --face-crop finds no face anywhere in the
+    clip, the full frames are used instead so the clip still gets a
+    prediction.
+    """
+    def sample(face_tracker=None):
+        if media.available():
+            decoded = media.demux(video_path, args.fps, args.max_memory_mb, face_tracker, audio=False)
+            return decoded.frames, decoded.timestamps
+        return sample_frames(video_path, args.fps, args.max_memory_mb, face_tracker)
+
+    with span("decode", path=os.path.basename(video_path), bytes=os.path.getsize(video_path),
+              face_crop=args.face_crop) as decode_span:
+        if args.face_crop:
+            frames, timestamps = sample(FaceTracker())
+            if len(frames) == 0:
+                print("⚠️ No face found in video, using full frames")
+        if not args.face_crop or len(frames) == 0:
+            frames, timestamps = sample()
+        decode_span.set(frames=len(frames))
+    return frames, timestamps
+
+def frames_to_tensor(frames):
+    """(N, H, W, 3) uint8 RGB -> normalized (N, 3, H, W) float tensor, no PIL round-trip."""
+    batch = torch.from_numpy(frames).to(device).permute(0, 3, 1, 2).float().div_(255.0)
+    mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1)
+    return (batch - mean) / std
+
+def preprocess_video(video_path, args):
+    try:
+        frames, _ = sample_video(video_path, args)
+
+        if len(frames) == 0:
             print("⚠️ No frames extracted from video")
             return None
 
-        video_tensor = torch.stack(frames)  # (T, C, H, W)
-        averaged_tensor = video_tensor.mean(dim=0, keepdim=True)  # (1, C, H, W)
-        return averaged_tensor.to(device)
+        with span("featurize", frames=len(frames)):
+            video_tensor = frames_to_tensor(frames)  # (T, C, H, W)
+            averaged_tensor = video_tensor.mean(dim=0, keepdim=True)  # (1, C, H, W)
+        return averaged_tensor
 
     except Exception as e:
         print(f"❌ Video preprocessing failed: {e}")
         return None
 
+def predict_frame_probabilities(models_dict, frames, batch_size=16, workers=1):
+    """Softmax output of every model for every sampled frame.
+
+    Frames are normalized and fed batch_size at a time so only one float
+    batch is alive at once; up to workers models run on each batch at once.
+    Returns ({model_name: (N, num_classes) array}, {model_name: error});
+    models that fail are left out from then on.
+    """
+    probabilities = {name: [] for name in models_dict}
+    errors = {}
+
+    def predict(model_name):
+        with torch.inference_mode():  # thread-local, so entered in the member's own thread
+            output = models_dict[model_name]["model"](batch)
+            return F.softmax(output, dim=1).cpu().numpy()
+
+    for start in range(0, len(frames), batch_size):
+        with torch.inference_mode(), span("featurize", frames=len(frames[start:start + batch_size])):
+            batch = frames_to_tensor(frames[start:start + batch_size])
+        outputs, failed, _ = run_members(predict, list(probabilities), workers)
+        for model_name, probs in outputs.items():
+            probabilities[model_name].append(probs)
+        for model_name, error in failed.items():
+            del probabilities[model_name]
+            errors[model_name] = error
+
+    return {name: np.concatenate(chunks) for name, chunks in probabilities.items()}, errors
+
+def pool_probabilities(frame_probs, method="mean", ema_alpha=0.3):
+    """Collapse (N, num_classes) per-frame probabilities into one distribution."""
+    if method == "mean":
+        return frame_probs.mean(axis=0)
+    if method == "majority":
+        counts = np.bincount(frame_probs.argmax(axis=1), minlength=frame_probs.shape[1])
+        return counts / counts.sum()
+    if method == "ema":
+        smoothed = frame_probs[0]
+        for probs in frame_probs[1:]:
+            smoothed = ema_alpha * probs + (1 - ema_alpha) * smoothed
+        return smoothed
+    raise ValueError(f"Unknown pooling method: {method}")
+
+def emotion_timeline(frame_probs_by_model, timestamps, weights=MODEL_WEIGHTS):
+    """Weighted ensemble label for each second of the clip that has sampled frames."""
+    total_weight = sum(weights.get(name, 1) for name in frame_probs_by_model)
+    combined = sum(
+        weights.get(name, 1) * probs for name, probs in frame_probs_by_model.items()
+    ) / total_weight
+
+    seconds = np.floor(np.asarray(timestamps)).astype(int)
+    timeline = []
+    for second in np.unique(seconds):
+        probs = combined[seconds == second].mean(axis=0)
+        class_index = int(np.argmax(probs))
+        timeline.append({
+            "second": int(second),
+            "emotion": EMOTION_CLASSES[class_index],
+            "confidence": round(float(probs[class_index]), 4),
+        })
+    return timeline
+
+def predict_averaged(models_dict, video_path, args, weights=MODEL_WEIGHTS, workers=1):
+    """Original mode: one pass per model over the mean of all sampled frames."""
+    timings = {}
+
+    start_time = time.perf_counter()
+    input_tensor = preprocess_video(video_path, args)
+    timings["decode"] = round((time.perf_counter() - start_time) * 1000, 2)
+    if input_tensor is None:
+        print("❌ Failed to preprocess video.")
+        return None
+
+    def predict(model_name):
+        with torch.no_grad():
+            output = models_dict[model_name]["model"](input_tensor)
+            probs = F.softmax(output, dim=1).cpu().numpy()
+        return to_canonical(probs, models_dict[model_name]["projection"])[0]
+
+    start_time = time.perf_counter()
+    member_probabilities, errors, model_timings = run_members(predict, list(models_dict), workers)
+    timings.update(model_timings)
+    timings["ensemble"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+    result = fuse(member_probabilities, weights)
+    result.update({"errors": errors, "timings_ms": timings, "timeline": None})
+    return result
+
+def predict_per_frame(models_dict, video_path, args, weights=MODEL_WEIGHTS, workers=1):
+    """Run every sampled frame through each model and pool the results over time."""
+    start_time = time.perf_counter()
+    frames, timestamps = sample_video(video_path, args)
+    decode_ms = round((time.perf_counter() - start_time) * 1000, 2)
+    if len(frames) == 0:
+        print("⚠️ No frames extracted from video")
+        print("❌ Failed to preprocess video.")
+        return None
+
+    result = predict_frames(models_dict, frames, timestamps, args, weights, workers)
+    result["timings_ms"]["decode"] = decode_ms
+    return result
+
+def predict_frames(models_dict, frames, timestamps, args, weights=MODEL_WEIGHTS, workers=1):
+    """predict_per_frame on frames that were already sampled, e.g. by the multimodal pipeline."""
+    member_probabilities = {}
+    timings = {}
+
+    start_time = time.perf_counter()
+    frame_probs, errors = predict_frame_probabilities(models_dict, frames, args.batch_size, workers)
+    timings["ensemble"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+    for model_name in frame_probs:
+        pooled = pool_probabilities(frame_probs[model_name], args.pooling, args.ema_alpha)
+        member_probabilities[model_name] = to_canonical(pooled, models_dict[model_name]["projection"])
+
+    result = fuse(member_probabilities, weights)
+    timeline = emotion_timeline(frame_probs, timestamps, weights) if frame_probs else []
+    result.update({"errors": errors, "timings_ms": timings, "timeline": timeline})
+    return result
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Predict emotion from a video clip")
+    parser.add_argument("video_path")
+    parser.add_argument("--fps", type=float, default=2.0, help="Frames to sample per second of video")
+    parser.add_argument("--max-memory-mb", type=float, default=64,
+                        help="Upper bound on memory used by sampled frames")
+    parser.add_argument("--face-crop", action="store_true",
+                        help="Classify only the detected face and skip frames without one")
+    parser.add_argument("--mode", choices=["average", "frames"], default="average",
+                        help="Classify the averaged frame once, or every frame with temporal pooling")
+    parser.add_argument("--pooling", choices=["mean", "majority", "ema"], default="mean",
+                        help="How per-frame probabilities are combined in frames mode")
+    parser.add_argument("--ema-alpha", type=float, default=0.3, help="Smoothing factor for --pooling ema")
+    parser.add_argument("--batch-size", type=int, default=16, help="Frames per forward pass in frames mode")
+    parser.add_argument("--json", action="store_true", help="Print the full ensemble result as JSON")
+    parser.add_argument("--weights",
+                        help='Ensemble weights, e.g. "resnet_model=0.5" (others keep their defaults)')
+    add_threading_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
     if len(sys.argv) < 2:
         print("❌ Please provide a video file path.")
         return
 
-    video_path = sys.argv[1]
-    if not os.path.exists(video_path):
-        print("❌ Provided video file path does not exist.")
-        return
+    args = parse_args(sys.argv[1:])
+    video_path = args.video_path
+    weights = ensemble_weights("video", MODEL_WEIGHTS, args.weights)
+
+    output = sys.stdout
+    if args.json:
+        sys.stdout = sys.stderr  # keep stdout to the single JSON document
 
     try:
-        models_dict = load_all_models("video")
+        if not os.path.exists(video_path):
+            raise FileNotFoundError("Provided video file path does not exist.")
 
-        model_weights = {
-            "efficientnet_model": 0.4,
-            "resnet_model": 0.3,
-            "mobilenet_model": 0.5
-        }
+        # Everything that changes the answer goes into the key; --batch-size doesn't
+        settings = json.dumps({
+            "mode": args.mode, "fps": args.fps, "max_memory_mb": args.max_memory_mb,
+            "face_crop": args.face_crop, "pooling": args.pooling, "ema_alpha": args.ema_alpha,
+            "device": device.type, "weights": weights,
+        }, sort_keys=True)
+        cache = get_cache()
+        key = file_key(CACHE_NAMESPACE, video_path, models_fingerprint(models_dir("video")), settings) if cache else None
+        result = cache.get(key) if cache else None
 
-        predictions = {}
-        weighted_votes = {}
+        if result is None:
+            models_dict, workers = load_ensemble(args.workers, args.intra_op_threads, args.inter_op_threads)
+            if not models_dict:
+                raise RuntimeError("No models were loaded. Check the model directory.")
 
-        input_tensor = preprocess_video(video_path)
-        if input_tensor is None:
-            print("❌ Failed to preprocess video.")
+            predict = predict_per_frame if args.mode == "frames" else predict_averaged
+            result = predict(models_dict, video_path, args, weights, workers)
+            if result is None:
+                raise RuntimeError("Failed to preprocess video.")
+            result["unavailable"] = get_registry().unavailable("video")
+            if cache and not result["errors"]:
+                cache.set(key, result)
+
+        if args.json:
+            print(json.dumps(result), file=output)
             return
 
-        for model_name, components in models_dict.items():
-            model = components["model"]
-            try:
-                with torch.no_grad():
-                    output = model(input_tensor)
-                    probs = F.softmax(output, dim=1)
-                    class_index = torch.argmax(probs, dim=1).item()
-                    label = EMOTION_CLASSES[class_index]
-
-                    predictions[model_name] = label
-                    weight = model_weights.get(model_name, 1)
-                    weighted_votes[label] = weighted_votes.get(label, 0) + weight
-                    print(f"{model_name} predicted: {label} ✅")
-            except Exception as e:
-                print(f"❌ Prediction error for {model_name}: {e}")
-                predictions[model_name] = "Prediction error"
-
-        final_prediction = (
-            max(weighted_votes, key=weighted_votes.get)
-            if weighted_votes else "Unable to determine"
-        )
-
-        print(f"\nPredictions: {predictions}")
-        print(f"Final Prediction: {final_prediction}")
+        if result["timeline"]:
+            print("\nTimeline:")
+            for point in result["timeline"]:
+                print(f" - {point['second']}s: {point['emotion']} ({point['confidence']:.2f})")
+
+        for name, error in result["errors"].items():
+            print(f"❌ {name}: {error}")
+        print(f"\nPredictions: {result['predictions']}")
+        print(f"Final Prediction: {result['final_prediction']} ({result['confidence']:.2f})")
 
     except Exception as e:
-        print(f"❌ Unexpected error: {e}")
+        if args.json:
+            print(json.dumps({"error": str(e)}), file=output)
+        else:
+            print(f"❌ Unexpected error: {e}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_PATH = os.environ.get(
+    "EMOTION_CACHE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "predictions.sqlite")),
+)
+DEFAULT_TTL = float(os.environ.get("EMOTION_CACHE_TTL", 7 * 24 * 3600))
+MODEL_FILE_SUFFIXES = (".h5", ".tflite", ".pkl", ".pth", ".pt")
+# Per-run measurements: they describe the run that filled the cache, not the answer
+TIMING_FIELDS = ("timings_ms", "wall_ms")
+
+def without_timings(value):
+    """A copy of a result with TIMING_FIELDS removed, also from nested breakdowns."""
+    if isinstance(value, dict):
+        return {k: without_timings(v) for k, v in value.items() if k not in TIMING_FIELDS}
+    return value
+
+class PredictionCache:
+    """Content-addressed store for predictor results.
+
+    Lookups go to an in-memory LRU first and then to a SQLite file shared by
+    every predictor process; entries expire after ttl seconds in both. Keys
+    come from the *_key helpers below, so they change whenever the input
+    bytes, the options or the model files change.
+
+    Results are stored without their timings (see without_timings). A hit
+    on a result comes back as a fresh dict marked "cached": true, whose
+    timings_ms holds only the lookup itself, so a caller that reports
+    latencies never shows the ones from the run that filled the cache.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=1024, ttl=DEFAULT_TTL, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.memory = OrderedDict()  # key -> (expires_at, value)
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        self.lock = threading.Lock()
+        self.db = None
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+                self.db.execute("PRAGMA journal_mode=WAL")
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS predictions ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Prediction cache running in memory only: {e}")
+                self.db = None
+
+    def _remember(self, key, expires_at, value):
+        self.memory[key] = (expires_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        start_time = time.perf_counter()
+        value = self._lookup(key)
+        if isinstance(value, dict):
+            value = {**value, "cached": True,
+                     "timings_ms": {"total": round((time.perf_counter() - start_time) * 1000, 2)}}
+        return value
+
+    def _lookup(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[1]
+                del self.memory[key]
+
+            if self.db is not None:
+                try:
+                    row = self.db.execute(
+                        "SELECT value, expires_at FROM predictions WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error:
+                    row = None
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.counters["disk_hits"] += 1
+                    return value
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        value = without_timings(value)
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._remember(key, expires_at, value)
+            self.counters["writes"] += 1
+            if self.db is None:
+                return
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+                if self.counters["writes"] % 100 == 0:
+                    self._prune()
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not write prediction cache: {e}")
+
+    def _prune(self):
+        self.db.execute("DELETE FROM predictions WHERE expires_at <= ?", (time.time(),))
+        self.db.execute(
+            "DELETE FROM predictions WHERE key IN ("
+            "SELECT key FROM predictions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "memory_entries": len(self.memory),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+_shared_cache = None
+
+def get_cache():
+    """Process-wide cache, or None when EMOTION_CACHE=off."""
+    global _shared_cache
+    if os.environ.get("EMOTION_CACHE", "on").lower() in ("off", "0", "false"):
+        return None
+    if _shared_cache is None:
+        _shared_cache = PredictionCache()
+    return _shared_cache
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.hexdigest()
+
+def models_fingerprint(models_dir):
+    """Changes whenever a model, tokenizer or encoder file in models_dir is added, replaced or removed."""
+    entries = []
+    if os.path.isdir(models_dir):
+        for file in sorted(os.listdir(models_dir)):
+            if file.endswith(MODEL_FILE_SUFFIXES):
+                stat = os.stat(os.path.join(models_dir, file))
+                entries.append(f"{file}:{stat.st_size}:{stat.st_mtime_ns}")
+    return _digest(*entries)
+
+def normalize_text(text):
+    return " ".join(text.lower().split())
+
+def text_key(namespace, text, fingerprint):
+    return _digest(namespace, fingerprint, normalize_text(text))
+
+def file_key(namespace, path, fingerprint, options=""):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return _digest(namespace, fingerprint, options, h.digest())
+
+def bytes_key(namespace, data, fingerprint, options=""):
+    return _digest(namespace, fingerprint, options, hashlib.sha256(data).digest())
@@ -0,0 +1,149 @@
+import { spawn } from "child_process";
+import readline from "readline";
+
+const pythonExecutable = process.platform === "win32" ? "python" : "python3";
+
+// How long a request may wait for an answer before the worker is presumed stuck
+const DEFAULT_TIMEOUT_MS = Number(process.env.PYTHON_WORKER_TIMEOUT_MS) || 120000;
+
+// Long-lived Python process speaking JSON lines over stdin/stdout.
+// The script is started on the first request, keeps its models loaded, and
+// is restarted on the next request if it ever exits. A request that gets no
+// answer within timeoutMs is rejected and the child is killed, which rejects
+// everything else still pending on it; a broken stdin pipe does the same.
+export class PythonWorker {
+  constructor(scriptPath, args = ["--serve"], { timeoutMs = DEFAULT_TIMEOUT_MS } = {}) {
+    this.scriptPath = scriptPath;
+    this.args = args;
+    this.timeoutMs = timeoutMs;
+    this.process = null;
+    this.ready = null;
+    this.nextId = 0;
+    this.pending = new Map();
+  }
+
+  start() {
+    if (this.ready) return this.ready;
+
+    const child = spawn(pythonExecutable, [this.scriptPath, ...this.args], {
+      stdio: ["pipe", "pipe", "pipe"],
+    });
+    this.process = child;
+
+    this.ready = new Promise((resolve, reject) => {
+      const lines = readline.createInterface({ input: child.stdout });
+
+      lines.on("line", (line) => {
+        let message;
+        try {
+          message = JSON.parse(line);
+        } catch (err) {
+          console.warn(`⚠️ Ignoring non-JSON worker output: ${line}`);
+          return;
+        }
+
+        if (message.ready) {
+          resolve(message);
+          return;
+        }
+
+        const request = this.pending.get(message.id);
+        if (!request) return;
+
+        // Intermediate results (e.g. transcript segments) carry an "event" field;
+        // each one shows the worker is alive, so the request's timeout starts over
+        if (message.event) {
+          request.touch();
+          request.onEvent?.(message);
+          return;
+        }
+
+        this.pending.delete(message.id);
+        clearTimeout(request.timer);
+        if (message.error) {
+          request.reject(new Error(message.error));
+        } else {
+          request.resolve(message);
+        }
+      });
+
+      child.stderr.on("data", (data) => {
+        process.stderr.write(data);
+      });
+
+      // Writing to a worker that has died raises EPIPE here instead of crashing the server
+      child.stdin.on("error", (err) => {
+        console.error("Python worker stdin failed:", err.message);
+        this.kill(child, err);
+        reject(err);
+      });
+
+      child.on("error", (err) => {
+        console.error("Failed to start Python worker:", err.message);
+        if (this.process === child) this.reset(err);
+        reject(err);
+      });
+
+      child.on("exit", (code) => {
+        const err = new Error(`Python worker exited with code ${code}`);
+        if (this.process === child) this.reset(err);
+        reject(err);
+      });
+    });
+
+    return this.ready;
+  }
+
+  reset(err) {
+    for (const request of this.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(err);
+    }
+    this.pending.clear();
+    this.process = null;
+    this.ready = null;
+  }
+
+  // Fail everything pending on child and make the next request start a fresh one
+  kill(child, err) {
+    if (this.process === child) this.reset(err);
+    child.kill("SIGKILL");
+  }
+
+  // The timeout also covers starting the worker, so one that hangs while loading its models is
+  // killed too. For streamed requests it is the longest gap allowed between two messages.
+  request(payload, onEvent, timeoutMs = this.timeoutMs) {
+    const id = ++this.nextId;
+    return new Promise((resolve, reject) => {
+      const expire = () => {
+        const err = new Error(`Python worker did not answer within ${timeoutMs} ms`);
+        this.pending.delete(id);
+        reject(err);
+        if (this.process) {
+          console.error(`${err.message}, restarting ${this.scriptPath}`);
+          this.kill(this.process, err);
+        }
+      };
+      const request = { resolve, reject, onEvent, timer: setTimeout(expire, timeoutMs) };
+      request.touch = () => {
+        clearTimeout(request.timer);
+        request.timer = setTimeout(expire, timeoutMs);
+      };
+      this.pending.set(id, request);
+
+      this.start().then(
+        () => {
+          if (this.pending.has(id)) {
+            this.process.stdin.write(JSON.stringify({ ...payload, id }) + "\n");
+          }
+        },
+        (err) => {
+          if (this.pending.delete(id)) {
+            clearTimeout(request.timer);
+            reject(err);
+          }
+        }
+      );
+    });
+  }
+}
@@ -0,0 +1,191 @@
+import os
+import json
+import random
+import threading
+from types import MappingProxyType
+from collections import OrderedDict, deque
+
+DATASET_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), "..", "..", "models", "game", "datasets", "game.json"
+))
+
+DIFFICULTIES = ("easy", "medium", "hard")
+
+# The game's own coarse emotion space: the emotions its scenarios speak about,
+# plus the spellings used by the dataset, the Gemini prompt and the emotion
+# predictors. Not ensemble.CANONICAL_EMOTIONS: disgust, love and surprise fold
+# into neighbouring game emotions and stress has no predictor counterpart.
+GAME_EMOTION_ALIASES = {
+    "anger": "angry",
+    "frustrated": "angry",
+    "disgust": "angry",
+    "stressed": "stress",
+    "confused": "stress",
+    "anxious": "fear",
+    "scared": "fear",
+    "fearful": "fear",
+    "joy": "happy",
+    "love": "happy",
+    "surprise": "happy",
+    "sadness": "sad",
+}
+
+# Used when the dataset file is missing, so the game always has something to show
+BUILTIN_SCENARIOS = [
+    {
+        "scenario": "Your computer crashes right before an important deadline.",
+        "emotion": "stress",
+        "tag": "deadline_crash",
+        "responses": [
+            {"option": "Panic and give up", "reward": -2},
+            {"option": "Blame others angrily", "reward": -1},
+            {"option": "Take deep breaths and troubleshoot", "reward": 2},
+            {"option": "Ask a colleague for help", "reward": 1}
+        ],
+    },
+    {
+        "scenario": "A coworker takes credit for your idea in a meeting.",
+        "emotion": "angry",
+        "tag": "stolen_credit",
+        "responses": [
+            {"option": "Yell at them in front of everyone", "reward": -2},
+            {"option": "Stay silent but plot revenge", "reward": -1},
+            {"option": "Calmly correct the record", "reward": 2},
+            {"option": "Discuss it privately later", "reward": 1}
+        ],
+    },
+]
+
+def game_emotion(emotion):
+    """Map any emotion label onto GAME_EMOTION_ALIASES' coarse space (unknown labels pass through)."""
+    emotion = str(emotion or "neutral").strip().lower()
+    return GAME_EMOTION_ALIASES.get(emotion, emotion)
+
+def best_choice_index(responses):
+    return max(range(len(responses)), key=lambda i: responses[i][1])
+
+def load_intents(path=DATASET_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)["intents"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️ Scenario dataset unavailable, using built-in scenarios: {e}")
+        return BUILTIN_SCENARIOS
+
+class ScenarioBank:
+    """Offline scenarios from the game dataset, indexed by emotion and tag.
+
+    The dataset carries no difficulty, so a scenario is not filed under
+    one: the difficulty asked for (from the player's stress score) is
+    stamped on the scenario returned, as the Gemini prompt asks for it.
+
+    The dataset is read once into a tuple of frozen records; the indexes map
+    a key to a tuple of record ids, so picking a scenario is a dict lookup
+    plus a random index. Records are never mutated; every call returns a
+    fresh dict. With a session_id the last `window` scenarios shown in that
+    session are avoided: a few random draws, then a probe of at most window
+    + 1 neighbours, so the cost depends on the window and never on the pool.
+    """
+
+    def __init__(self, path=DATASET_PATH, window=8, max_sessions=10000, seed=None):
+        records = []
+        seen = set()
+        for intent in load_intents(path):
+            responses = tuple((str(r["option"]), int(r["reward"])) for r in intent["responses"])
+            if (intent["scenario"], responses) in seen:
+                continue
+            seen.add((intent["scenario"], responses))
+            records.append((intent["scenario"], game_emotion(intent.get("emotion")), intent.get("tag"), responses))
+        self.records = tuple(records)
+
+        by_emotion, by_tag = {}, {}
+        for record_id, (_, emotion, tag, _) in enumerate(self.records):
+            by_emotion.setdefault(emotion, []).append(record_id)
+            if tag:
+                by_tag.setdefault(tag, []).append(record_id)
+
+        freeze = lambda index: MappingProxyType({key: tuple(ids) for key, ids in index.items()})
+        self.by_emotion = freeze(by_emotion)
+        self.by_tag = freeze(by_tag)
+        self.all_ids = tuple(range(len(self.records)))
+
+        self.window = window
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()  # session_id -> deque of recently shown record ids
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def emotions(self):
+        return sorted(self.by_emotion)
+
+    def pool(self, emotion=None, tag=None):
+        """Record ids for the most specific filter that matches anything, loosening in turn."""
+        emotion = game_emotion(emotion) if emotion else None
+        candidates = (
+            self.by_tag.get(tag) if tag else None,
+            self.by_emotion.get(emotion),
+        )
+        return next((ids for ids in candidates if ids), self.all_ids)
+
+    def _recent(self, session_id):
+        if session_id is None or self.window <= 0:
+            return None
+        recent = self.sessions.get(session_id)
+        if recent is None:
+            recent = self.sessions[session_id] = deque(maxlen=self.window)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        self.sessions.move_to_end(session_id)
+        return recent
+
+    def _pick(self, pool, session_id, attempts=4):
+        with self.lock:
+            recent = self._recent(session_id)
+            start = self.rng.randrange(len(pool))
+            record_id = pool[start]
+            if recent:
+                for _ in range(attempts - 1):
+                    if record_id not in recent:
+                        break
+                    start = self.rng.randrange(len(pool))
+                    record_id = pool[start]
+                else:
+                    # Probe onwards from the last draw: at most len(recent) ids can be
+                    # taken, so a fresh one turns up within window + 1 steps. A pool no
+                    # bigger than the window gets the scenario seen longest ago.
+                    probes = [pool[(start + i) % len(pool)] for i in range(min(len(pool), len(recent) + 1))]
+                    last_seen = {seen: n for n, seen in enumerate(recent)}
+                    record_id = min(probes, key=lambda i: last_seen.get(i, -1))
+            if recent is not None:
+                recent.append(record_id)
+            return record_id
+
+    def scenario(self, record_id, difficulty="medium"):
+        text, emotion, tag, responses = self.records[record_id]
+        return {
+            "scenario": text,
+            "emotion": emotion,
+            "difficulty": difficulty,
+            "tag": tag,
+            "responses": [{"option": option, "reward": reward} for option, reward in responses],
+            "best_choice_index": best_choice_index(responses),
+        }
+
+    def sample(self, emotion=None, difficulty=None, tag=None, session_id=None):
+        """A scenario for emotion/tag at the requested difficulty, avoiding the session's recent ones."""
+        return self.scenario(self._pick(self.pool(emotion, tag), session_id), difficulty or "medium")
+
+    def get_fallback_scenario(self, emotion, difficulty, session_id=None):
+        return self.sample(emotion, difficulty, session_id=session_id)
+
+    def stats(self):
+        return {
+            "scenarios": len(self.records),
+            "emotions": {emotion: len(ids) for emotion, ids in sorted(self.by_emotion.items())},
+            "tags": len(self.by_tag),
+            "sessions": len(self.sessions),
+        }
@@ -0,0 +1,103 @@
+import json
+
+from scenario_bank import DIFFICULTIES
+
+REQUIRED_FIELDS = ("scenario", "emotion", "difficulty", "responses", "best_choice_index")
+REWARD_RANGE = (-3, 3)
+
+class JsonObjectStream:
+    """Finds the first balanced top-level {...} in text that arrives in pieces.
+
+    feed() scans only the new characters, tracking string literals and
+    escapes so braces inside strings don't count. It returns the decoded
+    object as soon as its closing brace arrives, or None while it is still
+    incomplete. Code fences and prose around the object are skipped without
+    any clean-up pass; a balanced span that isn't valid JSON is dropped and
+    the search resumes after it.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.start = None  # index of the opening brace in buffer, once seen
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.received = 0
+
+    def feed(self, text):
+        for char in text:
+            self.received += 1
+            if self.start is None:
+                if char == "{":
+                    self.start = len(self.buffer)
+                    self.buffer.append(char)
+                    self.depth = 1
+                continue
+
+            self.buffer.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    candidate = "".join(self.buffer[self.start:])
+                    self.buffer, self.start = [], None
+                    try:
+                        return json.loads(candidate)
+                    except ValueError:
+                        continue
+        return None
+
+def validate_scenario(scenario):
+    """Raise ValueError naming the first way scenario breaks the schema the prompt asks for."""
+    if not isinstance(scenario, dict):
+        raise ValueError("scenario is not an object")
+    missing = [field for field in REQUIRED_FIELDS if field not in scenario]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if not isinstance(scenario["scenario"], str) or not scenario["scenario"].strip():
+        raise ValueError("empty scenario text")
+    if scenario["difficulty"] not in DIFFICULTIES:
+        raise ValueError(f"unknown difficulty {scenario['difficulty']!r}")
+
+    responses = scenario["responses"]
+    if not isinstance(responses, list) or len(responses) != 4:
+        raise ValueError("expected exactly 4 responses")
+    for response in responses:
+        if not isinstance(response, dict) or not str(response.get("option", "")).strip():
+            raise ValueError("response without an option")
+        reward = response.get("reward")
+        if isinstance(reward, bool) or not isinstance(reward, (int, float)) or not \
+                REWARD_RANGE[0] <= reward <= REWARD_RANGE[1]:
+            raise ValueError(f"reward {reward!r} outside {REWARD_RANGE[0]}..{REWARD_RANGE[1]}")
+
+    index = scenario["best_choice_index"]
+    if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index <= 3:
+        raise ValueError(f"best_choice_index {index!r} outside 0..3")
+    return scenario
+
+def parse_scenario_stream(chunks):
+    """(validated scenario or None, error or None, characters read) from an iterable of text chunks.
+
+    Stops pulling chunks the moment the first object closes, so the caller
+    can cancel the rest of the stream; the object is validated once and a
+    bad one is reported rather than retried.
+    """
+    stream = JsonObjectStream()
+    for chunk in chunks:
+        scenario = stream.feed(chunk)
+        if scenario is not None:
+            try:
+                return validate_scenario(scenario), None, stream.received
+            except ValueError as e:
+                return None, str(e), stream.received
+    return None, "no JSON object in response", stream.received
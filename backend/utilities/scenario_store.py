@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import time
+import zlib
+import bisect
+import random
+import sqlite3
+import threading
+import numpy as np
+
+from scenario_bank import game_emotion
+
+DEFAULT_PATH = os.environ.get(
+    "SCENARIO_CACHE_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "scenarios.sqlite")),
+)
+DEFAULT_SIMILARITY = float(os.environ.get("SCENARIO_CACHE_SIMILARITY", "0.85"))
+# Share of lookups that skip the store and ask for a new scenario, so the corpus keeps growing
+DEFAULT_FRESHNESS = float(os.environ.get("SCENARIO_CACHE_FRESHNESS", "0.1"))
+DEFAULT_TTL = float(os.environ.get("SCENARIO_CACHE_TTL", 30 * 24 * 3600))
+VECTOR_DIMS = 1024
+
+def context_text(prev_scenario_text, chosen_option):
+    return f"{prev_scenario_text or ''} | {chosen_option or ''}"
+
+def ngram_vector(text, dims=VECTOR_DIMS):
+    """L2-normalized hashed bag of words, word bigrams and character trigrams.
+
+    crc32 rather than hash() so vectors stay comparable across processes
+    and restarts; cosine similarity is then a plain dot product.
+    """
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"#{word}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+
+    vector = np.zeros(dims, dtype=np.float32)
+    for feature in features:
+        vector[zlib.crc32(feature.encode("utf-8")) % dims] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+class ScenarioStore:
+    """Generated scenarios kept with their context and reused for similar requests.
+
+    Each scenario Gemini writes is stored under the (emotion, difficulty) it
+    was asked for, with an n-gram vector of the previous scenario and the
+    option the player chose. A later request in the same bucket whose
+    context vector has cosine similarity >= similarity with a stored one is
+    answered from the store. Among several matches one is picked at random,
+    and with probability freshness a lookup is skipped altogether; both keep
+    players from seeing the same few reused scenarios. Rows expire after ttl
+    seconds, checked on every lookup, and the least recently used ones are
+    evicted above max_entries.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, similarity=DEFAULT_SIMILARITY, freshness=DEFAULT_FRESHNESS,
+                 max_entries=5000, ttl=DEFAULT_TTL, seed=None):
+        self.similarity = similarity
+        self.freshness = freshness
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.rng = random.Random(seed)
+        # (emotion, difficulty) -> {"ids": [...], "scenarios": [...], "created": [...],
+        #                           "matrix": (capacity, dims), "size": n}, oldest row first
+        self.buckets = {}
+        self.counters = {"hits": 0, "misses": 0, "fresh": 0, "writes": 0, "evictions": 0}
+        self.lock = threading.Lock()
+        self.db = None
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+                self.db.execute("PRAGMA journal_mode=WAL")
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS scenarios ("
+                    "id INTEGER PRIMARY KEY, emotion TEXT NOT NULL, difficulty TEXT NOT NULL, "
+                    "context TEXT NOT NULL, scenario TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, last_used REAL NOT NULL, uses INTEGER NOT NULL DEFAULT 0)"
+                )
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Scenario store running in memory only: {e}")
+                self.db = None
+        self._load()
+
+    def _load(self):
+        """Rebuild the in-memory index from every unexpired row, one np.stack per bucket."""
+        self.buckets = {}
+        if self.db is None:
+            return
+        try:
+            self.db.execute("DELETE FROM scenarios WHERE created_at <= ?", (time.time() - self.ttl,))
+            self.db.commit()
+            rows = self.db.execute(
+                "SELECT id, emotion, difficulty, context, scenario, created_at FROM scenarios ORDER BY created_at"
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not read scenario store: {e}")
+            return
+        grouped = {}
+        for row_id, emotion, difficulty, context, scenario, created_at in rows:
+            ids, scenarios, created, vectors = grouped.setdefault((emotion, difficulty), ([], [], [], []))
+            ids.append(row_id)
+            scenarios.append(json.loads(scenario))
+            created.append(created_at)
+            vectors.append(ngram_vector(context))
+        for key, (ids, scenarios, created, vectors) in grouped.items():
+            self.buckets[key] = {"ids": ids, "scenarios": scenarios, "created": created,
+                                 "matrix": np.stack(vectors), "size": len(ids)}
+
+    def _index(self, row_id, emotion, difficulty, vector, scenario, created_at):
+        """Append one row to its bucket; the matrix doubles when full, so inserts are amortized O(dims)."""
+        bucket = self.buckets.setdefault((emotion, difficulty), {
+            "ids": [], "scenarios": [], "created": [],
+            "matrix": np.zeros((16, VECTOR_DIMS), dtype=np.float32), "size": 0,
+        })
+        if bucket["size"] == len(bucket["matrix"]):
+            grown = np.zeros((max(16, 2 * bucket["size"]), VECTOR_DIMS), dtype=np.float32)
+            grown[:bucket["size"]] = bucket["matrix"][:bucket["size"]]
+            bucket["matrix"] = grown
+        bucket["matrix"][bucket["size"]] = vector
+        bucket["size"] += 1
+        bucket["ids"].append(row_id)
+        bucket["scenarios"].append(scenario)
+        bucket["created"].append(created_at)
+
+    def _drop(self, removed_ids):
+        """Remove rows from the index in place, without going back to the database."""
+        removed_ids = set(removed_ids)
+        for key in list(self.buckets):
+            bucket = self.buckets[key]
+            keep = [i for i, row_id in enumerate(bucket["ids"]) if row_id not in removed_ids]
+            if len(keep) == bucket["size"]:
+                continue
+            if not keep:
+                del self.buckets[key]
+                continue
+            bucket["matrix"] = bucket["matrix"][keep]
+            bucket["ids"] = [bucket["ids"][i] for i in keep]
+            bucket["scenarios"] = [bucket["scenarios"][i] for i in keep]
+            bucket["created"] = [bucket["created"][i] for i in keep]
+            bucket["size"] = len(keep)
+
+    def _expire(self, key):
+        """The bucket without its rows older than ttl, which are deleted from the index and the database.
+
+        Rows are appended in creation order, so the expired ones are a prefix
+        and a bucket with nothing expired costs one comparison.
+        """
+        bucket = self.buckets.get(key)
+        cutoff = time.time() - self.ttl
+        if bucket is None or bucket["created"][0] > cutoff:
+            return bucket
+        expired = bucket["ids"][:bisect.bisect_right(bucket["created"], cutoff)]
+        if self.db is not None:
+            try:
+                self.db.executemany("DELETE FROM scenarios WHERE id = ?", [(row_id,) for row_id in expired])
+                self.db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not prune scenario store: {e}")
+        self.counters["evictions"] += len(expired)
+        self._drop(expired)
+        return self.buckets.get(key)
+
+    def lookup(self, emotion, difficulty, prev_scenario_text, chosen_option):
+        """A stored scenario for a similar context, or None to generate a new one."""
+        with self.lock:
+            if self.rng.random() < self.freshness:
+                self.counters["fresh"] += 1
+                return None
+
+            bucket = self._expire((game_emotion(emotion), difficulty))
+            matches = []
+            if bucket is not None:
+                similarities = bucket["matrix"][:bucket["size"]] @ ngram_vector(context_text(prev_scenario_text, chosen_option))
+                matches = [
+                    i for i in np.flatnonzero(similarities >= self.similarity)
+                    if bucket["scenarios"][i].get("scenario") != prev_scenario_text
+                ]
+            if not matches:
+                self.counters["misses"] += 1
+                return None
+
+            i = self.rng.choice(matches)
+            self.counters["hits"] += 1
+            if self.db is not None:
+                try:
+                    self.db.execute(
+                        "UPDATE scenarios SET last_used = ?, uses = uses + 1 WHERE id = ?",
+                        (time.time(), bucket["ids"][i]),
+                    )
+                    self.db.commit()
+                except sqlite3.Error:
+                    pass
+            return json.loads(json.dumps(bucket["scenarios"][i]))
+
+    def add(self, emotion, difficulty, prev_scenario_text, chosen_option, scenario):
+        emotion = game_emotion(emotion)
+        context = context_text(prev_scenario_text, chosen_option)
+        now = time.time()
+        with self.lock:
+            self.counters["writes"] += 1
+            row_id = -self.counters["writes"]  # memory-only ids
+            if self.db is not None:
+                try:
+                    row_id = self.db.execute(
+                        "INSERT INTO scenarios (emotion, difficulty, context, scenario, created_at, last_used) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (emotion, difficulty, context, json.dumps(scenario), now, now),
+                    ).lastrowid
+                    self.db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Could not write scenario store: {e}")
+            self._index(row_id, emotion, difficulty, ngram_vector(context), scenario, now)
+
+            if sum(bucket["size"] for bucket in self.buckets.values()) <= self.max_entries:
+                return
+            if self.db is None:
+                # Memory-only ids count down, so the oldest writes have the largest ids
+                ids = sorted((row_id for bucket in self.buckets.values() for row_id in bucket["ids"]), reverse=True)
+                removed = ids[:len(ids) - int(self.max_entries * 0.9)]
+                self._drop(removed)
+                self.counters["evictions"] += len(removed)
+            else:
+                self._evict()
+
+    def _evict(self):
+        """Drop expired rows and the least recently used ones, down to 90% of max_entries.
+
+        Trimming below the limit means the index is compacted once per batch
+        of writes rather than on every one; the evicted ids are removed from
+        the in-memory buckets directly instead of re-reading the table.
+        """
+        try:
+            removed = [row_id for (row_id,) in self.db.execute(
+                "SELECT id FROM scenarios WHERE created_at <= ? OR id IN ("
+                "SELECT id FROM scenarios ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (time.time() - self.ttl, int(self.max_entries * 0.9)),
+            ).fetchall()]
+            self.db.executemany("DELETE FROM scenarios WHERE id = ?", [(row_id,) for row_id in removed])
+            self.db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not prune scenario store: {e}")
+            return
+        if removed:
+            self.counters["evictions"] += len(removed)
+            self._drop(removed)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"] + self.counters["fresh"]
+            return {
+                **self.counters,
+                "entries": sum(bucket["size"] for bucket in self.buckets.values()),
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+_shared_store = None
+
+def get_store():
+    """Process-wide store, or None when SCENARIO_CACHE=off."""
+    global _shared_store
+    if os.environ.get("SCENARIO_CACHE", "on").lower() in ("off", "0", "false"):
+        return None
+    if _shared_store is None:
+        _shared_store = ScenarioStore()
+    return _shared_store
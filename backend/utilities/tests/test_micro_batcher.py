@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from predict_text import MicroBatcher
+
+def collect(batcher, items):
+    """Submit items together and wait for every callback."""
+    results = {}
+    done = threading.Event()
+
+    def callback_for(item):
+        def callback(result):
+            results[item] = result
+            if len(results) == len(items):
+                done.set()
+        return callback
+
+    for item in items:
+        batcher.submit(item, callback_for(item))
+    done.wait(5)
+    return results
+
+class MicroBatcherTest(unittest.TestCase):
+    def test_timed_out_batch_fails_every_item_and_later_batches_still_run(self):
+        release = threading.Event()
+
+        def predict_batch(items):
+            if "hang" in items:
+                release.wait(5)
+            return [item.upper() for item in items]
+
+        batcher = MicroBatcher(predict_batch, max_batch_size=8, max_wait_ms=20, timeout_ms=100)
+        stuck = collect(batcher, ["hang", "a"])
+        self.assertEqual(len(stuck), 2)
+        self.assertTrue(all(isinstance(result, TimeoutError) for result in stuck.values()))
+
+        self.assertEqual(collect(batcher, ["b", "c"]), {"b": "B", "c": "C"})
+        release.set()
+        batcher.close()
+
+    def test_short_result_list_fails_every_item(self):
+        batcher = MicroBatcher(lambda items: items[:1], max_batch_size=8, max_wait_ms=20)
+        results = collect(batcher, ["a", "b"])
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results.values()))
+        batcher.close()
+
+    def test_failing_callback_does_not_stop_the_batcher(self):
+        batcher = MicroBatcher(lambda items: items, max_batch_size=1, max_wait_ms=0)
+        batcher.submit("boom", lambda result: 1 / 0)
+        time.sleep(0.05)
+        self.assertEqual(collect(batcher, ["x"]), {"x": "x"})
+        batcher.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import torch
+import multimodal
+import predict_audio
+import predict_text
+
+class FakeWhisper:
+    def __init__(self):
+        self.threads = []
+
+    def transcribe(self, chunk, initial_prompt=None, **options):
+        self.threads.append(torch.get_num_threads())
+        return {"text": " fine", "segments": [{"start": 0.0, "end": 1.0, "text": " fine"}]}
+
+class WhisperThreadsTest(unittest.TestCase):
+    def test_whisper_keeps_its_share_after_load_pipeline(self):
+        whisper = FakeWhisper()
+        with mock.patch("os.cpu_count", return_value=8), \
+                mock.patch.object(multimodal, "load_whisper", return_value=whisper), \
+                mock.patch.object(predict_text, "load_ensemble", return_value=({}, 1)), \
+                mock.patch.object(predict_audio, "load_ensemble", return_value=({}, 1)):
+            pipeline = multimodal.load_pipeline(multimodal.parse_args(["clip.webm"]))
+            video_threads = torch.get_num_threads()  # what the video ensemble left the process with
+            pipeline.transcribe(predict_audio.AudioFeatures(np.zeros(16000, dtype=np.float32), 16000))
+
+        whisper_cores = multimodal.split_cores(3, 8)[0]
+        self.assertEqual(pipeline.whisper_threads, whisper_cores)
+        self.assertEqual(whisper.threads, [whisper_cores])
+        self.assertLess(video_threads, whisper_cores)
+        self.assertEqual(torch.get_num_threads(), video_threads)
+
+if __name__ == "__main__":
+    unittest.main()
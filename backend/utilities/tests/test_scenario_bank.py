@@ -0,0 +1,25 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scenario_bank import DIFFICULTIES, ScenarioBank
+
+class ScenarioBankDifficultyTest(unittest.TestCase):
+    def setUp(self):
+        self.bank = ScenarioBank(seed=0)
+
+    def test_sample_returns_requested_difficulty(self):
+        for emotion in self.bank.emotions:
+            for difficulty in DIFFICULTIES:
+                scenario = self.bank.sample(emotion, difficulty, session_id="s")
+                self.assertEqual(scenario["difficulty"], difficulty)
+                self.assertEqual(scenario["emotion"], emotion)
+
+    def test_fallback_scenario_returns_requested_difficulty(self):
+        scenario = self.bank.get_fallback_scenario("angry", "easy")
+        self.assertEqual(scenario["difficulty"], "easy")
+
+if __name__ == "__main__":
+    unittest.main()
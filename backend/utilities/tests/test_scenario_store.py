@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scenario_store import ScenarioStore
+
+PREVIOUS = "Your manager moves the deadline up by a week."
+OPTION = "Ask which parts can wait"
+SCENARIO = {"scenario": "The team meets to cut the scope.", "responses": []}
+
+class ScenarioStoreTtlTest(unittest.TestCase):
+    def lookup_after(self, store, seconds, now=1000.0):
+        with mock.patch("scenario_store.time.time", return_value=now + seconds):
+            return store.lookup("stress", "medium", PREVIOUS, OPTION)
+
+    def add_at(self, store, now=1000.0):
+        with mock.patch("scenario_store.time.time", return_value=now):
+            store.add("stress", "medium", PREVIOUS, OPTION, SCENARIO)
+
+    def test_memory_entry_is_not_served_after_its_ttl(self):
+        store = ScenarioStore(path=None, freshness=0, ttl=60, seed=0)
+        self.add_at(store)
+        self.assertEqual(self.lookup_after(store, 59), SCENARIO)
+        self.assertIsNone(self.lookup_after(store, 61))
+        self.assertEqual(store.stats()["entries"], 0)
+        self.assertEqual(store.stats()["evictions"], 1)
+
+    def test_expired_row_is_deleted_from_the_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = ScenarioStore(path=os.path.join(directory, "scenarios.sqlite"), freshness=0, ttl=60, seed=0)
+            self.add_at(store)
+            self.add_at(store, now=1050.0)
+            self.assertEqual(self.lookup_after(store, 70), SCENARIO)  # only the second row is still fresh
+            self.assertEqual(store.db.execute("SELECT COUNT(*) FROM scenarios").fetchone()[0], 1)
+            self.assertIsNone(self.lookup_after(store, 120))
+            self.assertEqual(store.db.execute("SELECT COUNT(*) FROM scenarios").fetchone()[0], 0)
+            store.db.close()
+
+if __name__ == "__main__":
+    unittest.main()
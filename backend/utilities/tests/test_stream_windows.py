@@ -0,0 +1,60 @@
+import os
+import sys
+import tracemalloc
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from predict_audio import stream_windows
+
+SAMPLE_RATE = 22050
+
+def synthetic_stream(seconds, chunk=1152):
+    """Decoder-sized chunks of a wrapping ramp, generated on the fly so the test holds none of them."""
+    for start in range(0, int(seconds * SAMPLE_RATE), chunk):
+        yield (np.arange(start, start + chunk) % 1000).astype(np.float32)
+
+def windowed(pcm, window_seconds=3.0, hop_seconds=1.5):
+    """The windows iter_windows used to cut from a fully decoded array."""
+    window, hop = int(window_seconds * SAMPLE_RATE), int(hop_seconds * SAMPLE_RATE)
+    return [(start / SAMPLE_RATE, pcm[start:start + window])
+            for start in range(0, max(1, len(pcm) - window + hop), hop)]
+
+class StreamWindowsTest(unittest.TestCase):
+    def test_matches_windowing_the_whole_array(self):
+        for length in (0, 1000, 3 * SAMPLE_RATE, 4 * SAMPLE_RATE + 17, 10 * SAMPLE_RATE):
+            pcm = np.arange(length, dtype=np.float32)
+            chunks = np.array_split(pcm, max(1, length // 5000))
+            got = list(stream_windows(chunks, SAMPLE_RATE))
+            expected = windowed(pcm)
+            self.assertEqual([start for start, _, _ in got], [start for start, _ in expected])
+            for (_, samples, _), (_, reference) in zip(got, expected):
+                np.testing.assert_array_equal(samples, reference)
+
+    def peak_while_windowing(self, seconds):
+        tracemalloc.start()
+        try:
+            count = 0
+            for start, samples, _ in stream_windows(synthetic_stream(seconds), SAMPLE_RATE):
+                self.assertEqual(samples[0], round(start * SAMPLE_RATE) % 1000)
+                count += 1
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        total = sum(len(chunk) for chunk in synthetic_stream(seconds))
+        hop = int(1.5 * SAMPLE_RATE)
+        self.assertEqual(count, len(range(0, total - hop, hop)))
+        return peak
+
+    def test_peak_memory_stays_bounded_on_a_long_stream(self):
+        short = self.peak_while_windowing(60)
+        long = self.peak_while_windowing(30 * 60)
+        # Thirty minutes decoded in full would be about 160 MB; windowed as it
+        # arrives it needs no more than one minute does.
+        self.assertLess(long, short * 1.05)
+        self.assertLess(long, 2 * 1024 * 1024)
+
+if __name__ == "__main__":
+    unittest.main()
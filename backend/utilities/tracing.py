@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import itertools
+import threading
+
+# Where spans go: "off", "stderr", "fd:<n>" or a file path (JSON lines, appended)
+TRACE_TARGET = os.environ.get("EMOTION_TRACE", "off")
+# Trace id for root spans, so a caller can tie a one-shot run to its own request
+TRACE_ID = os.environ.get("EMOTION_TRACE_ID")
+# When set, every root span runs under cProfile and its stats are dumped into this directory
+PROFILE_DIR = os.environ.get("EMOTION_PROFILE")
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def _open_sink(target):
+    target = (target or "").strip()
+    if target.lower() in ("", "off", "0", "false"):
+        return None
+    if target == "stderr":
+        return sys.__stderr__
+    try:
+        if target.startswith("fd:"):
+            return os.fdopen(int(target[3:]), "a", buffering=1)
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        return open(target, "a", buffering=1)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Tracing disabled, cannot open {target}: {e}", file=sys.__stderr__)
+        return None
+
+_sink = _open_sink(TRACE_TARGET)
+_sink_lock = threading.Lock()
+_span_ids = itertools.count(1)
+_profile_ids = itertools.count(1)
+_local = threading.local()
+
+def enabled():
+    return _sink is not None or bool(PROFILE_DIR)
+
+def current():
+    """The innermost open span on this thread, to hand to span(parent=...) in another thread."""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+class Span:
+    """One timed stage. Emitted as a JSON line when it closes:
+
+    {"ts", "pid", "trace", "span", "parent", "name", "ms", "rss_mb",
+    "rss_delta_mb", ...attributes, "error"?}
+
+    trace is inherited from the parent (the request id for spans opened
+    under a request); set() adds attributes such as input sizes once they
+    are known.
+    """
+
+    __slots__ = ("name", "attrs", "parent", "trace", "id", "start", "wall_start", "rss_before", "profile")
+
+    def __init__(self, name, parent, trace, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.trace = trace if trace is not None else (parent.trace if parent is not None else TRACE_ID)
+        self.id = next(_span_ids)
+        self.profile = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        if PROFILE_DIR and self.parent is None:
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError:  # another profiler is already active on this thread
+                self.profile = None
+        stack.append(self)
+        self.wall_start = time.time()
+        self.rss_before = current_rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        rss_after = current_rss_bytes()
+        stack = _local.stack
+        if stack and stack[-1] is self:
+            stack.pop()
+        if self.profile is not None:
+            self.profile.disable()
+            self._dump_profile()
+
+        if _sink is not None:
+            record = {
+                "ts": round(self.wall_start, 6),
+                "pid": os.getpid(),
+                "trace": self.trace,
+                "span": self.id,
+                "parent": self.parent.id if self.parent is not None else None,
+                "name": self.name,
+                "ms": round(elapsed_ms, 3),
+                "rss_mb": round(rss_after / 2 ** 20, 2) if rss_after is not None else None,
+                "rss_delta_mb": round((rss_after - self.rss_before) / 2 ** 20, 2)
+                if rss_after is not None and self.rss_before is not None else None,
+                **self.attrs,
+            }
+            if exc_type is not None:
+                record["error"] = f"{exc_type.__name__}: {exc}"
+            line = json.dumps(record, default=str) + "\n"
+            with _sink_lock:
+                try:
+                    _sink.write(line)
+                except (OSError, ValueError):
+                    pass
+        return False
+
+    def _dump_profile(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{self.name}-{os.getpid()}-{next(_profile_ids)}.prof")
+        try:
+            self.profile.dump_stats(path)
+        except OSError as e:
+            print(f"⚠️ Could not write profile {path}: {e}", file=sys.__stderr__)
+
+class _NullSpan:
+    """What span() returns while tracing is off: a context manager that does nothing."""
+
+    __slots__ = ()
+    id = None
+    trace = None
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+def span(name, parent=None, trace=None, **attrs):
+    """Time a stage: `with span("featurize", model=name) as s: ...; s.set(frames=n)`.
+
+    Spans nest per thread; work handed to another thread passes
+    parent=tracing.current() so it stays under the right request. With
+    EMOTION_TRACE off and no EMOTION_PROFILE this costs one function call.
+    """
+    if not enabled():
+        return NULL_SPAN
+    if parent is None:
+        parent = current()
+    elif parent is NULL_SPAN:
+        parent = None
+    return Span(name, parent, trace, attrs)